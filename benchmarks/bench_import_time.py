@@ -0,0 +1,133 @@
+"""
+Import-Time Budget Check
+Measures `python -X importtime` for the orchestrator and every src module
+
+Each module is imported in a fresh interpreter (best of --repeat runs) and
+checked against two budgets:
+- cumulative import time (IMPORT_BUDGETS_MS, scaled by --scale on slow machines)
+- modules that must not be loaded at import time (provider SDKs everywhere;
+  pandas / LangChain as well for the orchestrator)
+
+Exits with status 1 when any budget is exceeded. tests/test_import_time.py runs
+the same checks under pytest (IMPORT_BUDGET_SCALE stretches the time budgets).
+
+Usage:
+    python benchmarks/bench_import_time.py [--repeat 3] [--scale 1.0] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEARCH_PATH = [os.path.join(BASE_DIR, 'src'), os.path.join(BASE_DIR, 'workflow')]
+
+PROVIDER_SDKS = ['langchain_community', 'langchain_google_genai', 'huggingface_hub', 'google.generativeai']
+
+# Cumulative import-time budget per module (milliseconds)
+IMPORT_BUDGETS_MS = {
+    'main_workflow': 150,
+    'llm_clients': 150,
+    'response_analysis': 150,
+    'sendMailHog': 1000,
+    'mail_reply_agent': 1000,
+    'reply_classifier': 1000,
+    'lead_analysis': 2000,
+    'personalized_email': 2000,
+    'summary_report': 2000,
+    'streaming_pipeline': 2000,
+}
+
+# Top-level packages each module may not pull in when imported
+FORBIDDEN_IMPORTS = {name: PROVIDER_SDKS for name in IMPORT_BUDGETS_MS}
+FORBIDDEN_IMPORTS['main_workflow'] = PROVIDER_SDKS + ['pandas', 'numpy', 'langchain_core']
+FORBIDDEN_IMPORTS['llm_clients'] = PROVIDER_SDKS + ['pandas', 'numpy', 'langchain_core']
+FORBIDDEN_IMPORTS['response_analysis'] = PROVIDER_SDKS + ['pandas', 'numpy', 'langchain_core']
+
+_PROBE = """
+import sys, json
+sys.path[:0] = {path!r}
+import {module}
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def measure(module):
+    """One fresh-interpreter import: (cumulative milliseconds, loaded module names)"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(path=SEARCH_PATH, module=module)],
+        capture_output=True, text=True, cwd=BASE_DIR,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr.strip().splitlines()[-1]}")
+    cumulative_us = None
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module and not parts[2].startswith('  '):
+            cumulative_us = int(parts[1])
+    loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+    return (cumulative_us or 0) / 1000, loaded
+
+
+def check_module(module, repeat, scale):
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        milliseconds, loaded = measure(module)
+        timings.append(milliseconds)
+    best = min(timings)
+    budget = IMPORT_BUDGETS_MS[module] * scale
+    forbidden = sorted({name for name in FORBIDDEN_IMPORTS[module]
+                        for loaded_name in loaded if loaded_name == name or loaded_name.startswith(name + '.')})
+    return {
+        'module': module,
+        'import_ms': round(best, 1),
+        'budget_ms': round(budget, 1),
+        'forbidden_loaded': forbidden,
+        'ok': best <= budget and not forbidden,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and enforce import-time budgets")
+    parser.add_argument('--repeat', type=int, default=3, help="imports per module (best run counts)")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every budget (slow CI machines)")
+    parser.add_argument('--modules', nargs='+', default=list(IMPORT_BUDGETS_MS), help="modules to check")
+    parser.add_argument('--json', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  IMPORT-TIME BUDGETS")
+    print("=" * 60)
+    results = []
+    for module in args.modules:
+        try:
+            result = check_module(module, args.repeat, args.scale)
+        except RuntimeError as e:
+            result = {'module': module, 'import_ms': None, 'budget_ms': None,
+                      'forbidden_loaded': [], 'ok': False, 'error': str(e)}
+        results.append(result)
+        status = '✅' if result['ok'] else '❌'
+        detail = result.get('error') or (f"loads {', '.join(result['forbidden_loaded'])}"
+                                         if result['forbidden_loaded'] else '')
+        print(f"{status} {module:<22}{result['import_ms']!s:>10} ms  (budget {result['budget_ms']} ms)  {detail}")
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.json}")
+
+    failures = [r for r in results if not r['ok']]
+    if failures:
+        print(f"❌ {len(failures)} module(s) over budget")
+        return 1
+    print("✅ All modules within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,655 @@
+"""
+End-to-End Pipeline Benchmark
+Runs step1_lead_to_email and step2_reply_to_report on synthetic leads, fully offline
+
+Every HuggingFaceEndpoint / ChatGoogleGenerativeAI client is swapped for a fake
+model that sleeps for --llm-latency seconds (± --llm-jitter, plus
+--llm-ms-per-1k-tokens of prompt) and answers with
+well-formed output for each prompt type, and MailHog is replaced by an
+in-process SMTP sink. Each lead count runs in its own subprocess so peak RSS is
+measured per run.
+
+Reported per stage: wall time, rows/sec, LLM calls, p50/p95/p99 call latency
+(submit → result, including scheduler queueing) and peak RSS. Results are
+written as JSON; pass an earlier file to --compare to flag throughput
+regressions (exit code 1).
+
+Usage:
+    python benchmarks/bench_pipeline.py [--rows 1000 10000 100000] [--llm-latency 0.05] [--json out.json]
+    python benchmarks/bench_pipeline.py --rows 1000 --compare baseline.json --tolerance 0.15
+    python benchmarks/bench_pipeline.py --rows 1000 --llm-ms-per-1k-tokens 40 --prompt-mode compact
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import types
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import importlib
+import threading
+import contextlib
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'workflow'))
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+
+# Stage name → function looked up by main_workflow (wrapped to time it)
+STAGES = [
+    ('lead_analysis', 'process_leads_async'),
+    ('email_generation', 'generate_all_emails_async'),
+    ('send', 'send_emails_async'),
+    ('send_overlapped', 'send_from_queue_async'),
+    ('streaming_step1', 'run_streaming_pipeline_async'),
+    ('sharded_step1', 'run_sharded_pipeline_async'),
+    ('mail_reply', 'process_emails_with_types_async'),
+    ('response_analysis', 'analyze_responses_async'),
+    ('summary_report', 'generate_campaign_report_async'),
+]
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+FIRST_NAMES = ["Rahim", "Ayesha", "Tanvir", "Nusrat", "Farhan", "Sadia", "Imran", "Mitu", "Karim", "Lamia"]
+LAST_NAMES = ["Ahmed", "Hossain", "Rahman", "Chowdhury", "Islam", "Khan", "Sarkar", "Akter"]
+COMPANIES = ["TechBangla", "HealthCare BD", "Dhaka Logistics", "GreenGrid", "FinEdge", "EduSmart",
+             "AgroNext", "RetailHub", "BuildRight", "CloudNine"]
+INDUSTRIES = ["Technology", "Healthcare", "Logistics", "Energy", "Finance", "Education",
+              "Agriculture", "Retail", "Construction", ""]
+JOB_TITLES = ["CEO", "CTO", "VP of Sales", "Director of Operations", "IT Manager", "Marketing Manager",
+              "Data Analyst", "Procurement Specialist", "Founder", ""]
+COMPANY_SIZES = ["1-10", "10-50", "50-100", "100-200", "200-500", "500+", ""]
+LOCATIONS = ["Dhaka", "Chittagong", "Sylhet", "Khulna", "Rajshahi"]
+NOTES = ["Interested in a demo", "Requested demo last week", "Budget approved for Q3",
+         "Limited budget, needs follow-up", "Comparing vendors", "Asked for pricing", "", ""]
+
+
+def generate_leads(rows, path, seed=7):
+    """Write a leads.csv with the dataset schema (some fields left blank on purpose)"""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, rows + 1)
+    first = rng.choice(FIRST_NAMES, rows)
+    last = rng.choice(LAST_NAMES, rows)
+    days_ago = rng.integers(0, 200, rows)
+    last_contact = (pd.Timestamp.now().normalize() - pd.to_timedelta(days_ago, unit='D')).strftime('%Y-%m-%d')
+    last_contact = np.where(rng.random(rows) < 0.15, '', last_contact)
+    df = pd.DataFrame({
+        'id': ids,
+        'name': pd.Series(first) + ' ' + pd.Series(last),
+        'email': [f"lead{i}@example.com" for i in ids],
+        'company': rng.choice(COMPANIES, rows),
+        'industry': rng.choice(INDUSTRIES, rows),
+        'job_title': rng.choice(JOB_TITLES, rows),
+        'company_size': rng.choice(COMPANY_SIZES, rows),
+        'location': rng.choice(LOCATIONS, rows),
+        'last_contact': last_contact,
+        'notes': rng.choice(NOTES, rows),
+    })
+    df.to_csv(path, index=False)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Fake LLM
+# ---------------------------------------------------------------------------
+
+# Pieces each streamed fake reply is split into
+STREAM_CHUNKS = 8
+
+_fake_settings = {'latency': 0.05, 'jitter': 0.2, 'per_1k_tokens': 0.0, 'malformed_rate': 0.0}
+
+REPLY_TEXTS = {
+    "NOT_INTERESTED": "Thank you for reaching out, but we are not interested at this time.",
+    "INTERESTED": "This sounds great - we would love to schedule a call next week to discuss it.",
+    "NEEDS_FOLLOW_UP": "Could you send me more information about pricing for a team of our size?",
+    "UNCLEAR": "I'm not sure I understand what you are offering - could you clarify?",
+}
+
+
+def _reply_class(text):
+    lowered = text.lower()
+    if 'not interested' in lowered:
+        return "NOT_INTERESTED"
+    if 'more information' in lowered or 'pricing' in lowered:
+        return "NEEDS_FOLLOW_UP"
+    if 'clarify' in lowered or 'not sure' in lowered:
+        return "UNCLEAR"
+    return "INTERESTED"
+
+
+def fake_response(prompt):
+    """Plausible output for each prompt the pipeline sends"""
+    if 'could not be parsed' in prompt:
+        # JSON repair re-ask: answer cleanly for whichever schema it lists
+        return fake_response('B2B sales analyst' if 'priority_score' in prompt else 'communication specialist')
+    if '[id=' in prompt and 'Replies:' in prompt:
+        items = re.findall(r'\[id=(\d+)\]\n(.*?)(?=\n\n\[id=|\Z)', prompt, re.S)
+        return json.dumps([{"id": int(reply_id), "class": _reply_class(text), "reason": "benchmark"}
+                           for reply_id, text in items])
+    if 'classifier for customer email replies' in prompt:
+        return json.dumps({"class": _reply_class(prompt.split('Text:')[-1]), "reason": "benchmark"})
+    if 'B2B sales analyst' in prompt:
+        return json.dumps({
+            "priority_score": 40 + len(prompt) % 60,
+            "buyer_persona": "Mid-Market Technology Decision Maker",
+            "filled_industry": "Technology",
+            "filled_job_title": "Manager",
+            "filled_company_size": "50-100",
+            "filled_notes": "Evaluating automation tools",
+        })
+    if 'communication specialist' in prompt:
+        return json.dumps({
+            "subject": "Helping your team move faster",
+            "body": ("Dear there,\n\n" + "I noticed your team is growing quickly and wanted to share "
+                     "how similar companies cut manual work in half. " * 4 + "\n\nBest regards,\nSales Team"),
+            "tone_used": "Professional",
+            "key_personalization": "Company growth",
+        })
+    if prompt.startswith('Write a brief'):
+        for label in ("NOT INTERESTED", "INTERESTED", "follow-up", "clarification"):
+            if label in prompt:
+                key = {"NOT INTERESTED": "NOT_INTERESTED", "follow-up": "NEEDS_FOLLOW_UP",
+                       "clarification": "UNCLEAR"}.get(label, label)
+                return REPLY_TEXTS[key]
+    if 'campaign report' in prompt:
+        return "# Campaign Report\n\n## Executive Summary\n\n- Benchmark run\n" + "- Finding\n" * 40
+    return "{}"
+
+
+def malform(text):
+    """The defects real models produce: prose around the JSON, fences, truncation, no JSON at all"""
+    defect = random.choice(('preamble', 'trailing', 'truncated', 'prose'))
+    if defect == 'preamble':
+        return f"Sure! Here is the JSON you asked for:\n```json\n{text}\n```"
+    if defect == 'trailing':
+        return f"{text}\n\nLet me know if you need anything else {{for example more leads}}."
+    if defect == 'truncated':
+        return text[:int(len(text) * 0.8)]
+    return "I'm sorry, I can't produce that analysis right now."
+
+
+class FakeLLM(BaseChatModel):
+    """Drop-in for HuggingFaceEndpoint / ChatGoogleGenerativeAI: sleeps, then answers by prompt type"""
+
+    repo_id: str = 'benchmark/fake-llm'
+    model: str = 'benchmark/fake-llm'
+    temperature: float = 0.7
+
+    @property
+    def _llm_type(self):
+        return 'benchmark-fake'
+
+    @staticmethod
+    def _prompt_text(messages):
+        return "\n".join(str(message.content) for message in messages)
+
+    def _delay(self, messages):
+        jitter = _fake_settings['jitter']
+        # Prompt processing time grows with prompt size (--llm-ms-per-1k-tokens)
+        latency = _fake_settings['latency'] + _fake_settings['per_1k_tokens'] * len(self._prompt_text(messages)) / 4000
+        return max(0.0, latency * random.uniform(1 - jitter, 1 + jitter))
+
+    def _result(self, messages):
+        prompt = self._prompt_text(messages)
+        text = fake_response(prompt)
+        # Only the lead analysis / email JSON: the reply classifier has its own parser
+        if (text.startswith('{"priority_score"') or text.startswith('{"subject"')) \
+                and 'could not be parsed' not in prompt and random.random() < _fake_settings['malformed_rate']:
+            text = malform(text)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self._delay(messages))
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._delay(messages))
+        return self._result(messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        # The same total latency, spread over STREAM_CHUNKS pieces of the reply
+        text = self._result(messages).generations[0].message.content
+        size = max(1, -(-len(text) // STREAM_CHUNKS))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+        delay = self._delay(messages) / len(pieces)
+        for piece in pieces:
+            await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+
+def install_fake_llms(latency, jitter, per_1k_tokens=0.0, malformed_rate=0.0):
+    """Point the provider classes at FakeLLM before any src module imports them"""
+    _fake_settings.update(latency=latency, jitter=jitter, per_1k_tokens=per_1k_tokens,
+                          malformed_rate=malformed_rate)
+    for module_name, class_name in (('langchain_community.llms', 'HuggingFaceEndpoint'),
+                                    ('langchain_google_genai', 'ChatGoogleGenerativeAI')):
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            # The real provider package is not needed when every client is faked
+            parts = module_name.split('.')
+            for i in range(1, len(parts) + 1):
+                name = '.'.join(parts[:i])
+                sys.modules.setdefault(name, types.ModuleType(name))
+            module = sys.modules[module_name]
+        setattr(module, class_name, FakeLLM)
+    # Fake clients send no HTTP, so they also skip the provider SDK's connection-pool setup
+    import llm_clients
+    for provider in llm_clients.BUILDERS:
+        llm_clients.BUILDERS[provider] = FakeLLM
+
+
+def setup_shard_worker(fake_settings, verbose):
+    """Sharded runs: fake LLMs (and the pipeline's output silenced) in every worker process"""
+    install_fake_llms(*fake_settings)
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+
+# ---------------------------------------------------------------------------
+# SMTP sink
+# ---------------------------------------------------------------------------
+
+class SMTPSink:
+    """Minimal in-process SMTP server that accepts and discards every message"""
+
+    def __init__(self, host='127.0.0.1'):
+        self.host = host
+        self.port = None
+        self.messages = 0
+        self._loop = None
+
+    async def _handle(self, reader, writer):
+        writer.write(b"220 bench-sink ESMTP\r\n")
+        in_data = False
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    self.messages += 1
+                    writer.write(b"250 OK\r\n")
+                continue
+            command = line[:4].upper()
+            if command == b"DATA":
+                in_data = True
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            elif command in (b"EHLO", b"HELO"):
+                writer.write(b"250 bench-sink\r\n")
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, 0))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self.port
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def latency_percentiles(samples):
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 2), 'p95_ms': round(float(p95), 2), 'p99_ms': round(float(p99), 2)}
+
+
+class StageRecorder:
+    """Wall time, LLM call latencies and peak RSS per stage and per workflow step"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.current = {}
+        self.results = {}
+
+    def begin(self, kind, name):
+        # Keyed by name as well: overlapped stages (generation + send) run at the same time
+        self.current[kind, name] = (time.perf_counter(), [])
+
+    def end(self, kind, name):
+        started, latencies = self.current.pop((kind, name))
+        seconds = time.perf_counter() - started
+        self.results.setdefault(kind, {})[name] = {
+            'seconds': round(seconds, 3),
+            'rows_per_sec': round(self.rows / seconds, 2) if seconds > 0 else None,
+            'llm_calls': len(latencies),
+            **latency_percentiles(latencies),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    def record_call(self, seconds):
+        for _, latencies in self.current.values():
+            latencies.append(seconds)
+
+    def timed(self, kind, name, func):
+        async def wrapper(*args, **kwargs):
+            self.begin(kind, name)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.end(kind, name)
+        return wrapper
+
+
+def run_worker(args):
+    """One benchmark run in this process (called in a fresh subprocess per lead count)"""
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    dataset_dir, output_dir, report_dir = (os.path.join(workdir, name) for name in ('dataset', 'output', 'report'))
+    for directory in (dataset_dir, output_dir, report_dir):
+        os.makedirs(directory)
+    generate_leads(args.rows, os.path.join(dataset_dir, 'leads.csv'), args.seed)
+
+    sink = SMTPSink()
+    port = sink.start()
+
+    # Set before the src modules read their configuration at import time
+    os.environ.update({
+        'SMTP_HOST': sink.host,
+        'SMTP_PORT': str(port),
+        'HF_MAX_IN_FLIGHT': str(args.llm_concurrency),
+        'GEMINI_MAX_IN_FLIGHT': str(args.llm_concurrency),
+        'HF_RPM': '0', 'HF_TPM': '0', 'GEMINI_RPM': '0', 'GEMINI_TPM': '0',
+        'LLM_CACHE': '1' if args.cache else '0',
+        'LLM_CACHE_PATH': os.path.join(workdir, 'llm_cache.sqlite'),
+        'REPLY_LOCAL_TRAINING_CSV': os.path.join(report_dir, 'final.csv'),
+        'PROMPT_MODE': args.prompt_mode,
+        'EMAIL_STREAMING': '1' if args.email_streaming else '0',
+        'PROMPT_METRICS_PATH': os.path.join(workdir, 'prompt_metrics.json'),
+    })
+    os.environ.setdefault('GOOGLE_API_KEY', 'benchmark')
+    install_fake_llms(args.llm_latency, args.llm_jitter, args.llm_ms_per_1k_tokens / 1000,
+                      args.llm_malformed_rate)
+
+    recorder = StageRecorder(args.rows)
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, 'w')):
+        import llm_scheduler
+        import llm_clients
+        import prompt_metrics
+        import email_templates
+        import llm_json
+        import main_workflow
+
+        original_submit = llm_scheduler.ProviderScheduler.submit
+
+        async def timed_submit(self, call, tokens=0):
+            started = time.perf_counter()
+            try:
+                return await original_submit(self, call, tokens)
+            finally:
+                recorder.record_call(time.perf_counter() - started)
+
+        llm_scheduler.ProviderScheduler.submit = timed_submit
+        main_workflow.DATASET_DIR = dataset_dir
+        main_workflow.OUTPUT_DIR = output_dir
+        main_workflow.REPORT_DIR = report_dir
+        # Worker processes install the same fake LLM before their pipeline starts
+        run_sharded = main_workflow.run_sharded_pipeline_async
+        fake_settings = (args.llm_latency, args.llm_jitter, args.llm_ms_per_1k_tokens / 1000, args.llm_malformed_rate)
+
+        async def run_sharded_with_fakes(*shard_args, **shard_kwargs):
+            return await run_sharded(*shard_args, initializer=setup_shard_worker,
+                                     initargs=(fake_settings, args.verbose), **shard_kwargs)
+
+        main_workflow.run_sharded_pipeline_async = run_sharded_with_fakes
+        for stage, attribute in STAGES:
+            setattr(main_workflow, attribute, recorder.timed('stages', stage, getattr(main_workflow, attribute)))
+        step1 = recorder.timed('steps', 'step1_lead_to_email', main_workflow.step1_lead_to_email)
+        step2 = recorder.timed('steps', 'step2_reply_to_report', main_workflow.step2_reply_to_report)
+
+        async def run():
+            await step1(streaming=args.streaming, chunk_size=args.chunk_size, overlap_send=args.overlap_send,
+                        shards=args.shards)
+            await step2()
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        total_seconds = time.perf_counter() - started
+
+    return {
+        'rows': args.rows,
+        'streaming': args.streaming,
+        'overlap_send': args.overlap_send,
+        'shards': args.shards,
+        'total_seconds': round(total_seconds, 3),
+        'rows_per_sec': round(args.rows / total_seconds, 2),
+        'peak_rss_mb': peak_rss_mb(),
+        'emails_delivered': sink.messages,
+        'steps': recorder.results.get('steps', {}),
+        'stages': recorder.results.get('stages', {}),
+        'schedulers': llm_scheduler.scheduler_stats(),
+        'clients': llm_clients.client_stats(),
+        'prompts': prompt_metrics.prompt_stats(),
+        'templates': email_templates.template_stats(),
+        'parsing': llm_json.parse_stats(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def run_in_subprocess(rows, args):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as handle:
+        result_path = handle.name
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--rows', str(rows),
+               '--llm-latency', str(args.llm_latency), '--llm-jitter', str(args.llm_jitter),
+               '--llm-concurrency', str(args.llm_concurrency), '--seed', str(args.seed),
+               '--llm-ms-per-1k-tokens', str(args.llm_ms_per_1k_tokens), '--prompt-mode', args.prompt_mode,
+               '--llm-malformed-rate', str(args.llm_malformed_rate), '--shards', str(args.shards),
+               '--json', result_path]
+    if args.streaming:
+        command.append('--streaming')
+    if args.overlap_send:
+        command.append('--overlap-send')
+    if args.email_streaming:
+        command.append('--email-streaming')
+    if args.chunk_size:
+        command += ['--chunk-size', str(args.chunk_size)]
+    if args.cache:
+        command.append('--cache')
+    if args.verbose:
+        command.append('--verbose')
+    subprocess.run(command, check=True)
+    try:
+        with open(result_path, encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+def print_run(run):
+    mode = 'streaming' if run['streaming'] else 'batch, overlapped send' if run.get('overlap_send') else 'batch'
+    if run.get('shards', 1) > 1 and not run['streaming']:
+        mode += f", {run['shards']} shards"
+    print(f"\n📊 {run['rows']:,} leads ({mode}) - {run['total_seconds']}s total, "
+          f"{run['rows_per_sec']} rows/s, peak RSS {run['peak_rss_mb']} MB, "
+          f"{run['emails_delivered']} emails delivered")
+    print(f"{'stage':<24}{'seconds':>10}{'rows/s':>12}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'RSS MB':>9}")
+    for name, s in list(run['steps'].items()) + list(run['stages'].items()):
+        print(f"{name:<24}{s['seconds']:>10}{s['rows_per_sec']!s:>12}{s['llm_calls']:>8}"
+              f"{s['p50_ms']!s:>10}{s['p95_ms']!s:>10}{s['p99_ms']!s:>10}{s['peak_rss_mb']!s:>9}")
+    for name, p in run.get('prompts', {}).items():
+        print(f"🧮 {name} ({p['mode']} prompts): {p['tokens_per_prompt']} tokens/prompt, "
+              f"{p['tokens_saved']} saved ({p['tokens_saved_pct']}%), {p['latency_ms']} ms/call")
+    t = run.get('templates')
+    if t and t['templated']:
+        print(f"🧩 tiered emails: {t['personalized']} personalized, {t['templated']} from {t['clusters']} "
+              f"templates, {t['llm_calls']} LLM calls ({t['llm_calls_saved']} saved)")
+    for name, p in run.get('parsing', {}).items():
+        if p.get('streamed'):
+            print(f"🌊 {name}: {p['streamed']} streamed replies, {p['trailing_cut']} with trailing text cut off")
+        if p['malformed_rate']:
+            print(f"🩹 {name}: {p['malformed_rate']}% malformed JSON, {p['repaired']} repaired, "
+                  f"{p['recovered']}/{p['reasked']} re-asks recovered, {p['failed']} fell back "
+                  f"({p['failure_rate']}%)")
+
+
+def compare_results(baseline, current, tolerance):
+    """Print rows/sec changes per stage; return the stages that got slower than tolerance allows"""
+    regressions = []
+    previous = {(run['rows'], run['streaming']): run for run in baseline.get('runs', [])}
+    print(f"\n{'='*60}")
+    print(f"🔁 COMPARISON (tolerance {tolerance:.0%})")
+    print(f"{'='*60}")
+    for run in current['runs']:
+        before = previous.get((run['rows'], run['streaming']))
+        if before is None:
+            print(f"{run['rows']:,} leads: no baseline run")
+            continue
+        for kind in ('steps', 'stages'):
+            for name, stats in run[kind].items():
+                old = before.get(kind, {}).get(name, {}).get('rows_per_sec')
+                new = stats['rows_per_sec']
+                if not old or not new:
+                    continue
+                ratio = new / old
+                flag = ''
+                if ratio < 1 - tolerance:
+                    flag = '  ⚠️  regression'
+                    regressions.append((run['rows'], name, ratio))
+                print(f"{run['rows']:>8,} {name:<24} {old:>10} → {new:<10} ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full campaign workflow with a fake LLM and SMTP sink")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="lead counts to benchmark")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="fake LLM seconds per call")
+    parser.add_argument('--llm-jitter', type=float, default=0.2, help="± fraction of latency per call")
+    parser.add_argument('--llm-ms-per-1k-tokens', type=float, default=0.0,
+                        help="extra fake LLM milliseconds per 1k prompt tokens")
+    parser.add_argument('--prompt-mode', choices=('full', 'compact'), default='full',
+                        help="PROMPT_MODE for lead analysis and email generation")
+    parser.add_argument('--llm-malformed-rate', type=float, default=0.0,
+                        help="fraction of JSON responses the fake LLM mangles (prose, fences, truncation)")
+    parser.add_argument('--llm-concurrency', type=int, default=64, help="max in-flight calls per provider")
+    parser.add_argument('--streaming', action='store_true', help="run step 1 in streaming mode")
+    parser.add_argument('--overlap-send', action='store_true',
+                        help="batch mode: send each email as soon as it is generated")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="batch mode: run step 1 in this many worker processes")
+    parser.add_argument('--email-streaming', action='store_true',
+                        help="EMAIL_STREAMING=1: stream email generation tokens")
+    parser.add_argument('--chunk-size', type=int, default=None, help="streaming chunk size")
+    parser.add_argument('--cache', action='store_true', help="keep the LLM response cache enabled")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--verbose', action='store_true', help="show the pipeline's own output")
+    parser.add_argument('--json', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON from an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="allowed rows/sec drop against --compare before failing")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.rows = args.rows[0]
+        result = run_worker(args)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        return 0
+
+    results = {
+        'benchmark': 'pipeline',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'llm_latency': args.llm_latency,
+            'llm_jitter': args.llm_jitter,
+            'llm_ms_per_1k_tokens': args.llm_ms_per_1k_tokens,
+            'prompt_mode': args.prompt_mode,
+            'llm_malformed_rate': args.llm_malformed_rate,
+            'llm_concurrency': args.llm_concurrency,
+            'streaming': args.streaming,
+            'overlap_send': args.overlap_send,
+            'shards': args.shards,
+            'email_streaming': args.email_streaming,
+            'chunk_size': args.chunk_size,
+            'cache': args.cache,
+            'seed': args.seed,
+        },
+        'runs': [],
+    }
+
+    print("=" * 60)
+    print("⚡ END-TO-END PIPELINE BENCHMARK")
+    print("=" * 60)
+    print(f"Fake LLM: {args.llm_latency}s ± {args.llm_jitter:.0%} per call, "
+          f"{args.llm_concurrency} in flight per provider")
+    for rows in args.rows:
+        print(f"\n⏳ Running {rows:,} leads...")
+        run = run_in_subprocess(rows, args)
+        results['runs'].append(run)
+        print_run(run)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to {args.json}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} stage(s) slower than the baseline allows")
+            return 1
+        print("\n✅ No throughput regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
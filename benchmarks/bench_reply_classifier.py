@@ -0,0 +1,152 @@
+"""
+Local Reply Classifier Benchmark
+Measures how many replies the zero-network fast path resolves and the speedup
+
+Uses LLM-labelled rows from report/final.csv when available, otherwise a
+synthetic set of formulaic replies like the ones mail_reply_agent produces.
+Half of the rows train the TF-IDF model, the other half are classified. The
+LLM is not called: its cost is modelled as --llm-latency seconds per escalated
+reply (divided by --llm-concurrency).
+
+Usage:
+    python benchmarks/bench_reply_classifier.py [--rows 5000] [--llm-latency 1.2] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from reply_classifier import LocalReplyClassifier, load_training_data, DEFAULT_TRAINING_CSV
+
+SYNTHETIC_REPLIES = {
+    "INTERESTED": [
+        "Thanks for reaching out, {name}! This sounds great - we'd love to schedule a call next week to discuss how this could help {company}.",
+        "I'm very interested in learning more. Let's set up a demo for our {team} team.",
+        "This is exactly what we have been looking for. Could we book a meeting on {day}?",
+        "Excited to explore this further - our {team} group has been struggling with this exact problem.",
+    ],
+    "NOT_INTERESTED": [
+        "Thank you for the note, but we are not interested at this time.",
+        "Appreciate you thinking of {company}, however this is not a good fit for us right now.",
+        "No thanks - we already have a solution in place for our {team} team.",
+        "Please remove me from your list. We will pass on this.",
+    ],
+    "NEEDS_FOLLOW_UP": [
+        "Could you send me more information about pricing for a team of our size?",
+        "Before we commit, please share a case study from a company similar to {company}.",
+        "Interesting timing. Can you get back to me next quarter once our budget is set?",
+        "Please send over some additional details on the {team} integration.",
+    ],
+    "UNCLEAR": [
+        "I'm not sure I understand what you are offering - could you clarify?",
+        "Which product exactly are you referring to? We use several tools for {team}.",
+        "Could you explain how this relates to what {company} does?",
+        "Sorry, a bit confused by your message. What do you mean by the platform?",
+    ],
+}
+
+# Mixed or vague replies the rules should not be confident about (labels as an LLM would give)
+AMBIGUOUS_REPLIES = [
+    ("NEEDS_FOLLOW_UP", "Interested in principle, but could you send me more information on pricing first?"),
+    ("UNCLEAR", "Thanks {name}, I will review this internally."),
+    ("NEEDS_FOLLOW_UP", "Maybe later in the year, {company} is in the middle of a reorg."),
+    ("NOT_INTERESTED", "We tried something like this before and it did not work for {team}."),
+    ("INTERESTED", "Forwarding this to our head of {team}, they will reach out."),
+    ("UNCLEAR", "Got it."),
+]
+
+
+def synthetic_dataset(rows, seed=7, ambiguous_share=0.25):
+    """Formulaic replies with a little variation, labelled by construction"""
+    rng = random.Random(seed)
+    names = ["Rahim", "Ayesha", "Tanvir", "Nusrat", "Farhan", "Sadia"]
+    companies = ["TechBangla", "HealthCare BD", "Dhaka Logistics", "GreenGrid", "FinEdge"]
+    teams = ["sales", "operations", "finance", "engineering", "support"]
+    days = ["Monday", "Tuesday", "Thursday", "Friday"]
+    texts, labels = [], []
+    for _ in range(rows):
+        if rng.random() < ambiguous_share:
+            label, template = rng.choice(AMBIGUOUS_REPLIES)
+        else:
+            label = rng.choice(list(SYNTHETIC_REPLIES))
+            template = rng.choice(SYNTHETIC_REPLIES[label])
+        texts.append(template.format(name=rng.choice(names), company=rng.choice(companies),
+                                     team=rng.choice(teams), day=rng.choice(days)))
+        labels.append(label)
+    return texts, labels
+
+
+def run(rows, llm_latency, llm_concurrency, threshold):
+    texts, labels = load_training_data(DEFAULT_TRAINING_CSV)
+    source = DEFAULT_TRAINING_CSV
+    if len(texts) < 50:
+        texts, labels = synthetic_dataset(rows)
+        source = 'synthetic'
+
+    split = len(texts) // 2
+    train_texts, train_labels = texts[:split], labels[:split]
+    test_texts, test_labels = texts[split:], labels[split:]
+
+    started = time.perf_counter()
+    classifier = LocalReplyClassifier(threshold=threshold).fit(train_texts, train_labels)
+    train_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = classifier.classify(test_texts)
+    local_seconds = time.perf_counter() - started
+
+    resolved = [(r, truth) for r, truth in zip(results, test_labels) if r is not None]
+    escalated = len(test_texts) - len(resolved)
+    correct = sum(1 for r, truth in resolved if r['class'] == truth)
+
+    llm_only_seconds = len(test_texts) * llm_latency / llm_concurrency
+    hybrid_seconds = local_seconds + escalated * llm_latency / llm_concurrency
+
+    return {
+        'source': source,
+        'rows_classified': len(test_texts),
+        'train_rows': len(train_texts),
+        'train_seconds': round(train_seconds, 4),
+        'local_seconds': round(local_seconds, 4),
+        'local_us_per_row': round(local_seconds / max(1, len(test_texts)) * 1e6, 2),
+        'resolved_locally': len(resolved),
+        'resolved_share': round(len(resolved) / max(1, len(test_texts)) * 100, 2),
+        'local_accuracy': round(correct / max(1, len(resolved)) * 100, 2),
+        'escalated_to_llm': escalated,
+        'modelled_llm_only_seconds': round(llm_only_seconds, 2),
+        'modelled_hybrid_seconds': round(hybrid_seconds, 2),
+        'speedup': round(llm_only_seconds / hybrid_seconds, 2) if hybrid_seconds > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local reply classifier fast path")
+    parser.add_argument('--rows', type=int, default=5000, help="synthetic rows when no final.csv is available")
+    parser.add_argument('--llm-latency', type=float, default=1.2, help="modelled seconds per LLM call")
+    parser.add_argument('--llm-concurrency', type=int, default=8, help="modelled concurrent LLM calls")
+    parser.add_argument('--threshold', type=float, default=0.85, help="confidence needed to resolve locally")
+    parser.add_argument('--json', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    result = run(args.rows, args.llm_latency, args.llm_concurrency, args.threshold)
+
+    print("=" * 60)
+    print("⚡ LOCAL REPLY CLASSIFIER BENCHMARK")
+    print("=" * 60)
+    for key, value in result.items():
+        print(f"{key:>28}: {value}")
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
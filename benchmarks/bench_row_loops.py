@@ -0,0 +1,131 @@
+"""
+Row-Loop Microbenchmark
+Per-row overhead of the stage loops: iterrows + df.at versus dict records +
+one bulk assignment per column (see src/records.py)
+
+Both patterns do the same work lead analysis does around its LLM calls on a
+synthetic leads table:
+- iterate     visit every row and map a fixed result onto the analysis
+              columns (analysis_columns reads the row's input fields)
+- write-back  store those six columns for every row in the DataFrame
+
+No LLM, network or disk is involved, so the numbers are pure pandas/Python
+overhead per row.
+
+Usage:
+    python benchmarks/bench_row_loops.py [--rows 1000 10000 50000] [--repeat 3] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import generate_leads  # noqa: E402
+from lead_analysis import analysis_columns, ANALYSIS_COLUMNS  # noqa: E402
+from records import iter_records, assign_columns  # noqa: E402
+
+DEFAULT_ROWS = [1000, 10000, 50000]
+
+# A typical analyze_lead result
+RESULT = {'priority_score': 72, 'buyer_persona': 'Technical Decision Maker',
+          'filled_industry': 'Software', 'filled_job_title': 'CTO'}
+
+
+def load_leads(rows):
+    """Synthetic leads with the analysis columns added, as process_leads_async prepares them"""
+    with tempfile.TemporaryDirectory() as directory:
+        df = pd.read_csv(generate_leads(rows, os.path.join(directory, 'leads.csv')), dtype={'company_size': str})
+    df['priority_score'] = 0
+    for column in ANALYSIS_COLUMNS[1:]:
+        df[column] = ''
+    return df
+
+
+def iterate_iterrows(df):
+    return {idx: analysis_columns(row, RESULT) for idx, row in df.iterrows()}
+
+
+def iterate_records(df):
+    return {idx: analysis_columns(row, RESULT) for idx, row in iter_records(df)}
+
+
+def write_cells(df, results):
+    for idx, columns in results.items():
+        for column, value in columns.items():
+            df.at[idx, column] = value
+
+
+def write_bulk(df, results):
+    assign_columns(df, results, ANALYSIS_COLUMNS)
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(rows, repeat):
+    df = load_leads(rows)
+    results = iterate_records(df)
+    timings = {
+        'iterate': (best_of(repeat, iterate_iterrows, df), best_of(repeat, iterate_records, df)),
+        'write-back': (best_of(repeat, write_cells, df.copy(), results),
+                       best_of(repeat, write_bulk, df.copy(), results)),
+    }
+    # Both patterns must produce the same table
+    before, after = df.copy(), df.copy()
+    write_cells(before, iterate_iterrows(before))
+    write_bulk(after, iterate_records(after))
+    pd.testing.assert_frame_equal(before, after)
+
+    result = {'rows': rows, 'phases': {}}
+    for phase, (old, new) in timings.items():
+        result['phases'][phase] = {
+            'old_us_per_row': round(old / rows * 1e6, 2),
+            'new_us_per_row': round(new / rows * 1e6, 2),
+            'speedup': round(old / new, 1) if new else None,
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row overhead of iterrows/df.at versus records/bulk writes")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="table sizes to measure")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per pattern (best run counts)")
+    parser.add_argument('--json', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"🔁 ROW-LOOP OVERHEAD (µs per row, best of {args.repeat})")
+    print("=" * 60)
+    print(f"{'rows':>8}  {'phase':<12}{'iterrows/at':>13}{'records/bulk':>14}{'speedup':>10}")
+    results = []
+    for rows in args.rows:
+        result = run(rows, args.repeat)
+        results.append(result)
+        for phase, p in result['phases'].items():
+            print(f"{rows:>8,}  {phase:<12}{p['old_us_per_row']:>13}{p['new_us_per_row']:>14}{p['speedup']!s:>9}x")
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Campaign Metrics Engine
+Every campaign KPI in one vectorized pass, as mergeable partial aggregates
+
+CampaignAggregate holds counters, value counts, a priority histogram and
+segment x reply_class cross-tabs. add() folds in one chunk of the campaign
+table with column operations only (no per-row Python), and merge() combines
+partials computed on other chunks, shards or processes, so a multi-million
+row table is summarized chunk by chunk without ever being loaded whole:
+
+    total = CampaignAggregate()
+    for chunk in iter_table(path, columns=METRIC_COLUMNS):
+        total.add(chunk)
+    metrics = total.to_metrics()
+
+Configuration (environment variables):
+- METRICS_CHUNK_SIZE   rows per chunk when aggregating a table (default: 200000)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from storage import iter_table
+
+load_dotenv()
+
+METRICS_CHUNK_SIZE = int(os.getenv('METRICS_CHUNK_SIZE', '200000'))
+
+# Columns the metrics read; the rest of the table is never loaded
+METRIC_COLUMNS = ['email_sent', 'send_status', 'reply', 'reply_class', 'industry', 'company_size',
+                  'priority_score', 'location']
+SEGMENT_COLUMNS = ['industry', 'company_size', 'location']
+CLASS_COLUMN = 'reply_class'
+
+HIGH_PRIORITY_SCORE = 70
+# Ten 10-point buckets; a score of 100 falls into the last one
+PRIORITY_BINS = np.arange(0, 101, 10)
+
+# Read every text column as text, so chunks agree on their types
+_CSV_DTYPES = {column: str for column in SEGMENT_COLUMNS + ['send_status', 'reply', CLASS_COLUMN]}
+
+
+def _as_bool(values):
+    if values.dtype == bool:
+        return values
+    return values.astype(str).str.strip().str.lower().isin(('true', '1', 'yes'))
+
+
+def _add_counts(total, counts):
+    return counts if total is None else total.add(counts, fill_value=0)
+
+
+class CampaignAggregate:
+    """Partial campaign KPIs: add() chunks, merge() other partials, to_metrics() at the end"""
+
+    def __init__(self):
+        self.rows = 0
+        self.emails_sent = 0
+        self.emails_successful = 0
+        self.replies = 0
+        self.positive_replies = 0
+        self.negative_replies = 0
+        self.priority_sum = 0.0
+        self.priority_count = 0
+        self.high_priority = 0
+        self.priority_histogram = np.zeros(len(PRIORITY_BINS) - 1, dtype=np.int64)
+        # Value counts per segment column and reply_class (Series), cross-tabs per segment (DataFrame)
+        self.counts = {}
+        self.crosstabs = {}
+
+    def add(self, df):
+        """Fold one chunk of the campaign table into the totals"""
+        self.rows += len(df)
+        if 'email_sent' in df.columns:
+            self.emails_sent += int(_as_bool(df['email_sent']).sum())
+        if 'send_status' in df.columns:
+            self.emails_successful += int((df['send_status'] == 'Success').sum())
+
+        if 'reply' in df.columns:
+            replies = df['reply'].dropna().astype(str).str.lower()
+            self.replies += len(replies)
+            self.positive_replies += int((replies == 'yes').sum())
+            self.negative_replies += int((replies == 'no').sum())
+
+        if 'priority_score' in df.columns:
+            scores = pd.to_numeric(df['priority_score'], errors='coerce').dropna()
+            self.priority_sum += float(scores.sum())
+            self.priority_count += len(scores)
+            self.high_priority += int((scores >= HIGH_PRIORITY_SCORE).sum())
+            self.priority_histogram += np.histogram(scores.clip(0, 100), bins=PRIORITY_BINS)[0]
+
+        for column in SEGMENT_COLUMNS + [CLASS_COLUMN]:
+            if column in df.columns:
+                self.counts[column] = _add_counts(self.counts.get(column), df[column].value_counts())
+        if CLASS_COLUMN in df.columns:
+            for column in SEGMENT_COLUMNS:
+                if column in df.columns:
+                    self.crosstabs[column] = _add_counts(self.crosstabs.get(column),
+                                                         pd.crosstab(df[column], df[CLASS_COLUMN]))
+        return self
+
+    def merge(self, other):
+        """Add another partial aggregate (another chunk, shard or process) into this one"""
+        for name in ('rows', 'emails_sent', 'emails_successful', 'replies', 'positive_replies',
+                     'negative_replies', 'priority_sum', 'priority_count', 'high_priority'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.priority_histogram = self.priority_histogram + other.priority_histogram
+        for column, counts in other.counts.items():
+            self.counts[column] = _add_counts(self.counts.get(column), counts)
+        for column, table in other.crosstabs.items():
+            self.crosstabs[column] = _add_counts(self.crosstabs.get(column), table)
+        return self
+
+    def _distribution(self, column):
+        counts = self.counts.get(column)
+        if counts is None:
+            return {}
+        return {key: int(value) for key, value in counts.sort_values(ascending=False, kind='stable').items()}
+
+    def _crosstab(self, column):
+        table = self.crosstabs.get(column)
+        if table is None:
+            return {}
+        table = table.fillna(0).astype(np.int64)
+        return {segment: {label: int(count) for label, count in row.items() if count}
+                for segment, row in table.iterrows()}
+
+    def to_metrics(self):
+        """KPI dict for the report (the keys load_and_analyze_csv always returned, plus breakdowns)"""
+        neutral = self.replies - self.positive_replies - self.negative_replies
+        labels = [f"{low}-{low + 9}" for low in PRIORITY_BINS[:-2]] + [f"{PRIORITY_BINS[-2]}-100"]
+        return {
+            'total_contacts': self.rows,
+            'emails_sent': self.emails_sent,
+            'emails_successful': self.emails_successful,
+            'replies_received': self.replies,
+            'positive_replies': self.positive_replies,
+            'negative_replies': self.negative_replies,
+            'neutral_replies': neutral,
+            'response_rate': round(self.replies / self.emails_successful * 100, 2) if self.emails_successful else 0,
+            'positive_rate': round(self.positive_replies / self.replies * 100, 2) if self.replies else 0,
+            'industry_distribution': self._distribution('industry'),
+            'company_size_distribution': self._distribution('company_size'),
+            'avg_priority_score': round(self.priority_sum / self.priority_count, 2) if self.priority_count else 0,
+            'high_priority_leads': self.high_priority,
+            'location_distribution': self._distribution('location'),
+            'success_rate': round(self.emails_successful / self.emails_sent * 100, 2) if self.emails_sent else 0,
+            'reply_class_distribution': self._distribution(CLASS_COLUMN),
+            'priority_histogram': dict(zip(labels, self.priority_histogram.tolist())),
+            'industry_by_reply_class': self._crosstab('industry'),
+            'company_size_by_reply_class': self._crosstab('company_size'),
+            'location_by_reply_class': self._crosstab('location'),
+        }
+
+
+def aggregate_table(path, chunk_size=None):
+    """CampaignAggregate over a campaign table (CSV, Arrow or Parquet), read chunk by chunk"""
+    total = CampaignAggregate()
+    for chunk in iter_table(path, columns=METRIC_COLUMNS, chunk_size=chunk_size or METRICS_CHUNK_SIZE,
+                            dtype=_CSV_DTYPES):
+        total.add(chunk)
+    return total
+
+
+def campaign_metrics(path, chunk_size=None):
+    """Every campaign KPI for the table at path"""
+    return aggregate_table(path, chunk_size).to_metrics()
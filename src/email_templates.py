@@ -0,0 +1,270 @@
+"""
+Template-and-Slot Emails
+One LLM-written template per lead cluster, filled locally for low-priority leads
+
+With EMAIL_GENERATION=tiered, only leads scoring at least
+EMAIL_PERSONALIZED_MIN_SCORE get a full per-lead generation. Every other lead
+is grouped into a cluster of (buyer persona, industry), with the free-text
+persona mapped onto a fixed set (company segment x role, see
+normalize_persona) so spelling variants share a cluster. The model writes one
+template per cluster, with {name}, {company}, {job_title} and {contact_status}
+slots, and each lead's email is filled in locally. Lower-priority leads in one
+cluster would get near-identical emails anyway, so this costs one LLM call per
+cluster instead of one per lead.
+Templates go through the LLM cache like any other call, so later runs reuse
+them.
+
+Configuration (environment variables):
+- EMAIL_GENERATION               personalized | tiered (default: personalized)
+- EMAIL_PERSONALIZED_MIN_SCORE   tiered mode: score for a per-lead email (default: 70)
+- EMAIL_STREAMING=1              stream tokens for every email generation (default: off)
+"""
+
+import os
+import re
+import asyncio
+import pandas as pd
+from langchain_core.prompts import ChatPromptTemplate
+from dotenv import load_dotenv
+from llm_scheduler import HUGGINGFACE
+from llm_cache import get_cache, cache_key, store_result
+from llm_clients import get_client
+from prompt_metrics import record_prompt
+from llm_json import ainvoke_json
+
+load_dotenv()
+
+EMAIL_GENERATION_MODES = ('personalized', 'tiered')
+EMAIL_GENERATION = os.getenv('EMAIL_GENERATION', 'personalized').lower()
+EMAIL_PERSONALIZED_MIN_SCORE = float(os.getenv('EMAIL_PERSONALIZED_MIN_SCORE', '70'))
+
+SLOTS = ('name', 'company', 'job_title', 'contact_status')
+# {name} or {{name}} - models sometimes keep the doubled braces from the prompt
+_SLOT_PATTERN = re.compile(r'\{\{?\s*(' + '|'.join(SLOTS) + r')\s*\}?\}')
+
+# Expected JSON of every email generation, per-lead or template
+EMAIL_SCHEMA = {'subject': str, 'body': str, 'tone_used': str, 'key_personalization': str}
+EMAIL_REQUIRED = ('subject', 'body')
+# Stream generation tokens and finalize each email as soon as its JSON closes
+EMAIL_STREAMING = os.getenv('EMAIL_STREAMING', '0').lower() in ('1', 'true', 'yes', 'on')
+
+template_prompt = ChatPromptTemplate.from_template("""
+You are an expert B2B sales communication specialist. Write a reusable outreach email TEMPLATE
+for a group of similar leads. It will be sent to many people, so keep it specific to the group
+but never invent facts about an individual.
+
+LEAD GROUP:
+- Buyer Persona: {buyer_persona}
+- Industry: {industry}
+- Priority: below {min_score}/100 (educational, low-pressure, offer value upfront)
+
+Use these placeholders exactly as written, they are filled in per lead:
+{{name}} - recipient's name (use it in the greeting)
+{{company}} - recipient's company
+{{job_title}} - recipient's job title
+{{contact_status}} - contact history such as "Never contacted" or "Contacted 45 days ago" (optional)
+
+Style: professional, clear value proposition, 2 short paragraphs, one low-pressure call to action,
+subject line under 60 characters (may use {{company}}).
+
+Return JSON:
+{{
+  "subject": "email subject line",
+  "body": "full email body with placeholders",
+  "tone_used": "describe the tone you applied",
+  "key_personalization": "what the template tailors to this group"
+}}
+""")
+
+
+def email_generation_mode(mode=None):
+    mode = (mode or EMAIL_GENERATION).lower()
+    if mode not in EMAIL_GENERATION_MODES:
+        raise ValueError(f"Unknown email generation mode: {mode} "
+                         f"(expected one of {', '.join(EMAIL_GENERATION_MODES)})")
+    return mode
+
+
+def _score(lead):
+    try:
+        return float(lead.get('priority_score', 50))
+    except (TypeError, ValueError):
+        return 50.0
+
+
+def use_template(lead, mode=None, min_score=None):
+    """True when this lead gets a cluster template instead of a per-lead generation"""
+    if email_generation_mode(mode) != 'tiered':
+        return False
+    threshold = EMAIL_PERSONALIZED_MIN_SCORE if min_score is None else min_score
+    return _score(lead) < threshold
+
+
+# Fixed persona set for clusters: company segment x role, matched on the lower-cased persona
+# (first match wins). Industry words are ignored - industry is the cluster's other half.
+PERSONA_SEGMENTS = [
+    ('Enterprise', r'enterprise|large|corporate'),
+    ('SMB', r'\bsmb\b|small|start-?up|micro|local'),
+    ('Mid-Market', r'mid-?\s?(?:market|size)|medium|growth'),
+]
+PERSONA_ROLES = [
+    ('Founder / Owner', r'founder|owner|entrepreneur'),
+    ('Decision Maker', r'decision[- ]?maker|executive|c-level|chief|\b(?:ceo|cto|cfo|coo|cio)\b|president'),
+    ('Leader', r'leader|director|\bvp\b|vice president|\bhead\b'),
+    ('Manager', r'manager|\blead\b'),
+]
+DEFAULT_ROLE = 'Professional'
+
+
+def normalize_persona(persona):
+    """Map a free-text buyer persona onto the fixed segment x role set, e.g. 'Enterprise Decision Maker'"""
+    text = ' '.join(str(persona or '').lower().split())
+    segment = next((label for label, pattern in PERSONA_SEGMENTS if re.search(pattern, text)), 'Business')
+    role = next((label for label, pattern in PERSONA_ROLES if re.search(pattern, text)), DEFAULT_ROLE)
+    return f"{segment} {role}"
+
+
+def lead_value(lead, *columns, default=''):
+    """First of columns with a real value; blank strings and NaN (empty CSV cells) count as missing"""
+    for column in columns:
+        value = lead.get(column)
+        if value is not None and not pd.isna(value) and str(value).strip():
+            return str(value)
+    return default
+
+
+def cluster_key(lead):
+    """(normalized buyer persona, industry) - leads sharing it share a template"""
+    industry = ' '.join(lead_value(lead, 'industry', 'ai_filled_industry', default='Business').split())
+    return normalize_persona(lead_value(lead, 'buyer_persona')), industry
+
+
+def fill_template(template, lead, contact_status):
+    """Fill a cluster template with one lead's slots"""
+    values = {
+        'name': lead_value(lead, 'name', default='there'),
+        'company': lead_value(lead, 'company', default='your company'),
+        'job_title': lead_value(lead, 'job_title', 'ai_filled_job_title', default='leader'),
+        'contact_status': contact_status,
+    }
+    
+    def fill(text):
+        return _SLOT_PATTERN.sub(lambda match: values[match.group(1)], str(text))
+    
+    return {
+        'subject': fill(template['subject']),
+        'body': fill(template['body']),
+        'tone_used': template.get('tone_used', ''),
+        'key_personalization': f"Template: {template.get('key_personalization', '')}".strip(),
+    }
+
+
+class TemplateBank:
+    """Cluster templates for this process; concurrent leads of one cluster share a single LLM call"""
+
+    def __init__(self):
+        self.templates = {}
+        self._pending = {}
+        self._loop = None
+        # Stats
+        self.personalized = 0
+        self.personalized_cache_hits = 0
+        self.templated = 0
+        self.generated = 0
+        self.cache_hits = 0
+        self.failures = 0
+
+    async def get(self, cluster):
+        if cluster in self.templates:
+            return self.templates[cluster]
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Futures are bound to one event loop; the sync wrappers call asyncio.run() per stage
+            self._loop = loop
+            self._pending = {}
+        task = self._pending.get(cluster)
+        if task is None:
+            task = self._pending[cluster] = asyncio.ensure_future(self._build(cluster))
+        try:
+            return await task
+        finally:
+            if task.done() and self._pending.get(cluster) is task:
+                del self._pending[cluster]
+
+    async def _build(self, cluster):
+        buyer_persona, industry = cluster
+        messages = template_prompt.format_messages(buyer_persona=buyer_persona, industry=industry,
+                                                   min_score=f"{EMAIL_PERSONALIZED_MIN_SCORE:g}")
+        llm = get_client('email_generation')
+        cache = get_cache()
+        key = cache_key(llm.repo_id, llm.temperature, messages)
+        template = cache.get(key)
+        if template is not None:
+            self.cache_hits += 1
+        else:
+            tokens = record_prompt('email_generation', messages)
+            try:
+                template = await ainvoke_json('email_generation', HUGGINGFACE, llm, messages, EMAIL_SCHEMA,
+                                              tokens, required=EMAIL_REQUIRED, allow_truncated=False,
+                                              stream=EMAIL_STREAMING)
+            except Exception:
+                self.failures += 1
+                raise
+            store_result(cache, key, template)
+            self.generated += 1
+        self.templates[cluster] = template
+        return template
+
+    def stats(self):
+        # Model calls actually made: personalized emails not served from the cache, plus template calls
+        llm_calls = self.personalized - self.personalized_cache_hits + self.generated + self.failures
+        return {
+            'personalized': self.personalized,
+            'personalized_cache_hits': self.personalized_cache_hits,
+            'templated': self.templated,
+            'clusters': len(self.templates),
+            'templates_generated': self.generated,
+            'template_cache_hits': self.cache_hits,
+            'template_failures': self.failures,
+            'llm_calls': llm_calls,
+            # Calls tiering avoided: one per templated lead, less the template calls it cost
+            'llm_calls_saved': max(0, self.templated - self.generated - self.failures),
+        }
+
+
+_bank = TemplateBank()
+
+
+async def generate_template_email(lead, contact_status):
+    """Email for a low-priority lead: its cluster's template with the lead's slots filled in"""
+    template = await _bank.get(cluster_key(lead))
+    _bank.templated += 1
+    return fill_template(template, lead, contact_status)
+
+
+def count_personalized(cached=False):
+    """Count a lead that gets a personalized email (cached=True: served from the LLM cache)"""
+    _bank.personalized += 1
+    if cached:
+        _bank.personalized_cache_hits += 1
+
+
+def template_stats():
+    return _bank.stats()
+
+
+def print_template_stats():
+    """Print how many leads were served from templates (tiered mode only)"""
+    s = _bank.stats()
+    if not s['templated']:
+        return
+    print(f"🧩 Tiered emails: {s['personalized']} personalized (score >= {EMAIL_PERSONALIZED_MIN_SCORE:g}, "
+          f"{s['personalized_cache_hits']} cached), "
+          f"{s['templated']} from {s['clusters']} cluster templates "
+          f"({s['templates_generated']} generated, {s['template_cache_hits']} cached) "
+          f"→ {s['llm_calls']} LLM calls, {s['llm_calls_saved']} saved")
+
+
+def reset_templates():
+    global _bank
+    _bank = TemplateBank()
@@ -6,8 +6,8 @@ others expose `text_generation(...)` or `generate(...)`. LangChain's
 HuggingFaceEndpoint expects `post`. This shim adds a `post` method that
 delegates to whichever method is available.
 
-This file is imported early (from workflow/main_workflow.py) before
-other modules instantiate HuggingFaceEndpoint.
+This file is imported by llm_clients right before
+a HuggingFaceEndpoint client is first instantiated.
 """
 try:
     from huggingface_hub import InferenceClient
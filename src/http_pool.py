@@ -0,0 +1,183 @@
+"""
+Shared HTTP Connection Pools
+One pooled, keep-alive HTTP transport per LLM provider, shared by every client
+
+The provider SDKs send their requests through httpx-style clients (google-genai
+uses httpx, huggingface_hub uses httpx or httpx2 depending on its version).
+llm_clients hands every client it builds the provider's PooledTransport, so
+all stages and all client instances of a provider draw from one connection
+pool and TLS sessions are reused for the whole run. The SDK clients may open
+and close their own httpx client objects freely: closing them does not close
+the shared pool (close_pools() does).
+
+Connection reuse is measured with httpcore's `trace` request extension: a
+request that performs a TCP connect opened a new connection, every other
+request was served by an already-open one.
+
+Configuration (environment variables):
+- HF_HTTP_POOL_SIZE          max open connections to Hugging Face (default: HF_MAX_IN_FLIGHT)
+- GEMINI_HTTP_POOL_SIZE      max open connections to Gemini (default: GEMINI_MAX_IN_FLIGHT)
+- LLM_HTTP_KEEPALIVE_EXPIRY  seconds an idle connection is kept open (default: 60)
+"""
+
+import os
+import asyncio
+import threading
+import weakref
+from dotenv import load_dotenv
+from llm_scheduler import PROVIDER_DEFAULTS
+
+load_dotenv()
+
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+
+# httpcore trace events emitted when a request has to open a new connection
+_CONNECT_EVENTS = ('connection.connect_tcp.complete', 'connection.connect_unix_socket.complete')
+
+
+class PooledTransport:
+    """httpx transport (sync and async) over one keep-alive connection pool per event loop"""
+
+    def __init__(self, httpx_module, max_connections, keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY):
+        self.max_connections = max_connections
+        self._httpx = httpx_module
+        self._limits = httpx_module.Limits(max_connections=max_connections,
+                                           max_keepalive_connections=max_connections,
+                                           keepalive_expiry=keepalive_expiry)
+        self._sync = None
+        # Async connections belong to the event loop that opened them
+        self._async = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def _count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def _count_event(self, name):
+        if name in _CONNECT_EVENTS:
+            with self._lock:
+                self.connections_opened += 1
+
+    def _traced(self, request, callback):
+        request.extensions = {**request.extensions, 'trace': callback}
+        self._count_request()
+        return request
+
+    def _sync_transport(self):
+        if self._sync is None:
+            with self._lock:
+                if self._sync is None:
+                    self._sync = self._httpx.HTTPTransport(limits=self._limits)
+        return self._sync
+
+    def handle_request(self, request):
+        outer = request.extensions.get('trace')
+
+        def trace(name, info):
+            self._count_event(name)
+            if outer is not None:
+                outer(name, info)
+
+        return self._sync_transport().handle_request(self._traced(request, trace))
+
+    def _async_transport(self):
+        loop = asyncio.get_running_loop()
+        transport = self._async.get(loop)
+        if transport is None:
+            transport = self._async[loop] = self._httpx.AsyncHTTPTransport(limits=self._limits)
+        return transport
+
+    async def handle_async_request(self, request):
+        outer = request.extensions.get('trace')
+
+        async def trace(name, info):
+            self._count_event(name)
+            if outer is not None:
+                await outer(name, info)
+
+        return await self._async_transport().handle_async_request(self._traced(request, trace))
+
+    # SDK clients open and close their httpx client objects; that must not close the shared pool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+    def shutdown(self):
+        """Close the sync pool and forget the async pools (their loops close them)"""
+        with self._lock:
+            if self._sync is not None:
+                self._sync.close()
+                self._sync = None
+            self._async = weakref.WeakKeyDictionary()
+
+    def open_connections(self):
+        """Connections currently held by the pools (idle keep-alive ones included)"""
+        transports = ([self._sync] if self._sync is not None else []) + list(self._async.values())
+        return sum(len(getattr(getattr(t, '_pool', None), 'connections', ())) for t in transports)
+
+    def stats(self):
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            'max_connections': self.max_connections,
+            'open_connections': self.open_connections(),
+            'requests': self.requests,
+            'connections_opened': self.connections_opened,
+            'reused_connections': reused,
+            'reuse_rate': round(reused / self.requests * 100, 2) if self.requests else 0.0,
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_size(provider):
+    """Configured connection limit for a provider (defaults to its scheduler's in-flight cap)"""
+    defaults = PROVIDER_DEFAULTS.get(provider, {'env_prefix': provider.upper(), 'max_in_flight': 4})
+    prefix = defaults['env_prefix']
+    value = os.getenv(f'{prefix}_HTTP_POOL_SIZE') or os.getenv(f'{prefix}_MAX_IN_FLIGHT')
+    return int(float(value)) if value else int(defaults['max_in_flight'])
+
+
+def get_pool(provider, httpx_module):
+    """Process-wide pooled transport for `provider`, built on `httpx_module` (httpx or httpx2) on first use"""
+    pool = _pools.get(provider)
+    if pool is None:
+        with _pools_lock:
+            if provider not in _pools:
+                _pools[provider] = PooledTransport(
+                    httpx_module, pool_size(provider),
+                    keepalive_expiry=float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', str(DEFAULT_KEEPALIVE_EXPIRY))),
+                )
+            pool = _pools[provider]
+    return pool
+
+
+def pool_stats():
+    """Pool size and connection reuse per provider pool that has been created"""
+    return {provider: pool.stats() for provider, pool in _pools.items()}
+
+
+def close_pools():
+    """Close every pool (the next client request builds a fresh one)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
@@ -4,25 +4,26 @@ Simple AI Lead Analyzer
 """
 
 import os
+import json
 import pandas as pd
 import asyncio
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.llms import HuggingFaceEndpoint
 from langchain_core.prompts import ChatPromptTemplate
-import json
+import hashlib
 from dotenv import load_dotenv
+from llm_scheduler import estimate_tokens, print_scheduler_stats, HUGGINGFACE
+from llm_cache import get_cache, cache_key, store_result, print_cache_stats
+from llm_clients import get_client
+from run_state import row_keys
+from records import iter_records, assign_columns
+from lead_scoring import score_leads_vectorized, infer_personas_vectorized
+from storage import intermediate_path, read_table, write_table
+from tracing import traced_stage, Progress
+from prompt_metrics import prompt_mode, record_prompt, report_prompt_stats
+from llm_json import ainvoke_json, print_parse_stats
+from lead_dedup import dedupe_leads, print_dedup_stats, LEAD_DEDUP
+from email_templates import EMAIL_GENERATION
 load_dotenv()
-# Setup Gemini
-
-llm = HuggingFaceEndpoint(
-    repo_id="meta-llama/Llama-2-7b-chat-hf",
-    task="text-generation",
-    api_url="https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf",
-    temperature=0.7,
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-)
 
-print("Gemini ready!")
 # Prompt template
 prompt = ChatPromptTemplate.from_template("""
 You are a B2B sales analyst. Analyze this lead carefully and fill missing information.
@@ -95,18 +96,105 @@ Create descriptive personas like:
 - "SMB Business Owner"
 """)
 
+# Compact variant (PROMPT_MODE=compact): the rubric is a system message that is
+# identical for every lead, so providers can cache it as a shared prefix
+compact_prompt = ChatPromptTemplate.from_messages([
+    ("system", """You are a B2B sales analyst. Score each lead and fill its missing fields.
+Reply with JSON only:
+{{"priority_score": 0-100, "buyer_persona": str, "filled_industry": str, "filled_job_title": str, "filled_company_size": str, "filled_notes": str}}
+priority_score = engagement + recency + seniority + size:
+- engagement 0-30: interest/demo/budget approved 20-30, concerns or follow-up 5-10, no notes 0
+- recency 0-25: <=7 days 25, <=30 days 15, 1-3 months 10, older 5, never 0
+- seniority 0-25: C-level 25, VP/Director 20, Manager 15, Specialist/Analyst 10
+- size 0-20: 500+ 20, 200-500 15, 100-200 12, 50-100 10, 10-50 7, 1-10 5
+Fill missing fields from the company name, role and industry norms; notes = likely needs for industry + role.
+Persona examples: "Enterprise Technology Decision Maker", "Growth-Stage Startup Founder", "Mid-Market Operations Leader", "SMB Business Owner"."""),
+    ("human", "Lead: name={name} | company={company} | industry={industry} | job_title={job_title} | "
+              "company_size={company_size} | location={location} | last_contact={last_contact} | notes={notes}"),
+])
+
+
+# Hybrid scoring (LEAD_SCORING=hybrid): the rubric score is computed locally, so the
+# model is only asked for the persona and the fields the lead is missing
+hybrid_prompt = ChatPromptTemplate.from_template("""
+You are a B2B sales analyst. Describe this lead's buyer persona and fill any missing information.
+
+Lead Data:
+- Name: {name}
+- Company: {company}
+- Industry: {industry}
+- Job Title: {job_title}
+- Company Size: {company_size}
+- Location: {location}
+- Notes: {notes}
+- Last Contact: {last_contact}
+
+Return JSON with exactly these fields:
+{fields}
+
+FILLING MISSING DATA:
+- Industry: Analyze company name (e.g., "TechBangla" → Software, "HealthCare BD" → Healthcare)
+- Job Title: Use context clues (if unknown, predict based on seniority signals)
+- Company Size: Estimate from industry standards and company name
+- Notes: Predict likely interests based on industry + role
+
+BUYER PERSONA:
+Create descriptive personas like:
+- "Enterprise Technology Decision Maker"
+- "Growth-Stage Startup Founder"
+- "Mid-Market Operations Leader"
+- "SMB Business Owner"
+""")
+
+compact_hybrid_prompt = ChatPromptTemplate.from_messages([
+    ("system", """You are a B2B sales analyst. Give each lead a buyer persona and fill the fields it is missing.
+Reply with JSON only, with exactly the fields requested.
+Fill missing fields from the company name, role and industry norms; notes = likely needs for industry + role.
+Persona examples: "Enterprise Technology Decision Maker", "Growth-Stage Startup Founder", "Mid-Market Operations Leader", "SMB Business Owner"."""),
+    ("human", "Lead: name={name} | company={company} | industry={industry} | job_title={job_title} | "
+              "company_size={company_size} | location={location} | last_contact={last_contact} | notes={notes}\n"
+              "Fields: {fields}"),
+])
+
+# Lead column → (hybrid answer field, what the model should put there)
+FILLABLE_FIELDS = {
+    'industry': ('filled_industry', "<predict based on company name>"),
+    'job_title': ('filled_job_title', "<predict based on available info>"),
+    'company_size': ('filled_company_size', "<predict>"),
+    'notes': ('filled_notes', "<predict what they need>"),
+}
+
+
+def hybrid_request(fields):
+    """(JSON skeleton for the prompt, schema) covering the persona and the lead's missing fields"""
+    missing = [column for column in FILLABLE_FIELDS if fields[column] == 'Not provided']
+    skeleton = {'buyer_persona': "<persona type>"}
+    skeleton.update(dict(FILLABLE_FIELDS[column] for column in missing))
+    schema = {name: str for name in skeleton}
+    return json.dumps(skeleton, ensure_ascii=False), schema
 
-async def analyze_lead(row):
-    # Handle empty values - treat empty strings as missing
-    industry = row.get('industry', '') or 'Not provided'
-    job_title = row.get('job_title', '') or 'Not provided'
-    company_size = row.get('company_size', '') or 'Not provided'
-    notes = row.get('notes', '') or 'Not provided'
-    last_contact = row.get('last_contact', '') or 'Never contacted'
+
+def _provided(row, column, default):
+    value = row.get(column, '')
+    return default if pd.isna(value) or str(value).strip() == '' else value
+
+
+async def analyze_lead(row, scoring='llm'):
+    """
+    Score one lead, fill its missing fields and name its buyer persona. With
+    scoring='hybrid' the priority_score is left to the rubric: the result has
+    only buyer_persona and the filled_* fields the lead was missing.
+    """
+    # Handle empty values - treat empty strings and blank CSV cells (NaN) as missing
+    industry = _provided(row, 'industry', 'Not provided')
+    job_title = _provided(row, 'job_title', 'Not provided')
+    company_size = _provided(row, 'company_size', 'Not provided')
+    notes = _provided(row, 'notes', 'Not provided')
+    last_contact = _provided(row, 'last_contact', 'Never contacted')
     
     try:
         # Call AI
-        messages = prompt.format_messages(
+        fields = dict(
             name=row['name'],
             company=row['company'],
             industry=industry,
@@ -116,13 +204,32 @@ async def analyze_lead(row):
             notes=notes,
             last_contact=last_contact
         )
+        full_messages = None
+        schema, required = ANALYSIS_SCHEMA, ANALYSIS_REQUIRED
+        full_prompt, short_prompt = prompt, compact_prompt
+        if scoring == 'hybrid':
+            fields['fields'], schema = hybrid_request(fields)
+            required = HYBRID_REQUIRED
+            full_prompt, short_prompt = hybrid_prompt, compact_hybrid_prompt
+        if prompt_mode() == 'compact':
+            messages = short_prompt.format_messages(**fields)
+            full_messages = full_prompt.format_messages(**fields)
+        else:
+            messages = full_prompt.format_messages(**fields)
         
-        response = await llm.ainvoke(messages)
+        # Unchanged rows re-use the previous result from the on-disk cache
+        llm = get_client('lead_analysis')
+        cache = get_cache()
+        key = cache_key(llm.repo_id, llm.temperature, messages)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
         
-        # Parse JSON
-        result = json.loads(response.content.strip().replace('```json', '').replace('```', ''))
-        
-        return result
+        tokens = record_prompt('lead_analysis', messages, full_messages,
+                               prefix_tokens=estimate_tokens(messages[0]) if full_messages else 0)
+        # Tolerant parse: prose, fences and truncation are repaired instead of failing
+        result = await ainvoke_json('lead_analysis', HUGGINGFACE, llm, messages, schema, tokens,
+                                    required=required)
         
     except Exception as e:
         print(f"Error: {e}")
@@ -132,19 +239,135 @@ async def analyze_lead(row):
             'filled_industry': industry if industry != 'Not provided' else 'Unknown',
             'filled_job_title': job_title if job_title != 'Not provided' else 'Unknown',
             'filled_company_size': company_size if company_size != 'Not provided' else 'Unknown',
-            'filled_notes': notes if notes != 'Not provided' else 'N/A'
+            'filled_notes': notes if notes != 'Not provided' else 'N/A',
+            # Fallbacks are never checkpointed, so a resumed run retries the lead
+            'error': str(e)
         }
+    
+    # Outside the try: a failed cache write must not turn this paid result into the fallback
+    store_result(cache, key, result)
+    return result
+
+
+# Columns written by the analysis stage (everything else is lead input)
+ANALYSIS_COLUMNS = [
+    'priority_score', 'buyer_persona', 'ai_filled_industry',
+    'ai_filled_job_title', 'ai_filled_company_size', 'ai_filled_notes'
+]
+FINGERPRINT_COLUMN = 'lead_fingerprint'
+
+# Expected analyze_lead JSON; the filled_* fields fall back to the lead's own values
+ANALYSIS_SCHEMA = {
+    'priority_score': int, 'buyer_persona': str, 'filled_industry': str,
+    'filled_job_title': str, 'filled_company_size': str, 'filled_notes': str,
+}
+ANALYSIS_REQUIRED = ('priority_score', 'buyer_persona')
+HYBRID_REQUIRED = ('buyer_persona',)
+
+# Scoring mode: 'llm' (model scores everything), 'hybrid' (rubric score, model persona
+# and missing fields) or 'rules' (rubric score and rule persona, no model calls)
+SCORING_MODES = ('llm', 'hybrid', 'rules')
+LEAD_SCORING = os.getenv('LEAD_SCORING', 'llm').lower()
+
+
+def analysis_columns(row, result):
+    """Map an analyze_lead result onto the analysis output columns for one row"""
+    return {
+        'priority_score': result['priority_score'],
+        'buyer_persona': result['buyer_persona'],
+        # Fill missing data - use AI prediction only if original is empty
+        'ai_filled_industry': result.get('filled_industry', row.get('industry', '')),
+        'ai_filled_job_title': result.get('filled_job_title', row.get('job_title', '')),
+        'ai_filled_company_size': result.get('filled_company_size', row.get('company_size', '')),
+        'ai_filled_notes': result.get('filled_notes', row.get('notes', '')),
+    }
+
+
+def rule_analysis_columns(df):
+    """Analysis columns without any LLM call: rubric score, rule persona, original fields kept"""
+    def original_or(column, default):
+        values = df[column] if column in df.columns else pd.Series('', index=df.index)
+        values = values.fillna('').astype(str).str.strip()
+        return values.where(values != '', default)
+    
+    return pd.DataFrame({
+        'priority_score': score_leads_vectorized(df),
+        'buyer_persona': infer_personas_vectorized(df),
+        'ai_filled_industry': original_or('industry', 'Unknown'),
+        'ai_filled_job_title': original_or('job_title', 'Unknown'),
+        'ai_filled_company_size': original_or('company_size', 'Unknown'),
+        'ai_filled_notes': original_or('notes', 'N/A'),
+    }, index=df.index)
+
+
+def fingerprint_leads(df):
+    """Stable hash of each lead's input columns - changes whenever the row changes"""
+    input_columns = sorted(c for c in df.columns if c not in ANALYSIS_COLUMNS and c != FINGERPRINT_COLUMN)
+    values = df[input_columns].astype(str).where(df[input_columns].notna(), '')
+    joined = pd.Series('', index=df.index)
+    for column in input_columns:
+        joined = joined + f"{column}=" + values[column] + '\x1f'
+    return joined.map(lambda text: hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+
+def load_previous_analysis(output_file):
+    """Previous results indexed by fingerprint (empty if there is no usable earlier run)"""
+    if not os.path.exists(output_file):
+        return None
+    previous = read_table(output_file, columns=[FINGERPRINT_COLUMN] + ANALYSIS_COLUMNS, dtype={'company_size': str})
+    if FINGERPRINT_COLUMN not in previous.columns or not set(ANALYSIS_COLUMNS) <= set(previous.columns):
+        return None
+    previous = previous.drop_duplicates(FINGERPRINT_COLUMN).set_index(FINGERPRINT_COLUMN)
+    return previous[ANALYSIS_COLUMNS]
 
 
 # Main process
-async def process_leads_async(csv_file='sales_leads.csv'):
-    """CSV process করা - async version"""
+@traced_stage('lead_analysis')
+async def process_leads_async(csv_file='sales_leads.csv', incremental=None, scoring=None, output_file=None,
+                              run_state=None, dedup=None):
+    """
+    CSV process করা - async version
+    
+    With incremental=True (or LEAD_ANALYSIS_INCREMENTAL=1) rows whose input columns
+    are unchanged since the previous analyzed_leads table keep their earlier results;
+    only new or modified leads are sent to the LLM.
+    
+    scoring (default LEAD_SCORING) picks who computes priority_score: 'llm',
+    'hybrid' (vectorized rubric score, LLM persona/missing fields) or 'rules'
+    (vectorized rubric and persona, no LLM calls at all).
+    
+    Results go to output_file (default output/analyzed_leads.arrow, see storage). With a
+    run_state (run_state.RunState) every analyzed lead is checkpointed, and leads
+    finished before a resumed run was interrupted are not sent to the LLM again.
+    
+    With dedup=True (or LEAD_DEDUP=1) near-duplicate leads are merged before
+    analysis (see lead_dedup); the removed rows go to output/lead_duplicates.
+    """
+    if incremental is None:
+        incremental = os.getenv('LEAD_ANALYSIS_INCREMENTAL', '0').lower() in ('1', 'true', 'yes', 'on')
+    scoring = (scoring or LEAD_SCORING).lower()
+    if scoring not in SCORING_MODES:
+        raise ValueError(f"Unknown scoring mode: {scoring} (expected one of {', '.join(SCORING_MODES)})")
+    
+    if output_file is None:
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output_file = intermediate_path(os.path.join(base_dir, 'output'), 'analyzed_leads')
+    output_dir = os.path.dirname(os.path.abspath(output_file))
     
     # Load CSV
     df = pd.read_csv(csv_file, dtype={'company_size': str})
     print(f"\nLoaded {len(df)} leads\n")
     
+    # Merge near-duplicates first, so each person is analyzed, emailed and sent to once
+    if LEAD_DEDUP if dedup is None else dedup:
+        df, duplicates, index = dedupe_leads(df)
+        os.makedirs(output_dir, exist_ok=True)
+        write_table(duplicates, intermediate_path(output_dir, 'lead_duplicates'))
+        print_dedup_stats(index, scoring, templated=EMAIL_GENERATION == 'tiered')
+        print()
+    
     # Add new columns
+    df[FINGERPRINT_COLUMN] = fingerprint_leads(df)
     df['priority_score'] = 0
     df['buyer_persona'] = ''
     df['ai_filled_industry'] = ''
@@ -152,73 +375,113 @@ async def process_leads_async(csv_file='sales_leads.csv'):
     df['ai_filled_company_size'] = ''
     df['ai_filled_notes'] = ''
     
+    # Incremental mode: copy results for unchanged leads from the previous run
+    pending = df
+    if incremental:
+        previous = load_previous_analysis(output_file)
+        if previous is None:
+            print("♻️  Incremental mode: no previous analysis found, analyzing all leads\n")
+        else:
+            reused = df[FINGERPRINT_COLUMN].isin(previous.index)
+            if reused.any():
+                df.loc[reused, ANALYSIS_COLUMNS] = previous.loc[df.loc[reused, FINGERPRINT_COLUMN], ANALYSIS_COLUMNS].values
+            pending = df[~reused]
+            print(f"♻️  Incremental mode: reusing {int(reused.sum())} unchanged leads, "
+                  f"{len(pending)} new or changed\n")
+    
+    # Resumed run: leads checkpointed before the interruption keep their results
+    stage_keys = None
+    if run_state is not None:
+        stage_keys = row_keys(df)
+        done = run_state.completed('lead_analysis')
+        finished = pending.index[stage_keys[pending.index].isin(done.keys())]
+        assign_columns(df, {idx: analysis_columns(row, done[stage_keys[idx]])
+                            for idx, row in iter_records(df, finished)}, ANALYSIS_COLUMNS)
+        pending = pending.drop(finished)
+        print(f"🧾 Run {run_state.run_id}: {len(finished)} leads already analyzed, {len(pending)} to go\n")
+    
+    # Rule-based scoring: one vectorized pass over every pending lead
+    rule_scores = None
+    if scoring == 'rules':
+        df.loc[pending.index, ANALYSIS_COLUMNS] = rule_analysis_columns(pending)
+        print(f"📐 Scored {len(pending)} leads with the rule-based rubric (no LLM calls)\n")
+        pending = pending.iloc[0:0]
+    elif scoring == 'hybrid':
+        rule_scores = score_leads_vectorized(pending)
+        print(f"📐 Scored {len(pending)} leads with the rule-based rubric; "
+              f"LLM fills persona and missing fields\n")
+    
     # Process all leads in parallel with real-time output
-    print(f"🤖 Analyzing {len(df)} leads in parallel...\n")
+    print(f"🤖 Analyzing {len(pending)} leads in parallel...\n")
     
     # Create tasks with indices - use a wrapper to track index
     async def analyze_with_index(idx, row):
-        result = await analyze_lead(row)
+        result = await analyze_lead(row, scoring)
         return idx, row, result
     
     tasks = []
-    for idx, row in df.iterrows():
+    for idx, row in iter_records(pending):
         tasks.append(asyncio.create_task(analyze_with_index(idx, row)))
     
-    # Process results as they complete
+    # Process results as they complete (one progress line at a time in quiet mode)
     completed_count = 0
     results_dict = {}
+    progress = Progress('lead_analysis', len(pending))
     
     for coro in asyncio.as_completed(tasks):
         try:
             idx, row, result = await coro
             completed_count += 1
             
+            if rule_scores is not None:
+                # Hybrid answers carry no score of their own
+                result = {**result, 'priority_score': int(rule_scores[idx])}
+            
             # Print output immediately
-            print(f"🤖 [{completed_count}/{len(df)}] Analyzed: {row['name']}...")
-            print(f"   Score: {result['priority_score']}/100 | {result['buyer_persona']}\n")
+            progress.advance(f"🤖 [{completed_count}/{len(pending)}] Analyzed: {row['name']}...\n"
+                             f"   Score: {result['priority_score']}/100 | {result['buyer_persona']}\n",
+                             failed=bool(result.get('error')))
             
-            # Store result with original index
-            results_dict[idx] = result
+            # Store the row's output columns with its original index
+            results_dict[idx] = analysis_columns(row, result)
+            if run_state is not None and not result.get('error'):
+                run_state.mark_done('lead_analysis', stage_keys[idx], result)
             
         except Exception as e:
             completed_count += 1
             # Extract idx and row from exception if possible, or use fallback
-            print(f"❌ Error analyzing lead: {e}\n")
+            progress.advance(f"❌ Error analyzing lead: {e}\n", failed=True)
             # We can't recover idx/row from exception, so we'll handle it differently
             # For now, just continue
     
-    # Update dataframe with results
-    for idx, result in results_dict.items():
-        row = df.loc[idx]
-        df.at[idx, 'priority_score'] = result['priority_score']
-        df.at[idx, 'buyer_persona'] = result['buyer_persona']
-        
-        # Fill missing data - use AI prediction only if original is empty
-        df.at[idx, 'ai_filled_industry'] = result.get('filled_industry', row.get('industry', ''))
-        df.at[idx, 'ai_filled_job_title'] = result.get('filled_job_title', row.get('job_title', ''))
-        df.at[idx, 'ai_filled_company_size'] = result.get('filled_company_size', row.get('company_size', ''))
-        df.at[idx, 'ai_filled_notes'] = result['filled_notes']
+    progress.finish()
+    if run_state is not None:
+        run_state.flush()
+    
+    # Update dataframe with results (one assignment per column)
+    assign_columns(df, results_dict, ANALYSIS_COLUMNS)
     
-    # Sort by priority score (highest first)
-    df = df.sort_values('priority_score', ascending=False)
+    # Sort by priority score (highest first); stable so ties keep input order
+    df = df.sort_values('priority_score', ascending=False, kind='stable')
     
     # Save - use relative path (works in both Docker and local)
-    import os
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    output_dir = os.path.join(base_dir, 'output')
     os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, 'analyzed_leads.csv')
-    df.to_csv(output_file, index=False)
+    write_table(df, output_file)
     
     print(f"✅ Done! Saved to: {output_file}")
-    print(f"✅ Sorted by priority (highest to lowest)\n")
+    print(f"✅ Sorted by priority (highest to lowest)")
+    print_scheduler_stats(HUGGINGFACE)
+    print_cache_stats()
+    report_prompt_stats('lead_analysis')
+    print_parse_stats('lead_analysis')
+    print()
     
     return df
 
 
-def process_leads(csv_file='sales_leads.csv'):
+def process_leads(csv_file='sales_leads.csv', incremental=None, scoring=None, output_file=None, dedup=None):
     """CSV process করা - sync wrapper for backward compatibility"""
-    return asyncio.run(process_leads_async(csv_file))
+    return asyncio.run(process_leads_async(csv_file, incremental, scoring, output_file, dedup=dedup))
 
 
 # Run
@@ -0,0 +1,238 @@
+"""
+Lead Deduplication
+Merges near-duplicate CRM records before analysis, so each person is scored,
+emailed and sent to once
+
+Two records are the same lead when
+- their normalized emails match (lower-cased, "+tag" dropped), or
+- their normalized name + company are near-identical: MinHash signatures over
+  character 3-grams, bucketed with locality-sensitive hashing (LSH_BANDS bands
+  of LSH_ROWS rows). A candidate from a shared bucket is accepted when the
+  estimated Jaccard similarity reaches LEAD_DEDUP_THRESHOLD.
+
+Each row is checked against one representative per bucket, so the work grows
+linearly with the number of leads (no pairwise comparison). The index is
+incremental: the streaming pipeline feeds it chunk by chunk. Duplicates are
+merged into the first record of their cluster: empty fields are filled from
+the duplicates, and distinct notes are joined. The dedup_cluster and
+duplicate_count columns record the merge.
+
+Configuration (environment variables):
+- LEAD_DEDUP=1               enable deduplication (default: off)
+- LEAD_DEDUP_THRESHOLD       minimum estimated Jaccard similarity (default: 0.7)
+"""
+
+import os
+import re
+import hashlib
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LEAD_DEDUP = os.getenv('LEAD_DEDUP', '0').lower() in ('1', 'true', 'yes', 'on')
+LEAD_DEDUP_THRESHOLD = float(os.getenv('LEAD_DEDUP_THRESHOLD', '0.7'))
+
+CLUSTER_COLUMN = 'dedup_cluster'
+COUNT_COLUMN = 'duplicate_count'
+DEDUP_COLUMNS = [CLUSTER_COLUMN, COUNT_COLUMN]
+
+# 8 bands x 4 rows: pairs above ~0.6 Jaccard share a bucket with high probability
+LSH_BANDS = 8
+LSH_ROWS = 4
+NUM_PERM = LSH_BANDS * LSH_ROWS
+SHINGLE_SIZE = 3
+
+_rng = np.random.RandomState(1)
+# Odd 64-bit multipliers for multiply-shift hashing (arithmetic wraps modulo 2**64)
+_PERM_A = _rng.randint(0, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.randint(0, 1 << 62, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_BAND_MIX = np.array([0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F], dtype=np.uint64)[:LSH_ROWS]
+
+_COMPANY_SUFFIXES = re.compile(
+    r'\b(ltd|limited|inc|incorporated|llc|plc|corp|corporation|co|company|group|pvt|private|gmbh|bd)\b'
+)
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def _clean(values):
+    return pd.Series(values).fillna('').astype(str).str.strip().str.lower()
+
+
+def normalize_emails(values):
+    """Lower-cased emails without "+tag" (empty when there is no usable address)"""
+    emails = _clean(values)
+    emails = emails.str.replace(r'\+[^@]*@', '@', regex=True)
+    return emails.where(emails.str.contains('@', regex=False), '')
+
+
+def normalize_names(names, companies):
+    """name|company with punctuation, spacing and company suffixes removed"""
+    name = _clean(names).str.replace(_NON_ALNUM, '', regex=True)
+    company = _clean(companies).str.replace(_COMPANY_SUFFIXES, ' ', regex=True).str.replace(_NON_ALNUM, '', regex=True)
+    return (name + '|' + company).where(name != '', '')
+
+
+def minhash_signatures(keys, block_size=10000):
+    """(len(keys), NUM_PERM) MinHash signatures over character 3-grams; all-max rows for empty keys"""
+    keys = list(keys)
+    signatures = np.full((len(keys), NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+    # Blocks of rows keep the (shingles x permutations) matrix small on big files
+    for start in range(0, len(keys), block_size):
+        shingles, owners = [], []
+        for row, key in enumerate(keys[start:start + block_size], start):
+            if not key:
+                continue
+            grams = {key[i:i + SHINGLE_SIZE] for i in range(max(1, len(key) - SHINGLE_SIZE + 1))}
+            shingles.extend(grams)
+            owners.extend([row] * len(grams))
+        if not shingles:
+            continue
+        # One vectorized hash per shingle, then multiply-shift hashing for every permutation
+        hashes = pd.util.hash_array(np.array(shingles, dtype=object))
+        owners = np.asarray(owners)
+        permuted = ((hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) >> np.uint64(32)).astype(np.uint32)
+        # Shingles are grouped by row, so each row's minimum is one reduceat slice
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        signatures[owners[starts]] = np.minimum.reduceat(permuted, starts, axis=0)
+    return signatures
+
+
+def band_keys(signatures):
+    """(rows, LSH_BANDS) bucket hashes, one per band of LSH_ROWS signature values"""
+    bands = signatures.reshape(len(signatures), LSH_BANDS, LSH_ROWS)
+    return (bands * _BAND_MIX).sum(axis=2)
+
+
+class DedupIndex:
+    """Incremental exact-email + MinHash/LSH index over the leads seen so far"""
+
+    def __init__(self, threshold=None):
+        self.threshold = LEAD_DEDUP_THRESHOLD if threshold is None else threshold
+        self._emails = {}
+        self._buckets = [{} for _ in range(LSH_BANDS)]
+        self._signatures = {}
+        self._cluster_ids = {}
+        self.rows = 0
+        self.exact_matches = 0
+        self.fuzzy_matches = 0
+        self.clusters = set()
+
+    def assign(self, df):
+        """
+        Representative row number (over everything added so far) for each row of
+        df. A row that is its own representative is a new lead.
+        """
+        emails = normalize_emails(df['email'] if 'email' in df.columns else [''] * len(df)).tolist()
+        names = normalize_names(df['name'] if 'name' in df.columns else [''] * len(df),
+                                df['company'] if 'company' in df.columns else [''] * len(df)).tolist()
+        signatures = minhash_signatures(names)
+        buckets = band_keys(signatures).tolist()
+
+        representatives = np.empty(len(df), dtype=np.int64)
+        for i in range(len(df)):
+            row = self.rows + i
+            representative = self._emails.get(emails[i]) if emails[i] else None
+            if representative is not None:
+                self.exact_matches += 1
+            elif names[i]:
+                for band, bucket in enumerate(buckets[i]):
+                    candidate = self._buckets[band].get(bucket)
+                    if candidate is not None and np.mean(self._signatures[candidate] == signatures[i]) >= self.threshold:
+                        representative = candidate
+                        self.fuzzy_matches += 1
+                        break
+
+            if representative is None:
+                # New lead: it represents every later match
+                representative = row
+                self._cluster_ids[row] = hashlib.sha1(
+                    (emails[i] or names[i] or str(row)).encode('utf-8')).hexdigest()[:12]
+                if names[i]:
+                    self._signatures[row] = signatures[i]
+                    for band, bucket in enumerate(buckets[i]):
+                        self._buckets[band].setdefault(bucket, row)
+            else:
+                self.clusters.add(representative)
+            if emails[i]:
+                self._emails.setdefault(emails[i], representative)
+            representatives[i] = representative
+        self.rows += len(df)
+        return representatives
+
+    def cluster_id(self, representative):
+        return self._cluster_ids[representative]
+
+    def stats(self):
+        duplicates = self.exact_matches + self.fuzzy_matches
+        return {
+            'rows': self.rows,
+            'unique': self.rows - duplicates,
+            'duplicates': duplicates,
+            'exact_matches': self.exact_matches,
+            'fuzzy_matches': self.fuzzy_matches,
+            'clusters': len(self.clusters),
+        }
+
+
+def _join_notes(values):
+    notes = []
+    for value in values:
+        text = str(value).strip()
+        if text and text.lower() != 'nan' and text not in notes:
+            notes.append(text)
+    return '; '.join(notes)
+
+
+def merge_duplicates(df, representatives, index):
+    """
+    Collapse each cluster into its first record: missing fields are taken from
+    the duplicates, notes are joined. Returns (merged, duplicates).
+    """
+    local = representatives - (index.rows - len(df))
+    df = df.copy()
+    df[CLUSTER_COLUMN] = [index.cluster_id(r) for r in representatives]
+    df[COUNT_COLUMN] = pd.Series(representatives).map(pd.Series(representatives).value_counts()).to_numpy() - 1
+    is_duplicate = local != np.arange(len(df))
+
+    duplicates = df[is_duplicate]
+    merged = df[~is_duplicate].copy()
+    # Duplicates of leads from an earlier chunk (streaming) have nothing left to merge into
+    clusters = duplicates.loc[local[is_duplicate] >= 0, CLUSTER_COLUMN].unique()
+    if len(clusters) == 0:
+        return merged, duplicates
+
+    members = df[df[CLUSTER_COLUMN].isin(clusters)]
+    # The representative comes first, so first() keeps its values and fills its gaps
+    filled = members.replace('', np.nan).groupby(CLUSTER_COLUMN, sort=False).first()
+    if 'notes' in df.columns:
+        filled['notes'] = members.groupby(CLUSTER_COLUMN, sort=False)['notes'].agg(_join_notes)
+    targets = merged[CLUSTER_COLUMN].isin(clusters)
+    updates = filled.reindex(merged.loc[targets, CLUSTER_COLUMN]).set_axis(merged.index[targets])
+    columns = [c for c in updates.columns if c != COUNT_COLUMN]
+    merged.loc[targets, columns] = updates[columns].where(updates[columns].notna(), merged.loc[targets, columns])
+    return merged, duplicates
+
+
+def dedupe_leads(df, index=None):
+    """
+    Deduplicate one table (or one streaming chunk, with a shared index).
+    Returns (unique leads with dedup columns, removed duplicates, index).
+    """
+    index = index or DedupIndex()
+    representatives = index.assign(df)
+    merged, duplicates = merge_duplicates(df.reset_index(drop=True), representatives, index)
+    return merged, duplicates, index
+
+
+def print_dedup_stats(index, scoring='llm', templated=False):
+    """Print duplicates found and the LLM calls / sends they no longer cost"""
+    s = index.stats()
+    print(f"🧬 Dedup: {s['rows']} leads → {s['unique']} unique "
+          f"({s['duplicates']} duplicates in {s['clusters']} clusters: "
+          f"{s['exact_matches']} same email, {s['fuzzy_matches']} fuzzy name+company)")
+    if s['duplicates']:
+        analysis_calls = 0 if scoring == 'rules' else s['duplicates']
+        print(f"   Avoided {analysis_calls} lead-analysis LLM calls, "
+              f"{'up to ' if templated else ''}{s['duplicates']} email generations and {s['duplicates']} sends")
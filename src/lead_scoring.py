@@ -0,0 +1,147 @@
+"""
+Rule-Based Lead Scoring
+The lead_analysis.py rubric as vectorized pandas/NumPy column operations
+
+Implements the same 0-100 priority rubric the LLM is asked to apply:
+- engagement signals in notes (30 points max)
+- recency of last contact (25 points max)
+- job title seniority (25 points max)
+- company size (20 points max)
+
+Every component is computed column-wise over the distinct values of its input
+column, so a million leads score in seconds with no network calls.
+"""
+
+import numpy as np
+import pandas as pd
+from negation import negated_pattern
+
+# Engagement keywords (case-insensitive regexes); negated positives ("not interested") earn nothing
+POSITIVE_SIGNALS = (r"\binterested\b|requested (?:a )?demo|demo request|"
+                    r"budget approved|approved budget|ready to (?:buy|move|proceed|sign)|\bkeen\b|\beager\b|"
+                    r"wants? (?:a )?(?:demo|trial|pricing|quote)|asked for (?:a )?(?:quote|pricing|proposal)")
+NEGATED_POSITIVE_SIGNALS = negated_pattern(POSITIVE_SIGNALS)
+CONCERN_SIGNALS = (r"limited budget|budget (?:concern|constraint|freeze)|tight budget|"
+                   r"needs? follow[- ]?up|follow[- ]?up|not (?:the )?right time|\blater\b|"
+                   r"evaluating|comparing|hesitant|concern")
+
+# Seniority classes, checked in order (first match wins)
+SENIORITY_PATTERNS = [
+    (25, r"\b(?:ceo|cto|cfo|coo|cmo|cio|ciso|cro|chief|founder|co-founder|president|owner|managing director|partner)\b"),
+    (20, r"\b(?:vp|svp|evp|avp|vice president|director|head)\b"),
+    (15, r"\b(?:manager|lead|supervisor|principal)\b"),
+    (5, r"\b(?:intern|junior|trainee|assistant)\b"),
+]
+DEFAULT_TITLE_POINTS = 10  # specialist / analyst / any other stated role
+
+# Lower bound of the company-size range → points
+SIZE_BUCKETS = [(500, 20), (200, 15), (100, 12), (50, 10), (10, 7), (1, 5)]
+SIZE_WORDS = [(20, r"enterprise|large"), (12, r"mid|medium"), (7, r"small"), (5, r"startup|micro")]
+
+MISSING_MARKERS = {'', 'nan', 'none', 'not provided', 'unknown', 'n/a', 'never contacted'}
+
+
+def _clean_text(series):
+    """Lower-cased strings with missing markers turned into empty strings"""
+    text = series.fillna('').astype(str).str.strip().str.lower()
+    return text.where(~text.isin(MISSING_MARKERS), '')
+
+
+def _per_unique(series, points_fn):
+    """Evaluate points_fn once per distinct value and broadcast back (lead columns repeat a lot)"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    points = np.asarray(points_fn(pd.Series(uniques)), dtype=np.int64)
+    return pd.Series(points[codes], index=series.index)
+
+
+def _column(df, name):
+    return df[name] if name in df.columns else pd.Series('', index=df.index)
+
+
+def _engagement(values):
+    text = _clean_text(values)
+    positive_hits = (text.str.count(POSITIVE_SIGNALS) - text.str.count(NEGATED_POSITIVE_SIGNALS)).clip(lower=0)
+    concern_hits = text.str.count(CONCERN_SIGNALS)
+    return np.select(
+        [positive_hits > 0, concern_hits > 0],
+        [np.minimum(30, 15 + 5 * positive_hits), 8],
+        default=0,
+    )
+
+
+def _seniority(values):
+    text = _clean_text(values)
+    conditions = [text.str.contains(pattern, regex=True) for _, pattern in SENIORITY_PATTERNS]
+    points = [score for score, _ in SENIORITY_PATTERNS]
+    return np.select(conditions + [text != ''], points + [DEFAULT_TITLE_POINTS], default=0)
+
+
+def _company_size(values):
+    text = _clean_text(values)
+    lower_bound = pd.to_numeric(text.str.replace(',', '', regex=False).str.extract(r'(\d+)')[0], errors='coerce')
+    conditions = [lower_bound >= threshold for threshold, _ in SIZE_BUCKETS]
+    points = [score for _, score in SIZE_BUCKETS]
+    word_conditions = [lower_bound.isna() & text.str.contains(pattern, regex=True) for _, pattern in SIZE_WORDS]
+    word_points = [score for score, _ in SIZE_WORDS]
+    return np.select(conditions + word_conditions, points + word_points, default=0)
+
+
+def engagement_points(notes):
+    """+20-30 for positive signals (more hits → more points), +8 for concerns only"""
+    return _per_unique(notes, _engagement)
+
+
+def recency_points(last_contact, as_of=None):
+    """25 within a week, 15 within 30 days, 10 within 90 days, 5 older, 0 never"""
+    as_of = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp.now().normalize()
+
+    def _recency(values):
+        dates = pd.to_datetime(values, errors='coerce', format='%Y-%m-%d')
+        days = (as_of - dates).dt.days
+        return np.select([days <= 7, days <= 30, days <= 90, days.notna()], [25, 15, 10, 5], default=0)
+
+    return _per_unique(last_contact, _recency)
+
+
+def seniority_points(job_title):
+    """25 C-level, 20 VP/Director, 15 Manager, 10 other roles, 5 junior, 0 unknown"""
+    return _per_unique(job_title, _seniority)
+
+
+def company_size_points(company_size):
+    """Bucket on the lower bound of ranges like '50-100' or '500+'; size words as a fallback"""
+    return _per_unique(company_size, _company_size)
+
+
+def score_leads_vectorized(df, as_of=None, breakdown=False):
+    """
+    Priority score (0-100) for every lead in df using the lead_analysis rubric.
+    With breakdown=True returns a DataFrame of the four components plus the total.
+    """
+    components = pd.DataFrame({
+        'engagement_points': engagement_points(_column(df, 'notes')),
+        'recency_points': recency_points(_column(df, 'last_contact'), as_of),
+        'seniority_points': seniority_points(_column(df, 'job_title')),
+        'company_size_points': company_size_points(_column(df, 'company_size')),
+    }, index=df.index)
+    total = components.sum(axis=1).clip(0, 100).astype(int)
+    if breakdown:
+        components['priority_score'] = total
+        return components
+    return total
+
+
+def infer_personas_vectorized(df):
+    """Descriptive buyer persona from company size, industry and seniority (no LLM)"""
+    size = company_size_points(_column(df, 'company_size'))
+    seniority = seniority_points(_column(df, 'job_title'))
+    size_label = pd.Series(np.select([size >= 20, size >= 10], ['Enterprise', 'Mid-Market'], default='SMB'),
+                           index=df.index)
+    role_label = pd.Series(np.select(
+        [seniority >= 25, seniority >= 20, seniority >= 15],
+        ['Decision Maker', 'Leader', 'Manager'],
+        default='Practitioner',
+    ), index=df.index)
+    industry = _column(df, 'industry').fillna('').astype(str).str.strip()
+    industry = industry.where(~industry.str.lower().isin(MISSING_MARKERS), 'Business')
+    return size_label + ' ' + industry + ' ' + role_label
@@ -0,0 +1,243 @@
+"""
+LLM Response Cache
+Content-addressed, on-disk (SQLite) cache for parsed LLM results
+
+Keys are a SHA-256 hash of (model repo_id, temperature, rendered prompt messages),
+so an unchanged lead row re-uses the previous result instead of paying for a new
+call. Entries expire after a TTL and the file is kept under a size budget by
+evicting the least recently used entries. Writes stay O(log n): the cache
+keeps a running byte total (read once at open) and only sweeps expired
+entries every EVICT_EVERY writes, or when the total passes the budget, in
+which case it evicts down to EVICT_TARGET of the budget.
+
+Several processes (sharded runs) may share one cache file: it runs in WAL
+mode and a writer waits up to LLM_CACHE_BUSY_TIMEOUT for a lock instead of
+failing with "database is locked". Stages store results with store_result(),
+which only logs a failed write, so a paid-for result is never discarded
+because the cache could not keep it.
+
+Configuration (environment variables):
+- LLM_CACHE=0                disable the cache
+- LLM_CACHE_PATH             SQLite file (default: output/llm_cache.sqlite)
+- LLM_CACHE_TTL              seconds before an entry expires (default: 30 days, 0 = never)
+- LLM_CACHE_MAX_BYTES        size budget for cached values (default: 256 MB)
+- LLM_CACHE_BUSY_TIMEOUT     seconds to wait for another process's lock (default: 30)
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, 'output', 'llm_cache.sqlite')
+DEFAULT_BUSY_TIMEOUT = 30.0
+
+# Writes between sweeps for expired entries
+EVICT_EVERY = 500
+# An over-budget sweep evicts down to this fraction of max_bytes, so it is not repeated on the next write
+EVICT_TARGET = 0.9
+
+
+def _render_messages(messages):
+    """Turn prompt messages / strings into a stable, JSON-serialisable form"""
+    if isinstance(messages, str):
+        return messages
+    if isinstance(messages, dict):
+        return {key: _render_messages(value) for key, value in sorted(messages.items())}
+    if isinstance(messages, (list, tuple)):
+        return [_render_messages(message) for message in messages]
+    content = getattr(messages, 'content', None)
+    if content is not None:
+        return [getattr(messages, 'type', type(messages).__name__), content]
+    return str(messages)
+
+
+def cache_key(repo_id, temperature, messages):
+    """Hash of (model repo_id, temperature, rendered prompt messages)"""
+    payload = json.dumps(
+        {'model': repo_id, 'temperature': temperature, 'messages': _render_messages(messages)},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed LRU cache with TTL and hit/miss counters"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=30 * 24 * 3600, max_bytes=256 * 1024 * 1024,
+                 busy_timeout=DEFAULT_BUSY_TIMEOUT):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._writes_since_sweep = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Wait for other processes' write locks (sqlite's busy timeout) instead of failing at once
+        self._conn = sqlite3.connect(path, timeout=busy_timeout)
+        self._conn.execute(f'PRAGMA busy_timeout={int(busy_timeout * 1000)}')
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)')
+        self._conn.commit()
+        # Running size of cached values; the only full-table sum outside an eviction sweep
+        self._bytes = self._total_bytes()
+
+    def _total_bytes(self):
+        return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache').fetchone()[0]
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss / expired entry"""
+        row = self._conn.execute(
+            'SELECT value, created_at, size FROM llm_cache WHERE key = ?', (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or (self.ttl and now - row[1] > self.ttl):
+            if row is not None:
+                self._conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self._conn.commit()
+                self._bytes -= row[2]
+            self.misses += 1
+            return None
+        try:
+            self._conn.execute('UPDATE llm_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+        except sqlite3.OperationalError:
+            # Only LRU bookkeeping; a hit is still a hit when the file stays locked
+            self._conn.rollback()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Store a JSON-serialisable value and evict LRU entries over the size budget"""
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        now = time.time()
+        try:
+            old = self._conn.execute('SELECT size FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, data, len(data), now, now),
+            )
+            size = self._bytes + len(data) - (old[0] if old else 0)
+            sweeps = self._writes_since_sweep + 1
+            if (self.ttl and sweeps >= EVICT_EVERY) or (self.max_bytes and size > self.max_bytes):
+                size, evicted = self._evict()
+                sweeps = 0
+            else:
+                evicted = 0
+            self._conn.commit()
+        except sqlite3.Error:
+            # Do not leave a half-done transaction holding the write lock
+            self._conn.rollback()
+            raise
+        self._bytes = size
+        self._writes_since_sweep = sweeps
+        self.evictions += evicted
+        self.writes += 1
+
+    def _evict(self):
+        """Drop expired entries, then LRU entries down to EVICT_TARGET of the budget: (bytes left, evicted)"""
+        evicted = 0
+        if self.ttl:
+            cursor = self._conn.execute('DELETE FROM llm_cache WHERE created_at < ?',
+                                        (time.time() - self.ttl,))
+            evicted += cursor.rowcount
+        # Re-read the total here: other processes sharing the file write to it too
+        total = self._total_bytes()
+        if not self.max_bytes or total <= self.max_bytes:
+            return total, evicted
+        # Walk entries oldest-access first until we are back under the target
+        excess = total - int(self.max_bytes * EVICT_TARGET)
+        doomed = []
+        for key, size in self._conn.execute('SELECT key, size FROM llm_cache ORDER BY accessed_at'):
+            doomed.append((key,))
+            excess -= size
+            total -= size
+            if excess <= 0:
+                break
+        self._conn.executemany('DELETE FROM llm_cache WHERE key = ?', doomed)
+        return total, evicted + len(doomed)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0.0,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+class _DisabledCache:
+    """Stand-in used when LLM_CACHE=0 so callers never need to branch"""
+
+    hits = misses = writes = evictions = 0
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def stats(self):
+        return {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'hit_rate': 0.0}
+
+    def close(self):
+        pass
+
+
+_cache = None
+
+
+def get_cache():
+    """Process-wide cache configured from environment variables"""
+    global _cache
+    if _cache is None:
+        if os.getenv('LLM_CACHE', '1').lower() in ('0', 'false', 'no', 'off'):
+            _cache = _DisabledCache()
+        else:
+            _cache = LLMCache(
+                path=os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+                ttl=float(os.getenv('LLM_CACHE_TTL', str(30 * 24 * 3600))),
+                max_bytes=int(os.getenv('LLM_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+                busy_timeout=float(os.getenv('LLM_CACHE_BUSY_TIMEOUT', str(DEFAULT_BUSY_TIMEOUT))),
+            )
+    return _cache
+
+
+def store_result(cache, key, value):
+    """cache.set that only logs a failure - the caller keeps its result either way"""
+    try:
+        cache.set(key, value)
+    except Exception as e:
+        print(f"⚠️  LLM cache write failed, result kept: {e}")
+
+
+def print_cache_stats():
+    """Print hit/miss counters for the process-wide cache"""
+    s = get_cache().stats()
+    print(f"🗄️  LLM cache: {s['hits']} hits | {s['misses']} misses | "
+          f"{s['hit_rate']}% hit rate | {s['evictions']} evicted")
@@ -0,0 +1,171 @@
+"""
+LLM Client Registry
+Lazily built, process-wide LLM clients shared by every stage
+
+Clients are keyed by (provider, model, params): every stage asking for the same
+configuration gets the same instance instead of constructing its own. Every
+client of a provider also sends through that provider's shared keep-alive
+connection pool (see http_pool): Hugging Face clients via huggingface_hub's
+client factories, Gemini clients via the google-genai `client_args` transport.
+client_stats() reports clients built, client handouts, and each pool's size
+and connection reuse.
+
+Provider SDKs (langchain_community, langchain_google_genai and the
+huggingface_hub / Google client libraries behind them) are slow to import, so
+nothing here imports them until a client is first requested.
+"""
+
+import os
+import threading
+from dotenv import load_dotenv
+from llm_scheduler import HUGGINGFACE, GEMINI
+from http_pool import get_pool, pool_stats, close_pools
+
+load_dotenv()
+
+LLAMA_2_CHAT = "meta-llama/Llama-2-7b-chat-hf"
+LLAMA_2_CHAT_URL = f"https://api-inference.huggingface.co/models/{LLAMA_2_CHAT}"
+
+# Named client configurations: (provider, constructor keyword arguments).
+# Stages whose settings match resolve to the same shared client.
+CLIENT_CONFIGS = {
+    'lead_analysis': (HUGGINGFACE, {
+        'repo_id': LLAMA_2_CHAT, 'task': "text-generation", 'api_url': LLAMA_2_CHAT_URL, 'temperature': 0.7,
+    }),
+    'email_generation': (HUGGINGFACE, {
+        'repo_id': LLAMA_2_CHAT, 'task': "text-generation", 'api_url': LLAMA_2_CHAT_URL, 'temperature': 0.7,
+    }),
+    'mail_reply': (HUGGINGFACE, {
+        'repo_id': LLAMA_2_CHAT, 'task': "text-generation", 'api_url': LLAMA_2_CHAT_URL, 'temperature': 0.7,
+    }),
+    'response_analysis': (HUGGINGFACE, {
+        'repo_id': LLAMA_2_CHAT, 'task': "text-generation", 'api_url': LLAMA_2_CHAT_URL, 'temperature': 0.7,
+    }),
+    'reply_classifier': (HUGGINGFACE, {
+        'repo_id': "openai/gpt-oss-20b", 'temperature': 0.9,
+    }),
+    'campaign_report': (GEMINI, {
+        'model': "gemini-2.5-flash", 'temperature': 0.7, 'top_p': 0.95, 'top_k': 40,
+        'max_output_tokens': 2048, 'convert_system_message_to_human': True,
+    }),
+}
+
+
+_hf_pool_installed = False
+
+
+def _install_hf_pool():
+    """Make every huggingface_hub HTTP client (sync and async) send through the shared HF pool"""
+    global _hf_pool_installed
+    if _hf_pool_installed:
+        return
+    import huggingface_hub
+    from huggingface_hub.utils import _http
+    # huggingface_hub 2.x sends through httpx2, 1.x through httpx
+    httpx = getattr(_http, 'httpx2', None) or _http.httpx
+
+    def client_factory():
+        return httpx.Client(transport=get_pool(HUGGINGFACE, httpx), follow_redirects=True, timeout=None,
+                            event_hooks={'request': [_http.hf_request_event_hook]})
+
+    def async_client_factory():
+        return httpx.AsyncClient(transport=get_pool(HUGGINGFACE, httpx), follow_redirects=True, timeout=None,
+                                 event_hooks={'request': [_http.async_hf_request_event_hook],
+                                              'response': [_http.async_hf_response_event_hook]})
+
+    huggingface_hub.set_client_factory(client_factory)
+    huggingface_hub.set_async_client_factory(async_client_factory)
+    _hf_pool_installed = True
+
+
+def _build_huggingface(**params):
+    import hf_compat  # noqa: F401 - patches InferenceClient before the endpoint is created
+    from langchain_community.llms import HuggingFaceEndpoint
+    _install_hf_pool()
+    return HuggingFaceEndpoint(huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"), **params)
+
+
+def _build_gemini(**params):
+    import httpx
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    # google-genai builds its sync and async httpx clients from client_args; both get the shared pool
+    return ChatGoogleGenerativeAI(google_api_key=os.getenv("GOOGLE_API_KEY"),
+                                  client_args={'transport': get_pool(GEMINI, httpx)}, **params)
+
+
+BUILDERS = {HUGGINGFACE: _build_huggingface, GEMINI: _build_gemini}
+
+_clients = {}
+_lock = threading.Lock()
+
+# get_llm calls per client key
+_handouts = {}
+
+
+def client_key(provider, params):
+    """Hashable (provider, model, params) key for a client configuration"""
+    params = dict(params)
+    model = params.pop('repo_id', None) or params.pop('model', None)
+    return provider, model, tuple(sorted((name, repr(value)) for name, value in params.items()))
+
+
+def get_llm(provider, **params):
+    """Shared client for (provider, model, params), built on first use"""
+    key = client_key(provider, params)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            if key not in _clients:
+                _clients[key] = BUILDERS[provider](**params)
+                print(f"✅ LLM client ready: {provider} {key[1]}")
+            client = _clients[key]
+    _handouts[key] = _handouts.get(key, 0) + 1
+    return client
+
+
+def get_client(name):
+    """Shared client for a named configuration (stages with identical settings share one)"""
+    if name not in CLIENT_CONFIGS:
+        raise KeyError(f"Unknown LLM client: {name} (expected one of {', '.join(CLIENT_CONFIGS)})")
+    provider, params = CLIENT_CONFIGS[name]
+    return get_llm(provider, **params)
+
+
+def client_stats():
+    """Clients built, get_llm handouts, and per-provider HTTP pool size and connection reuse"""
+    handouts = sum(_handouts.values())
+    built = len(_clients)
+    return {
+        'clients': built,
+        'handouts': handouts,
+        # Handouts served by an already-built client instead of a new one
+        'repeat_handouts': max(0, handouts - built),
+        'per_client': [
+            {'provider': key[0], 'model': key[1], 'handouts': _handouts.get(key, 0)}
+            for key in _clients
+        ],
+        'pools': pool_stats(),
+    }
+
+
+def print_client_stats():
+    """Print clients built, handouts, and how many HTTP requests reused a pooled connection"""
+    s = client_stats()
+    if not s['handouts']:
+        return
+    print(f"🔗 LLM clients: {s['clients']} built, {s['handouts']} client handouts "
+          f"({s['repeat_handouts']} served by an existing client)")
+    for client in s['per_client']:
+        print(f"   {client['provider']} {client['model']}: {client['handouts']} handouts")
+    for provider, pool in s['pools'].items():
+        print(f"🔌 HTTP pool [{provider}] {pool['open_connections']}/{pool['max_connections']} connections open, "
+              f"{pool['requests']} requests, {pool['connections_opened']} connections opened, "
+              f"{pool['reused_connections']} reused ({pool['reuse_rate']}%)")
+
+
+def reset_clients():
+    """Drop every built client, its stats and the HTTP pools (the next request builds fresh ones)"""
+    with _lock:
+        _clients.clear()
+        _handouts.clear()
+        close_pools()
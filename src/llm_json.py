@@ -0,0 +1,360 @@
+"""
+Tolerant JSON Extraction
+Parses JSON out of raw model output instead of falling back to defaults
+
+Models wrap their JSON in preambles ("Here is the analysis:"), code fences
+and trailing prose, or get cut off at the token limit. Each of those used to
+throw in json.loads and turn a paid call into the stage's generic fallback.
+parse_json recovers in three steps:
+1. extract  the first balanced {...} object, skipping prose and fences
+            (string-aware, so braces inside values don't confuse it)
+2. repair   common defects: trailing commas, smart quotes, Python literals
+            (True/None), and an object truncated mid-way (open strings and
+            brackets are closed, unless the caller rejects truncation);
+            rewrites only touch the text between string literals, so
+            values like "None, thanks" come through unchanged
+3. validate required fields and types against a small schema; numbers are
+            coerced ("85", "85/100" → 85)
+Only when all three fail does ainvoke_json re-ask the model with a short
+repair prompt (the broken output plus the expected fields), not the full
+original prompt.
+
+With stream=True the reply is read token by token through JsonObjectScanner
+and finalized the moment its JSON object closes (trailing prose is never
+waited for); email generation uses this with EMAIL_STREAMING=1.
+
+Per-stage counts (clean, repaired locally, recovered by re-ask, failed) are
+kept for print_parse_stats / parse_stats.
+
+Configuration (environment variables):
+- LLM_JSON_REPAIR_RETRIES   repair re-asks per call after local repair fails (default: 1, 0 = off)
+"""
+
+import os
+import re
+import json
+from dotenv import load_dotenv
+from llm_scheduler import submit, estimate_tokens
+from prompt_metrics import timed_call
+
+load_dotenv()
+
+LLM_JSON_REPAIR_RETRIES = int(os.getenv('LLM_JSON_REPAIR_RETRIES', '1'))
+
+# Repair prompts see at most this much of the broken output
+REPAIR_EXCERPT_CHARS = 2000
+
+_SMART_QUOTES = str.maketrans({'\u201c': '"', '\u201d': '"', '\u2018': "'", '\u2019': "'"})
+_SMART_DOUBLE_QUOTES = '\u201c\u201d'
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_PYTHON_LITERALS = re.compile(r'(?<=[:\[,\s])(True|False|None)(?=\s*[,}\]])')
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+# Per-stage counters for this process
+_stats = {}
+
+
+class JsonParseError(ValueError):
+    """Model output that holds no usable JSON object"""
+
+
+def response_text(response):
+    """Text of an LLM response: chat models return a message, text-generation endpoints a str"""
+    return response if isinstance(response, str) else str(getattr(response, 'content', response))
+
+
+class JsonObjectScanner:
+    """
+    Incremental, string-aware scanner for the first {...} object in a text
+    that arrives in pieces (a token stream). feed() returns True once the
+    object has closed.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.start = -1
+        self.end = -1
+        self.closers = []
+        self.in_string = False
+        self.escaped = False
+
+    @property
+    def complete(self):
+        return self.end >= 0
+
+    def string_char(self, char):
+        """Advance the string/escape state past char; True when char is part of a string literal"""
+        if self.in_string:
+            if self.escaped:
+                self.escaped = False
+            elif char == '\\':
+                self.escaped = True
+            elif char == '"':
+                self.in_string = False
+            return True
+        if char == '"':
+            self.in_string = True
+            return True
+        return False
+
+    def feed(self, piece):
+        if self.complete:
+            return True
+        offset = len(self.text)
+        self.text += piece
+        if self.start < 0:
+            found = piece.find('{')
+            if found < 0:
+                return False
+            self.start = offset + found
+            offset = self.start
+        for i in range(offset, len(self.text)):
+            char = self.text[i]
+            if self.string_char(char):
+                continue
+            if char in '{[':
+                self.closers.append('}' if char == '{' else ']')
+            elif char in '}]':
+                if self.closers:
+                    self.closers.pop()
+                if not self.closers:
+                    self.end = i + 1
+                    return True
+        return False
+
+
+def extract_json_object(text):
+    """
+    (object, truncated) for the first balanced {...} object in text. A truncated
+    object is returned with its open strings and brackets closed; (None, False)
+    when there is no '{'.
+    """
+    scanner = JsonObjectScanner()
+    if scanner.feed(text):
+        return text[scanner.start:scanner.end], False
+    if scanner.start < 0:
+        return None, False
+    # Truncated: drop a dangling separator and close whatever is still open
+    tail = text[scanner.start:].rstrip()
+    if scanner.escaped:
+        tail = tail[:-1]
+    if scanner.in_string:
+        tail += '"'
+    tail = re.sub(r'[,:]\s*$', '', tail)
+    if tail.rstrip().endswith('"') and re.search(r'[{,]\s*"[^"]*"$', tail):
+        # A key with no value yet
+        tail = re.sub(r',?\s*"[^"]*"$', '', tail)
+    return tail + ''.join(reversed(scanner.closers)), True
+
+
+def _split_strings(candidate):
+    """
+    (is_string, text) runs of candidate, split with JsonObjectScanner's quote /
+    escape tracking. Smart double quotes that open or close a string become
+    ASCII quotes; inside an ASCII-quoted string they are left as content.
+    """
+    scanner = JsonObjectScanner()
+    runs = []
+    smart = False
+    for char in candidate:
+        if char in _SMART_DOUBLE_QUOTES and (not scanner.in_string or (smart and not scanner.escaped)):
+            smart = not scanner.in_string
+            char = '"'
+        in_string = scanner.string_char(char)
+        if runs and runs[-1][0] == in_string:
+            runs[-1][1].append(char)
+        else:
+            runs.append((in_string, [char]))
+    return [(in_string, ''.join(chars)) for in_string, chars in runs]
+
+
+def _repair_structure(text):
+    text = text.translate(_SMART_QUOTES)
+    text = _PYTHON_LITERALS.sub(lambda m: {'True': 'true', 'False': 'false', 'None': 'null'}[m.group(1)], text)
+    return _TRAILING_COMMA.sub(r'\1', text)
+
+
+def repair_json(candidate):
+    """Fix the defects models commonly produce; returns the repaired string"""
+    repaired = []
+    for in_string, text in _split_strings(candidate):
+        if in_string:
+            # Raw newlines / tabs inside strings are invalid JSON but common in email bodies
+            repaired.append(text.replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t'))
+        else:
+            repaired.append(_repair_structure(text))
+    return ''.join(repaired)
+
+
+def _coerce(value, kind):
+    if kind is str:
+        if value is None:
+            return ''
+        return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    if kind in (int, float):
+        if isinstance(value, bool):
+            raise TypeError('boolean')
+        if isinstance(value, (int, float)):
+            return kind(value)
+        match = _NUMBER.search(str(value))
+        if match is None:
+            raise TypeError(f'not a number: {value!r}')
+        return kind(float(match.group(0)))
+    return value
+
+
+def validate_json(obj, schema, required=None):
+    """
+    Check obj against schema ({field: str | int | float}), coercing values to
+    the declared types. Fields in required (default: all of schema) must be
+    present; unknown fields are kept as they are.
+    """
+    if not isinstance(obj, dict):
+        raise JsonParseError(f"expected a JSON object, got {type(obj).__name__}")
+    required = schema if required is None else required
+    missing = [field for field in required if obj.get(field) in (None, '')]
+    if missing:
+        raise JsonParseError(f"missing fields: {', '.join(missing)}")
+    result = dict(obj)
+    for field, kind in schema.items():
+        if field in result:
+            try:
+                result[field] = _coerce(result[field], kind)
+            except (TypeError, ValueError) as e:
+                raise JsonParseError(f"field {field}: {e}") from None
+    return result
+
+
+def _stage(stage):
+    if stage not in _stats:
+        _stats[stage] = {'responses': 0, 'clean': 0, 'repaired': 0, 'reasked': 0,
+                         'recovered': 0, 'failed': 0, 'streamed': 0, 'trailing_cut': 0}
+    return _stats[stage]
+
+
+def parse_json(text, schema, required=None, allow_truncated=True):
+    """
+    (result, repaired) from raw model output; repaired is True when the strict
+    parse failed and extraction / repair was needed. With allow_truncated=False
+    a cut-off object is rejected instead of closed. Raises JsonParseError.
+    """
+    stripped = text.strip()
+    try:
+        return validate_json(json.loads(stripped), schema, required), False
+    except ValueError:
+        pass
+    candidate, truncated = extract_json_object(stripped)
+    if candidate is None:
+        raise JsonParseError("no JSON object in response")
+    if truncated and not allow_truncated:
+        raise JsonParseError("response was cut off")
+    for attempt in (candidate, repair_json(candidate)):
+        try:
+            obj = json.loads(attempt)
+        except ValueError:
+            continue
+        return validate_json(obj, schema, required), True
+    raise JsonParseError("unparseable JSON object in response")
+
+
+repair_prompt_text = """Your previous reply could not be parsed ({error}).
+Return ONLY a valid JSON object with these fields: {fields}. No prose, no code fences.
+
+Previous reply:
+{excerpt}"""
+
+
+async def astream_text(llm, messages, stats=None):
+    """
+    Stream llm's reply and stop reading as soon as its first JSON object closes,
+    so trailing prose is never waited for. Returns the text received.
+    """
+    scanner = JsonObjectScanner()
+    stream = llm.astream(messages)
+    try:
+        async for chunk in stream:
+            if scanner.feed(response_text(chunk)):
+                break
+    finally:
+        await stream.aclose()
+    if stats is not None:
+        stats['streamed'] += 1
+        if scanner.complete and scanner.text[scanner.end:].strip():
+            # Trailing prose had started arriving; the rest of it was never waited for
+            stats['trailing_cut'] += 1
+    return scanner.text
+
+
+async def ainvoke_json(stage, provider, llm, messages, schema, tokens, required=None, allow_truncated=True,
+                       stream=False):
+    """
+    Call llm (through the scheduler, timed for stage) and return its output as a
+    validated dict. Defective JSON is repaired locally first; the model is
+    re-asked with a short repair prompt only when that fails. Pass
+    allow_truncated=False when a cut-off value is unusable (an email body).
+    With stream=True tokens are streamed and the reply is finalized when its
+    JSON closes (see astream_text). Raises JsonParseError when no attempt
+    yields valid JSON.
+    """
+    s = _stage(stage)
+    s['responses'] += 1
+    if stream:
+        call = lambda: astream_text(llm, messages, s)
+    else:
+        call = lambda: llm.ainvoke(messages)
+    text = response_text(await submit(provider, timed_call(stage, call), tokens=tokens))
+    try:
+        result, repaired = parse_json(text, schema, required, allow_truncated)
+        s['repaired' if repaired else 'clean'] += 1
+        return result
+    except JsonParseError as error:
+        last_error = error
+
+    for _ in range(LLM_JSON_REPAIR_RETRIES):
+        s['reasked'] += 1
+        repair_prompt = repair_prompt_text.format(error=last_error, fields=', '.join(schema),
+                                                  excerpt=text[:REPAIR_EXCERPT_CHARS])
+        text = response_text(await submit(provider, timed_call(stage, lambda: llm.ainvoke(repair_prompt)),
+                                          tokens=estimate_tokens(repair_prompt)))
+        try:
+            result, _ = parse_json(text, schema, required, allow_truncated)
+            s['recovered'] += 1
+            return result
+        except JsonParseError as error:
+            last_error = error
+
+    s['failed'] += 1
+    raise last_error
+
+
+def parse_stats():
+    """Per-stage parse outcomes and failure rates (before and after recovery)"""
+    result = {}
+    for stage, s in _stats.items():
+        responses = s['responses'] or 1
+        malformed = s['responses'] - s['clean']
+        result[stage] = {
+            **s,
+            'malformed_rate': round(malformed / responses * 100, 1),
+            'failure_rate': round(s['failed'] / responses * 100, 1),
+            # Calls that would have ended in the stage's fallback before
+            'calls_recovered': s['repaired'] + s['recovered'],
+        }
+    return result
+
+
+def print_parse_stats(stage):
+    """Print how many of a stage's responses were streamed, needed repair and were lost"""
+    s = parse_stats().get(stage)
+    if s and s['streamed']:
+        print(f"🌊 Streamed [{stage}]: {s['streamed']} replies finalized as their JSON closed, "
+              f"{s['trailing_cut']} with trailing text cut off")
+    if not s or not s['malformed_rate']:
+        return
+    print(f"🩹 JSON [{stage}]: {s['responses'] - s['clean']}/{s['responses']} responses malformed "
+          f"({s['malformed_rate']}%) → {s['repaired']} repaired locally, {s['recovered']}/{s['reasked']} "
+          f"recovered by re-ask, {s['failed']} failed ({s['failure_rate']}%)")
+
+
+def reset_parse_stats():
+    _stats.clear()
@@ -0,0 +1,262 @@
+"""
+LLM Call Scheduler
+Bounded concurrency + token-bucket rate limits per provider, shared by every stage
+
+Every stage submits its LLM calls through `submit(provider, call)` instead of
+awaiting the client directly. Each provider gets:
+- a max-in-flight cap (how many requests may be open at once)
+- a requests-per-minute token bucket
+- a tokens-per-minute token bucket
+- retry with jittered exponential backoff on 429 / 5xx responses
+
+Limits are configured through environment variables, e.g.
+HF_MAX_IN_FLIGHT, HF_RPM, HF_TPM, GEMINI_MAX_IN_FLIGHT, GEMINI_RPM, GEMINI_TPM.
+A value of 0 for RPM/TPM disables that bucket.
+
+Each submitted call is traced as an llm.call span (see tracing) with its queue
+wait, retries, estimated prompt tokens and response size.
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+from dotenv import load_dotenv
+from tracing import span, NOOP_SPAN
+
+load_dotenv()
+
+HUGGINGFACE = 'huggingface'
+GEMINI = 'gemini'
+
+# Defaults sized for the free tiers; override via environment variables
+PROVIDER_DEFAULTS = {
+    HUGGINGFACE: {'env_prefix': 'HF', 'max_in_flight': 8, 'rpm': 120, 'tpm': 0},
+    GEMINI: {'env_prefix': 'GEMINI', 'max_in_flight': 4, 'rpm': 15, 'tpm': 1000000},
+}
+
+MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '1.0'))
+BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '30.0'))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_STATUS_PATTERN = re.compile(r'\b(429|500|502|503|504)\b')
+_RETRYABLE_TEXT = ('too many requests', 'rate limit', 'overloaded', 'service unavailable',
+                   'resource_exhausted', 'temporarily unavailable')
+
+
+def estimate_tokens(payload):
+    """Rough token estimate (~4 characters per token) for rate limiting"""
+    if payload is None:
+        return 0
+    if isinstance(payload, (list, tuple)):
+        return sum(estimate_tokens(item) for item in payload)
+    if isinstance(payload, dict):
+        return sum(estimate_tokens(value) for value in payload.values())
+    text = getattr(payload, 'content', payload)
+    return max(1, len(str(text)) // 4)
+
+
+def is_retryable(error):
+    """429 / 5xx and rate-limit style errors are worth retrying"""
+    for source in (error, getattr(error, 'response', None)):
+        status = getattr(source, 'status_code', None) or getattr(source, 'status', None)
+        if isinstance(status, int):
+            return status in RETRYABLE_STATUS
+    message = str(error).lower()
+    if any(text in message for text in _RETRYABLE_TEXT):
+        return True
+    return bool(_STATUS_PATTERN.search(message))
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter"""
+    ceiling = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = float(per_minute) / 60.0
+        # Burst size defaults to one minute's worth of tokens
+        self.capacity = float(capacity) if capacity is not None else float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    @property
+    def enabled(self):
+        return self.rate > 0 and self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """Wait until `amount` tokens are available, then take them"""
+        if not self.enabled:
+            return
+        amount = min(float(amount), self.capacity)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio primitives are bound to one event loop; the sync wrappers
+            # call asyncio.run() per stage so rebuild the lock when it changes
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class ProviderScheduler:
+    """Concurrency cap, rate limits, retries and stats for one provider"""
+
+    def __init__(self, name, max_in_flight, rpm, tpm):
+        self.name = name
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self._semaphore = None
+        self._loop = None
+
+        # Stats
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.in_flight = 0
+        self.tokens_sent = 0
+        self.started_at = None
+
+    def _get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    async def _attempt(self, call, tokens, timing):
+        semaphore = self._get_semaphore()
+        queued_at = time.monotonic()
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+        try:
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(tokens)
+            timing['queue_wait'] += time.monotonic() - queued_at
+            self.in_flight += 1
+            self.tokens_sent += tokens
+            try:
+                return await call()
+            finally:
+                self.in_flight -= 1
+        finally:
+            semaphore.release()
+
+    async def submit(self, call, tokens=0):
+        """
+        Run `call` (a zero-argument function returning an awaitable) under this
+        provider's limits. Retryable failures are retried with jittered backoff;
+        the last error is re-raised so callers keep their own fallback handling.
+        """
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        self.submitted += 1
+
+        with span('llm.call', provider=self.name, tokens=tokens) as trace:
+            attempt = 0
+            timing = {'queue_wait': 0.0}
+            while True:
+                try:
+                    result = await self._attempt(call, tokens, timing)
+                    self.completed += 1
+                    if trace is not NOOP_SPAN:
+                        trace.set(retries=attempt, queue_wait_ms=round(timing['queue_wait'] * 1000, 3),
+                                  response_chars=len(str(getattr(result, 'content', result))))
+                    return result
+                except Exception as e:
+                    if attempt >= MAX_RETRIES or not is_retryable(e):
+                        self.failed += 1
+                        trace.set(retries=attempt, queue_wait_ms=round(timing['queue_wait'] * 1000, 3))
+                        raise
+                    self.retries += 1
+                    # Back off outside the semaphore so other calls can proceed
+                    await asyncio.sleep(backoff_delay(attempt))
+                    attempt += 1
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'provider': self.name,
+            'max_in_flight': self.max_in_flight,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'retries': self.retries,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queued,
+            'max_queue_depth': self.max_queue_depth,
+            'tokens_sent': self.tokens_sent,
+            'elapsed_sec': round(elapsed, 2),
+            'requests_per_sec': round(self.completed / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+_schedulers = {}
+
+
+def _env_number(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, '') else default
+
+
+def get_scheduler(provider):
+    """Process-wide scheduler for a provider (created on first use)"""
+    if provider not in _schedulers:
+        defaults = PROVIDER_DEFAULTS.get(provider, {'env_prefix': provider.upper(),
+                                                    'max_in_flight': 4, 'rpm': 0, 'tpm': 0})
+        prefix = defaults['env_prefix']
+        _schedulers[provider] = ProviderScheduler(
+            provider,
+            max_in_flight=_env_number(f'{prefix}_MAX_IN_FLIGHT', defaults['max_in_flight']),
+            rpm=_env_number(f'{prefix}_RPM', defaults['rpm']),
+            tpm=_env_number(f'{prefix}_TPM', defaults['tpm']),
+        )
+    return _schedulers[provider]
+
+
+async def submit(provider, call, tokens=0):
+    """Submit one LLM call through the shared scheduler for `provider`"""
+    return await get_scheduler(provider).submit(call, tokens)
+
+
+def scheduler_stats():
+    """Stats for every provider that has been used in this process"""
+    return {name: scheduler.stats() for name, scheduler in _schedulers.items()}
+
+
+def print_scheduler_stats(provider=None):
+    """Print queue depth and throughput for one or all providers"""
+    names = [provider] if provider else list(_schedulers)
+    for name in names:
+        if name not in _schedulers:
+            continue
+        s = _schedulers[name].stats()
+        print(f"📈 LLM [{s['provider']}] completed {s['completed']}/{s['submitted']} "
+              f"| failed {s['failed']} | retries {s['retries']} "
+              f"| max queue {s['max_queue_depth']} | {s['requests_per_sec']} req/s")
@@ -1,11 +1,15 @@
-import pandas as pd
 import random
 import asyncio
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.llms import HuggingFaceEndpoint
 import os
 
 from dotenv import load_dotenv
+from llm_scheduler import submit, estimate_tokens, print_scheduler_stats, HUGGINGFACE
+from llm_json import response_text
+from llm_clients import get_client
+from run_state import row_keys
+from storage import intermediate_path, require_table, read_table, write_table
+from records import iter_records, assign_columns
+from tracing import traced_stage, Progress
 load_dotenv()
 
 async def process_single_email_reply(row, idx, llm):
@@ -39,7 +43,10 @@ async def process_single_email_reply(row, idx, llm):
     }
     
     try:
-        reply_body = (await llm.ainvoke(prompts[reply_type])).content
+        reply_prompt = prompts[reply_type]
+        # Text-generation endpoints return a str, chat models a message
+        reply_body = response_text(await submit(HUGGINGFACE, lambda: llm.ainvoke(reply_prompt),
+                                                tokens=estimate_tokens(reply_prompt)))
         return {
             'idx': idx,
             'reply': "Yes",
@@ -56,22 +63,18 @@ async def process_single_email_reply(row, idx, llm):
         }
 
 
-async def process_emails_with_types_async(input_csv: str, output_csv: str):
+@traced_stage('mail_reply')
+async def process_emails_with_types_async(input_csv: str, output_csv: str, run_state=None):
     """
     Process emails with 5 random reply types as specified - async version.
+    With a run_state, generated replies are checkpointed and reused on resume.
     """
-    # Read CSV
+    # Read sent emails
     print(f"Reading {input_csv}...")
-    df = pd.read_csv(input_csv)
+    df = read_table(input_csv)
     
-    # Initialize LLM via HuggingFace endpoint
-    llm = HuggingFaceEndpoint(
-        repo_id="meta-llama/Llama-2-7b-chat-hf",
-        task="text-generation",
-        api_url="https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf",
-        temperature=0.7,
-        huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-    )
+    # Shared HuggingFace endpoint client (built on first use)
+    llm = get_client('mail_reply')
     
     # Add reply columns
     df['reply'] = ""
@@ -84,13 +87,23 @@ async def process_emails_with_types_async(input_csv: str, output_csv: str):
         result = await process_single_email_reply(row, idx, llm)
         return idx, result
     
+    # Resumed run: replies checkpointed before the interruption are reused
+    results_dict = {}
+    stage_keys = None
+    if run_state is not None:
+        stage_keys = row_keys(df)
+        done = run_state.completed('mail_reply')
+        for idx in df.index[stage_keys.isin(done.keys())]:
+            results_dict[idx] = done[stage_keys[idx]]
+        print(f"🧾 Run {run_state.run_id}: {len(results_dict)} replies already processed\n")
+    
     tasks = []
-    for idx, row in df.iterrows():
+    for idx, row in iter_records(df, df.index[~df.index.isin(list(results_dict))]):
         tasks.append(asyncio.create_task(process_with_index(idx, row)))
     
-    # Process results as they complete
+    # Process results as they complete (one progress line at a time in quiet mode)
     completed_count = 0
-    results_dict = {}
+    progress = Progress('mail_reply', len(tasks))
     
     for coro in asyncio.as_completed(tasks):
         try:
@@ -100,37 +113,43 @@ async def process_emails_with_types_async(input_csv: str, output_csv: str):
             # Print output immediately
             reply_type = result.get('reply_type', 'Unknown')
             if result['reply'] == 'Yes':
-                print(f"📧 [{completed_count}/{len(df)}] Reply generated for email {idx+1}")
-                print(f"    Reply type: {reply_type}")
+                message = f"📧 [{completed_count}/{len(tasks)}] Reply generated for email {idx+1}\n    Reply type: {reply_type}\n"
                 reply_body = result.get('reply_mail_body', '')
                 if reply_body:
                     preview = reply_body[:100] + "..." if len(reply_body) > 100 else reply_body
-                    print(f"    Preview: {preview}")
-                print()
+                    message += f"    Preview: {preview}\n"
+                progress.advance(message)
             else:
                 error_msg = f" - Error: {result.get('error', '')}" if result.get('error') else ""
-                print(f"⏭️  [{completed_count}/{len(df)}] Skipped email {idx+1} (Type: {reply_type}){error_msg}\n")
+                progress.advance(f"⏭️  [{completed_count}/{len(tasks)}] Skipped email {idx+1} (Type: {reply_type}){error_msg}\n",
+                                 failed=bool(result.get('error')))
             
             # Store result with original index
             results_dict[idx] = result
+            if run_state is not None and not result.get('error'):
+                run_state.mark_done('mail_reply', stage_keys[idx], result)
             
         except Exception as e:
             completed_count += 1
-            print(f"❌ [{completed_count}/{len(df)}] Error processing email: {e}\n")
+            progress.advance(f"❌ [{completed_count}/{len(tasks)}] Error processing email: {e}\n", failed=True)
             # We can't recover idx from exception, skip this entry
     
-    # Update dataframe with results
-    for idx, result in results_dict.items():
-        df.at[df.index[idx], 'reply'] = result['reply']
-        df.at[df.index[idx], 'reply_mail_body'] = result['reply_mail_body']
+    progress.finish()
+    if run_state is not None:
+        run_state.flush()
+    
+    # Update dataframe with results (one assignment per column)
+    assign_columns(df, results_dict, ['reply', 'reply_mail_body'])
     
     # Save
-    df.to_csv(output_csv, index=False)
+    write_table(df, output_csv)
     print(f"✓ Saved to {output_csv}")
     
     # Summary
     print(f"\nReplied: {(df['reply'] == 'Yes').sum()}")
-    print(f"Skipped: {(df['reply'] == 'No').sum()}\n")
+    print(f"Skipped: {(df['reply'] == 'No').sum()}")
+    print_scheduler_stats(HUGGINGFACE)
+    print()
 
 
 def process_emails_with_types(input_csv: str, output_csv: str):
@@ -141,8 +160,7 @@ def process_emails_with_types(input_csv: str, output_csv: str):
 
 # Run
 if __name__ == "__main__":
-    import os
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    input_file = os.path.join(base_dir, 'output', 'emails_sent_status.csv')
-    output_file = os.path.join(base_dir, 'output', 'emails_with_replies.csv')
+    output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+    input_file = require_table(output_dir, 'emails_sent_status')
+    output_file = intermediate_path(output_dir, 'emails_with_replies')
     asyncio.run(process_emails_with_types_async(input_file, output_file))
@@ -0,0 +1,30 @@
+"""
+Negation Guard
+Keeps negated keywords ("not currently interested", "wouldn't be interested")
+from counting as positive signals
+
+A keyword counts as negated when a negation word (not, no, never, unsure,
+any n't contraction, ...) appears at most NEGATION_WINDOW tokens before it in
+the same clause; punctuation ends the look-back, so "No problem, we're
+interested" is not negated. Shared by the local reply classifier (negated
+rule matches are escalated to the LLM) and the rule-based lead scorer
+(negated signals earn no engagement points).
+"""
+
+import re
+
+NEGATION_WINDOW = 3
+
+NEGATION_WORDS = r"(?:not|no|never|nor|neither|cannot|unsure|hardly|[a-z]+n['’]t)"
+# A token may contain apostrophes ("we'd"); the gap between tokens may not cross clause punctuation
+_TOKEN = r"[\w'’]+"
+_GAP = r"[^\w'’.,;:!?]+"
+
+
+def negated_pattern(pattern, window=NEGATION_WINDOW):
+    """Regex matching `pattern` only where a negation word precedes it within `window` tokens"""
+    return rf"\b{NEGATION_WORDS}(?:{_GAP}{_TOKEN}){{0,{window}}}?{_GAP}(?:{pattern})"
+
+
+def compile_negated(pattern, window=NEGATION_WINDOW):
+    return re.compile(negated_pattern(pattern, window), re.IGNORECASE)
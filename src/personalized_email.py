@@ -4,27 +4,24 @@ Professional, GRE-style emails with dynamic tone based on lead profile
 """
 
 import os
-import pandas as pd
 import asyncio
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.llms import HuggingFaceEndpoint
 from langchain_core.prompts import ChatPromptTemplate
-import json
 from datetime import datetime
 from dotenv import load_dotenv
+from llm_scheduler import estimate_tokens, print_scheduler_stats, HUGGINGFACE
+from llm_cache import get_cache, cache_key, store_result, print_cache_stats
+from llm_clients import get_client
+from run_state import row_keys
+from storage import intermediate_path, require_table, read_table, write_table
+from records import iter_records, assign_columns
+from tracing import traced_stage, Progress
+from prompt_metrics import prompt_mode, record_prompt, report_prompt_stats
+from llm_json import ainvoke_json, print_parse_stats
+from email_templates import (use_template, generate_template_email, count_personalized, print_template_stats,
+                             EMAIL_SCHEMA, EMAIL_REQUIRED, EMAIL_STREAMING)
 load_dotenv()
-# Setup Gemini
 
-# Use HuggingFace endpoint as the LLM
-llm = HuggingFaceEndpoint(
-    repo_id="meta-llama/Llama-2-7b-chat-hf",
-    task="text-generation",
-    api_url="https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf",
-    temperature=0.7,
-    huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-)
-
-print("✅ Email Generator ready!")
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
 
 
 # Email Generation Prompt
@@ -97,6 +94,23 @@ Write the email now. Make it compelling and professional.
 """
 )
 
+# Compact variant (PROMPT_MODE=compact): the style guide is a system message that
+# is identical for every lead, so providers can cache it as a shared prefix
+compact_email_prompt = ChatPromptTemplate.from_messages([
+    ("system", """You are an expert B2B sales communication specialist. Write one personalized, professional outreach email per lead.
+Reply with JSON only:
+{{"subject": "under 60 characters", "body": "full email", "tone_used": str, "key_personalization": str}}
+Formality by role: C-level formal, strategic impact; VP/Director professional, ROI; Manager friendly, practical; Specialist conversational, technical.
+Urgency by priority: 80-100 direct with a clear CTA; 60-79 consultative; 40-59 educational; 0-39 gentle, value first.
+By contact history: never contacted = introduce and offer value; recent = follow up on the last conversation; months ago = re-engage with what is new; positive notes = move forward quickly.
+Personalize with industry challenges, company size, role pain points, location if relevant.
+Language: sophisticated but plain, varied sentences, active voice, no clichés, clear value proposition.
+Structure: greeting by name, context hook, 2-3 short paragraphs, one specific call to action, professional sign-off."""),
+    ("human", "Lead: name={name} | job_title={job_title} | company={company} | industry={industry} | "
+              "company_size={company_size} | location={location} | priority_score={priority_score}/100 | "
+              "persona={buyer_persona} | notes={notes} | last_contact={last_contact} | history={contact_status}"),
+])
+
 
 def determine_contact_status(last_contact):
     """Contact history analyze করা"""
@@ -120,12 +134,42 @@ def determine_contact_status(last_contact):
         return "Contact history unclear"
 
 
+# Columns written by the email generation stage
+EMAIL_COLUMNS = ['email_subject', 'email_body', 'email_tone', 'personalization_notes', 'email_generated_at']
+
+
+def email_columns(email):
+    """Map a generate_email result onto the email output columns for one row"""
+    return {
+        'email_subject': email['subject'],
+        'email_body': email['body'],
+        'email_tone': email.get('tone_used', ''),
+        'personalization_notes': email.get('key_personalization', ''),
+        'email_generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def fallback_email_columns(row):
+    """Email columns used when generation failed outright for a row"""
+    return {
+        'email_subject': f"Following up with {row.get('company', 'Company')}",
+        'email_body': f"Dear {row.get('name', 'Valued Customer')},\n\nI hope this email finds you well...",
+        'email_tone': 'Generic fallback',
+        'personalization_notes': 'Error occurred during generation',
+        'email_generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
 async def generate_email(lead):
     """একটা lead এর জন্য email generate করা"""
     try:
         # Determine contact status
         contact_status = determine_contact_status(lead.get('last_contact', ''))
         
+        # Tiered mode: low-priority leads get their cluster's template, filled locally
+        if use_template(lead):
+            return await generate_template_email(lead, contact_status)
+        
         # Get values with fallbacks
         priority_score = lead.get('priority_score', 50)
         job_title = lead.get('job_title') or lead.get('ai_filled_job_title', 'Professional')
@@ -134,7 +178,7 @@ async def generate_email(lead):
         notes = lead.get('notes') or lead.get('ai_filled_notes', 'Potential interest in business solutions')
         
         # Generate email
-        messages = email_prompt.format_messages(
+        fields = dict(
             name=lead['name'],
             job_title=job_title,
             company=lead['company'],
@@ -147,13 +191,28 @@ async def generate_email(lead):
             last_contact=lead.get('last_contact', 'Never contacted'),
             contact_status=contact_status
         )
+        full_messages = None
+        if prompt_mode() == 'compact':
+            messages = compact_email_prompt.format_messages(**fields)
+            full_messages = email_prompt.format_messages(**fields)
+        else:
+            messages = email_prompt.format_messages(**fields)
         
-        response = await llm.ainvoke(messages)
-        
-        # Parse response
-        result = json.loads(response.content.strip().replace('```json', '').replace('```', ''))
+        # Unchanged rows re-use the previous result from the on-disk cache
+        llm = get_client('email_generation')
+        cache = get_cache()
+        key = cache_key(llm.repo_id, llm.temperature, messages)
+        cached = cache.get(key)
+        # Tiered stats count model calls only, so a cached email is counted separately
+        count_personalized(cached=cached is not None)
+        if cached is not None:
+            return cached
         
-        return result
+        tokens = record_prompt('email_generation', messages, full_messages,
+                               prefix_tokens=estimate_tokens(messages[0]) if full_messages else 0)
+        # Tolerant parse: prose, fences and truncation are repaired instead of failing
+        result = await ainvoke_json('email_generation', HUGGINGFACE, llm, messages, EMAIL_SCHEMA, tokens,
+                                    required=EMAIL_REQUIRED, allow_truncated=False, stream=EMAIL_STREAMING)
         
     except Exception as e:
         print(f"❌ Error generating email: {e}")
@@ -161,17 +220,37 @@ async def generate_email(lead):
             'subject': f"Following up with {lead['company']}",
             'body': f"Dear {lead['name']},\n\nI hope this email finds you well...",
             'tone_used': 'Generic fallback',
-            'key_personalization': 'None - error occurred'
+            'key_personalization': 'None - error occurred',
+            # Fallbacks are never checkpointed, so a resumed run retries the lead
+            'error': str(e)
         }
+    
+    # Not in the try above: a cache error must never replace the generated email
+    store_result(cache, key, result)
+    return result
 
 
-async def generate_all_emails_async(input_csv='analyzed_leads.csv', output_csv='emails_generated.csv'):
-    """সব leads এর জন্য email generate করা - async version"""
+@traced_stage('email_generation')
+async def generate_all_emails_async(input_csv=None, output_csv=None, run_state=None, send_queue=None):
+    """
+    সব leads এর জন্য email generate করা - async version
+    
+    Defaults: the newest output/analyzed_leads table in, output/emails_generated
+    in the configured intermediate format out (see storage).
+    
+    With a run_state, generated emails are checkpointed and reused on resume.
+    
+    With a send_queue (see sendMailHog.send_from_queue_async) every email is put
+    on it as (index, row key, row) the moment it is finished, so sending overlaps
+    generation. The caller puts the final None once this returns.
+    """
+    input_csv = input_csv or require_table(OUTPUT_DIR, 'analyzed_leads')
+    output_csv = output_csv or intermediate_path(OUTPUT_DIR, 'emails_generated')
     
     print(f"\n📂 Loading analyzed leads from {input_csv}...")
     
-    # Load CSV
-    df = pd.read_csv(input_csv)
+    # Load analyzed leads
+    df = read_table(input_csv)
     
     print(f"✅ Loaded {len(df)} leads")
     print(f"🤖 Starting email generation in parallel...\n")
@@ -183,18 +262,54 @@ async def generate_all_emails_async(input_csv='analyzed_leads.csv', output_csv='
     df['personalization_notes'] = ''
     df['email_generated_at'] = ''
     
+    # Plain dict rows: cheaper than a pandas Series per row
+    rows = dict(iter_records(df))
+    
     # Generate emails in parallel with real-time output
     async def generate_with_index(idx, row):
         email = await generate_email(row)
         return idx, row, email
     
+    # Resumed run: emails checkpointed before the interruption are not generated again
+    emails_dict = {}
+    stage_keys = None
+    if run_state is not None or send_queue is not None:
+        stage_keys = row_keys(df)
+    if run_state is not None:
+        done = run_state.completed('email_generation')
+        for idx in df.index[stage_keys.isin(done.keys())]:
+            emails_dict[idx] = done[stage_keys[idx]]
+        print(f"🧾 Run {run_state.run_id}: {len(emails_dict)} emails already generated\n")
+    
+    # Early send dispatch: each finished row goes straight to the sender
+    dispatched = {}
+    
+    def dispatch(idx, columns):
+        dispatched[idx] = columns
+        send_queue.put_nowait((idx, stage_keys[idx], {**rows[idx], **columns}))
+    
+    if send_queue is not None:
+        for idx, email in emails_dict.items():
+            dispatch(idx, email_columns(email))
+    
     tasks = []
-    for idx, row in df.iterrows():
-        tasks.append(asyncio.create_task(generate_with_index(idx, row)))
+    for idx, row in rows.items():
+        if idx not in emails_dict:
+            tasks.append(asyncio.create_task(generate_with_index(idx, row)))
     
-    # Process results as they complete
+    # Process results as they complete (one progress line at a time in quiet mode)
     completed_count = 0
-    emails_dict = {}
+    progress = Progress('email_generation', len(tasks))
+    
+    def email_message(count, row, email):
+        return (f"✍️  [{count}/{len(tasks)}] Generated email: {row['name']} ({row['company']})\n"
+                f"    Priority: {row.get('priority_score', 'N/A')}/100 | Persona: {row.get('buyer_persona', 'N/A')}\n"
+                f"\n📧 Generated Email:\n"
+                f"Subject: {email['subject']}\n"
+                f"Body: {email['body']}\n"
+                f"Tone: {email['tone_used']}\n"
+                f"Personalization: {email['key_personalization']}\n"
+                + "-" * 80 + "\n")  # separator for readability
     
     for coro in asyncio.as_completed(tasks):
         try:
@@ -202,54 +317,57 @@ async def generate_all_emails_async(input_csv='analyzed_leads.csv', output_csv='
             completed_count += 1
             
             # Print output immediately
-            print(f"✍️  [{completed_count}/{len(df)}] Generated email: {row['name']} ({row['company']})")
-            print(f"    Priority: {row.get('priority_score', 'N/A')}/100 | Persona: {row.get('buyer_persona', 'N/A')}")
-            print("\n📧 Generated Email:")
-            print(f"Subject: {email['subject']}")
-            print(f"Body: {email['body']}")
-            print(f"Tone: {email['tone_used']}")
-            print(f"Personalization: {email['key_personalization']}")
-            print("-" * 80)  # separator for readability
-            print()
+            progress.advance(lambda: email_message(completed_count, row, email), failed=bool(email.get('error')))
             
             # Store email with original index
             emails_dict[idx] = email
+            if send_queue is not None:
+                dispatch(idx, email_columns(email))
+            if run_state is not None and not email.get('error'):
+                run_state.mark_done('email_generation', stage_keys[idx], email)
             
         except Exception as e:
             completed_count += 1
-            print(f"❌ Error generating email: {e}\n")
+            progress.advance(f"❌ Error generating email: {e}\n", failed=True)
             # We'll handle missing entries later
     
-    # Update dataframe with results
+    progress.finish()
+    if run_state is not None:
+        run_state.flush()
+    
+    # Update dataframe with results (one assignment per column)
+    results_dict = {}
     for idx in df.index:
-        if idx in emails_dict:
-            email = emails_dict[idx]
-            df.at[idx, 'email_subject'] = email['subject']
-            df.at[idx, 'email_body'] = email['body']
-            df.at[idx, 'email_tone'] = email['tone_used']
-            df.at[idx, 'personalization_notes'] = email['key_personalization']
-            df.at[idx, 'email_generated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if idx in dispatched:
+            columns = dispatched[idx]
+        elif idx in emails_dict:
+            columns = email_columns(emails_dict[idx])
         else:
             # Fallback for failed entries
-            row = df.loc[idx]
-            df.at[idx, 'email_subject'] = f"Following up with {row.get('company', 'Company')}"
-            df.at[idx, 'email_body'] = f"Dear {row.get('name', 'Valued Customer')},\n\nI hope this email finds you well..."
-            df.at[idx, 'email_tone'] = 'Generic fallback'
-            df.at[idx, 'personalization_notes'] = 'Error occurred during generation'
-            df.at[idx, 'email_generated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            columns = fallback_email_columns(rows[idx])
+            if send_queue is not None:
+                dispatch(idx, columns)
+        results_dict[idx] = columns
+    assign_columns(df, results_dict, EMAIL_COLUMNS)
     
-    # Save to CSV
-    df.to_csv(output_csv, index=False)
+    # Save
+    write_table(df, output_csv)
     
     print(f"✅ All emails generated!")
-    print(f"💾 Saved to: {output_csv}\n")
+    print(f"💾 Saved to: {output_csv}")
+    print_scheduler_stats(HUGGINGFACE)
+    print_cache_stats()
+    report_prompt_stats('email_generation')
+    print_template_stats()
+    print_parse_stats('email_generation')
+    print()
     
     # Show sample emails
     print("=" * 80)
     print("📧 SAMPLE EMAILS (Top 3 Priority Leads)")
     print("=" * 80)
     
-    for idx, row in df.head(3).iterrows():
+    for idx, row in iter_records(df.head(3)):
         print(f"\n{'='*80}")
         print(f"TO: {row['name']} ({row['job_title']}) - {row['company']}")
         print(f"Priority: {row['priority_score']}/100")
@@ -264,17 +382,15 @@ async def generate_all_emails_async(input_csv='analyzed_leads.csv', output_csv='
     return df
 
 
-def generate_all_emails(input_csv='analyzed_leads.csv', output_csv='emails_generated.csv'):
+def generate_all_emails(input_csv=None, output_csv=None):
     """সব leads এর জন্য email generate করা - sync wrapper for backward compatibility"""
     return asyncio.run(generate_all_emails_async(input_csv, output_csv))
 
 
 # Run
 if __name__ == "__main__":
-    import os
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    input_file = os.path.join(base_dir, 'output', 'analyzed_leads.csv')
-    output_file = os.path.join(base_dir, 'output', 'emails_generated.csv')
+    input_file = require_table(OUTPUT_DIR, 'analyzed_leads')
+    output_file = intermediate_path(OUTPUT_DIR, 'emails_generated')
     
     print("=" * 80)
     print("📧 AI-POWERED PERSONALIZED EMAIL GENERATOR")
@@ -282,4 +398,4 @@ if __name__ == "__main__":
     
     asyncio.run(generate_all_emails_async(input_file, output_file))
     
-    print("\n✨ Done! Check 'output/emails_generated.csv' for all personalized emails")
\ No newline at end of file
+    print(f"\n✨ Done! Check '{output_file}' for all personalized emails")
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Prompt Size & Latency Metrics
+Token counts per rendered prompt and LLM latency per stage, by prompt mode
+
+PROMPT_MODE picks the prompt variant for lead analysis and email generation:
+- full      the original prompts: lead data first, the long rubric / style
+            guide repeated after it in every request
+- compact   the static instructions condensed into a system message that is
+            byte-identical for every lead (a shared prefix that providers with
+            prefix / context caching can reuse), followed by a one-line lead
+            record
+
+Every rendered prompt is counted (estimate_tokens, ~4 characters per token).
+In compact mode the full prompt is also counted, so the report shows the
+tokens saved. The mean provider latency of each mode is kept in
+PROMPT_METRICS_PATH, so a run reports its latency change against the last run
+in the other mode.
+
+Configuration (environment variables):
+- PROMPT_MODE            full | compact (default: full)
+- PROMPT_METRICS_PATH    default: output/prompt_metrics.json
+"""
+
+import os
+import json
+import time
+from dotenv import load_dotenv
+from llm_scheduler import estimate_tokens
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_METRICS_PATH = os.path.join(BASE_DIR, 'output', 'prompt_metrics.json')
+
+PROMPT_MODES = ('full', 'compact')
+PROMPT_MODE = os.getenv('PROMPT_MODE', 'full').lower()
+
+# Per-stage counters for this process
+_stats = {}
+
+
+def prompt_mode(mode=None):
+    """Configured prompt mode, validated"""
+    mode = (mode or PROMPT_MODE).lower()
+    if mode not in PROMPT_MODES:
+        raise ValueError(f"Unknown prompt mode: {mode} (expected one of {', '.join(PROMPT_MODES)})")
+    return mode
+
+
+def _stage(stage):
+    if stage not in _stats:
+        _stats[stage] = {'prompts': 0, 'tokens': 0, 'prefix_tokens': 0, 'full_tokens': 0,
+                         'calls': 0, 'call_seconds': 0.0}
+    return _stats[stage]
+
+
+def record_prompt(stage, messages, full_messages=None, prefix_tokens=0):
+    """
+    Count one rendered prompt. full_messages is the same lead rendered with the
+    full prompt (compact mode only); prefix_tokens is the shared system prefix.
+    """
+    tokens = estimate_tokens(messages)
+    s = _stage(stage)
+    s['prompts'] += 1
+    s['tokens'] += tokens
+    s['prefix_tokens'] += prefix_tokens
+    s['full_tokens'] += estimate_tokens(full_messages) if full_messages is not None else tokens
+    return tokens
+
+
+def timed_call(stage, call):
+    """Wrap a zero-argument LLM call so each provider round-trip is timed for `stage`"""
+    async def run():
+        started = time.monotonic()
+        try:
+            return await call()
+        finally:
+            s = _stage(stage)
+            s['calls'] += 1
+            s['call_seconds'] += time.monotonic() - started
+    return run
+
+
+def prompt_stats(mode=None):
+    """Per-stage prompt sizes, tokens saved against the full prompts and mean latency"""
+    mode = prompt_mode(mode)
+    result = {}
+    for stage, s in _stats.items():
+        prompts = s['prompts'] or 1
+        saved = s['full_tokens'] - s['tokens']
+        result[stage] = {
+            'mode': mode,
+            'prompts': s['prompts'],
+            'tokens': s['tokens'],
+            'tokens_per_prompt': round(s['tokens'] / prompts, 1),
+            'shared_prefix_tokens': round(s['prefix_tokens'] / prompts, 1),
+            'tokens_saved': saved,
+            'tokens_saved_pct': round(saved / s['full_tokens'] * 100, 1) if s['full_tokens'] else 0.0,
+            'calls': s['calls'],
+            'latency_ms': round(s['call_seconds'] / s['calls'] * 1000, 1) if s['calls'] else None,
+        }
+    return result
+
+
+def _load_history(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def report_prompt_stats(stage, path=None):
+    """
+    Print prompt size, tokens saved and latency for `stage`, compared with the
+    last recorded run in the other prompt mode, then record this run's numbers.
+    """
+    stats = prompt_stats().get(stage)
+    if not stats or not stats['prompts']:
+        return
+    mode = stats['mode']
+    path = path or os.getenv('PROMPT_METRICS_PATH', DEFAULT_METRICS_PATH)
+    history = _load_history(path)
+
+    line = (f"🧮 Prompts [{stage}, {mode}]: {stats['tokens_per_prompt']} tokens/prompt "
+            f"over {stats['prompts']} prompts")
+    if mode == 'compact':
+        line += (f" | saved {stats['tokens_saved']} tokens ({stats['tokens_saved_pct']}%) vs full"
+                 f" | shared prefix {stats['shared_prefix_tokens']} tokens")
+    print(line)
+
+    if stats['latency_ms'] is not None:
+        line = f"   LLM latency {stats['latency_ms']} ms/call"
+        other = 'full' if mode == 'compact' else 'compact'
+        previous = history.get(stage, {}).get(other)
+        if previous and previous.get('latency_ms'):
+            change = (stats['latency_ms'] - previous['latency_ms']) / previous['latency_ms'] * 100
+            line += (f" ({change:+.1f}% vs last {other} run: {previous['latency_ms']} ms/call, "
+                     f"{previous['tokens_per_prompt']} tokens/prompt)")
+        print(line)
+
+        history.setdefault(stage, {})[mode] = {
+            'latency_ms': stats['latency_ms'],
+            'tokens_per_prompt': stats['tokens_per_prompt'],
+            'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(history, f, indent=2)
+        except OSError as e:
+            print(f"⚠️  Could not save prompt metrics to {path}: {e}")
+
+
+def reset_prompt_stats():
+    _stats.clear()
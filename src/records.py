@@ -0,0 +1,39 @@
+"""
+Row Records
+Fast row iteration and bulk write-back for the per-row stage loops
+
+df.iterrows() builds a pandas Series for every row, and writing results back
+with df.at[idx, column] = value costs an indexing round trip per cell; on
+100k+ row tables the two dominate a stage's CPU time. Stages instead iterate
+plain dict records (row.get(...) and row['name'] work as they did on a
+Series), collect each row's results in a dict, and write them back with one
+assignment per column:
+
+    results = {}
+    for idx, row in iter_records(df):
+        results[idx] = {'score': score(row)}
+    assign_columns(df, results, ['score'])
+
+benchmarks/bench_row_loops.py measures the per-row cost of both patterns.
+"""
+
+
+def iter_records(df, index=None):
+    """(index label, dict) pairs for the rows of df, or only for the labels in index"""
+    if index is not None:
+        df = df.loc[index]
+    columns = list(df.columns)
+    # Column-wise tolist() then zip: several times cheaper than to_dict('records') or itertuples()
+    values = [df.iloc[:, position].tolist() for position in range(len(columns))]
+    return zip(df.index, (dict(zip(columns, row)) for row in zip(*values)))
+
+
+def assign_columns(df, results, columns):
+    """Write {index label: {column: value}} back into df, one bulk assignment per column"""
+    if not results:
+        return df
+    labels = list(results)
+    rows = list(results.values())
+    for column in columns:
+        df.loc[labels, column] = [row[column] for row in rows]
+    return df
@@ -0,0 +1,63 @@
+"""
+Batched Reply Classification
+Packs K replies into one prompt and validates the JSON array that comes back
+
+Used by analyze_responses_async (workflow) and the response_analysis script.
+Items the model drops or mislabels are returned as failures so the caller can
+fall back to one-reply-per-call classification for just those rows.
+"""
+
+import os
+from langchain_core.prompts import ChatPromptTemplate
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REPLY_BATCH_SIZE = int(os.getenv('REPLY_BATCH_SIZE', '10'))
+
+ALLOWED_LABELS = {"SKIP", "INTERESTED", "NOT_INTERESTED", "NEEDS_FOLLOW_UP", "UNCLEAR"}
+
+batch_prompt = ChatPromptTemplate.from_template(
+    """You are a classifier for customer email replies.
+Classify every reply below. Return ONLY a JSON array with exactly one object per reply:
+[{{"id": <reply id>, "class": "<one_of: SKIP | INTERESTED | NOT_INTERESTED | NEEDS_FOLLOW_UP | UNCLEAR>","reason":"<short rationale>"}}]
+
+Replies:
+{replies}"""
+)
+
+
+def batched(items, size):
+    """Split a list into consecutive chunks of at most `size` items"""
+    size = max(1, int(size))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def format_reply_batch(batch):
+    """Render [(id, text), ...] as the `replies` block of the batch prompt"""
+    return "\n\n".join(f"[id={reply_id}]\n{text}" for reply_id, text in batch)
+
+
+def parse_batch_response(response, batch):
+    """
+    Validate a batch response against the ids that were sent.
+    Returns (results, failed_ids): results maps id -> {"class", "reason"}.
+    """
+    expected = {reply_id for reply_id, _ in batch}
+    # Some models wrap the array in an object, e.g. {"results": [...]}
+    if isinstance(response, dict):
+        response = next((value for value in response.values() if isinstance(value, list)), [])
+    results = {}
+    if isinstance(response, list):
+        for item in response:
+            if not isinstance(item, dict):
+                continue
+            try:
+                reply_id = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            label = str(item.get("class", "")).upper()
+            if reply_id in expected and reply_id not in results and label in ALLOWED_LABELS:
+                results[reply_id] = {"class": label, "reason": item.get("reason", "")}
+    failed_ids = [reply_id for reply_id, _ in batch if reply_id not in results]
+    return results, failed_ids
@@ -0,0 +1,246 @@
+"""
+Local Reply Classifier
+Zero-network fast path that labels formulaic replies before they reach the LLM
+
+Two layers, both CPU-only:
+1. Keyword / regex rules for the phrasing the reply agent produces most often
+   ("not interested", "send me more information", ...).
+2. A small TF-IDF + softmax-regression model trained on replies the LLM has
+   already labelled (report/final.csv from earlier runs).
+
+A reply is resolved locally only when one layer is confident enough
+(REPLY_LOCAL_THRESHOLD, default 0.85); everything else is escalated to the LLM.
+An INTERESTED keyword that is negated ("we are not currently interested")
+never matches its rule; unless another rule settles the reply, it goes
+straight to the LLM without consulting the model.
+
+Rule confidences start from the priors in RULES and are replaced by each
+rule's measured precision on the training replies once a rule has matched
+RULE_MIN_SUPPORT of them. Rules that can be negated start below the threshold,
+so they only resolve replies locally after their precision has been measured.
+"""
+
+import os
+import re
+import math
+from collections import Counter
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from negation import compile_negated
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TRAINING_CSV = os.path.join(BASE_DIR, 'report', 'final.csv')
+
+REPLY_LOCAL_THRESHOLD = float(os.getenv('REPLY_LOCAL_THRESHOLD', '0.85'))
+LOCAL_REASON_PREFIX = 'Local classifier'
+
+LABELS = ["INTERESTED", "NOT_INTERESTED", "NEEDS_FOLLOW_UP", "UNCLEAR"]
+
+# Matches a rule needs in the training replies before its measured precision replaces the prior
+RULE_MIN_SUPPORT = 20
+
+# (label, pattern, prior confidence) - patterns are matched case-insensitively
+RULES = [
+    ("NOT_INTERESTED", r"\b(not interested|no longer interested|not (a|the) (good |right )?fit|"
+                       r"no,? thanks|no,? thank you|unsubscribe|remove me|not at this time|"
+                       r"(we|i) (will|must|have to) (pass|decline)|not looking|don'?t need|do not need|"
+                       r"not pursue|not moving forward)\b", 0.92),
+    ("INTERESTED", r"\b(interested|love to|would (love|like) to "
+                   r"(schedule|learn|see|set up|discuss|talk|connect|explore)|let'?s (schedule|set up|talk|connect)|"
+                   r"sounds (great|promising|exciting)|excited|book a (call|demo|meeting)|"
+                   r"(schedule|set up) a (call|demo|meeting)|eager to)\b", 0.80),
+    ("NEEDS_FOLLOW_UP", r"\b(more (information|info|details)|send (me|over|us) (more|some|additional|further)|"
+                        r"follow[- ]up|pricing|case stud(y|ies)|could you (share|send|provide)|"
+                        r"get back to (me|us)|next (quarter|month)|additional (information|details))\b", 0.86),
+    ("UNCLEAR", r"\b(clarify|clarification|what (exactly )?do you mean|not sure (what|i understand|how)|"
+                r"could you explain|confused|unclear|which (product|service|solution))\b", 0.86),
+]
+# Rules whose keywords flip meaning under negation ("not very interested")
+NEGATABLE_RULES = {"INTERESTED"}
+
+# (label, pattern, negated pattern or None, prior confidence)
+_COMPILED_RULES = [(label, re.compile(pattern, re.IGNORECASE),
+                    compile_negated(pattern) if label in NEGATABLE_RULES else None, confidence)
+                   for label, pattern, confidence in RULES]
+
+_TOKEN_PATTERN = re.compile(r"[a-z][a-z']+")
+
+
+def has_negated_rule(text):
+    """True when a negatable rule's keyword is negated in text"""
+    return any(negated is not None and negated.search(text) for _, _, negated, _ in _COMPILED_RULES)
+
+
+def apply_rules(text, confidences=None):
+    """
+    Return (label, confidence) when exactly one rule class matches, else (None, 0.0).
+    Negatable rules whose keyword is negated do not match. confidences overrides
+    the RULES priors per label (measured precision).
+    """
+    hits = {label: confidence for label, pattern, negated, confidence in _COMPILED_RULES
+            if pattern.search(text) and not (negated is not None and negated.search(text))}
+    if len(hits) != 1:
+        # No signal, or conflicting signals - leave it to the model / LLM
+        return None, 0.0
+    label, confidence = next(iter(hits.items()))
+    return label, (confidences or {}).get(label, confidence)
+
+
+def measure_rule_precision(texts, labels, min_support=RULE_MIN_SUPPORT):
+    """{label: precision} for every rule that matched at least min_support labelled replies"""
+    matched, correct = Counter(), Counter()
+    for text, truth in zip(texts, labels):
+        label, _ = apply_rules(text)
+        if label:
+            matched[label] += 1
+            correct[label] += label == truth
+    return {label: correct[label] / count for label, count in matched.items() if count >= min_support}
+
+
+def tokenize(text):
+    """Lower-cased unigrams + bigrams"""
+    words = _TOKEN_PATTERN.findall(str(text).lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class TfidfSoftmaxModel:
+    """Minimal TF-IDF vectorizer + multinomial logistic regression in NumPy"""
+
+    def __init__(self, max_features=5000, min_df=2, l2=1e-3, iterations=300, learning_rate=1.0):
+        self.max_features = max_features
+        self.min_df = min_df
+        self.l2 = l2
+        self.iterations = iterations
+        self.learning_rate = learning_rate
+        self.vocabulary = {}
+        self.idf = None
+        self.weights = None
+        self.bias = None
+        self.labels = []
+
+    def _vectorize(self, texts):
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(token for token in tokenize(text) if token in self.vocabulary)
+            for token, count in counts.items():
+                matrix[row, self.vocabulary[token]] = 1.0 + math.log(count)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def fit(self, texts, labels):
+        texts = list(texts)
+        self.labels = sorted(set(labels))
+        document_frequency = Counter()
+        for text in texts:
+            document_frequency.update(set(tokenize(text)))
+        common = [token for token, df in document_frequency.most_common() if df >= self.min_df]
+        self.vocabulary = {token: i for i, token in enumerate(common[:self.max_features])}
+        n = len(texts)
+        self.idf = np.array(
+            [math.log((1 + n) / (1 + document_frequency[token])) + 1.0 for token in self.vocabulary],
+            dtype=np.float32,
+        )
+
+        x = self._vectorize(texts)
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        y = np.zeros((n, len(self.labels)), dtype=np.float32)
+        y[np.arange(n), [label_index[label] for label in labels]] = 1.0
+
+        self.weights = np.zeros((x.shape[1], len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(self.iterations):
+            probabilities = self._softmax(x @ self.weights + self.bias)
+            error = (probabilities - y) / n
+            self.weights -= self.learning_rate * (x.T @ error + self.l2 * self.weights)
+            self.bias -= self.learning_rate * error.sum(axis=0)
+        return self
+
+    @staticmethod
+    def _softmax(logits):
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, texts, chunk_size=2048):
+        texts = list(texts)
+        parts = [self._softmax(self._vectorize(texts[i:i + chunk_size]) @ self.weights + self.bias)
+                 for i in range(0, len(texts), chunk_size)]
+        return np.vstack(parts) if parts else np.zeros((0, len(self.labels)))
+
+
+class LocalReplyClassifier:
+    """Rules first, then the trained model; returns None for replies it should escalate"""
+
+    def __init__(self, threshold=REPLY_LOCAL_THRESHOLD, model=None):
+        self.threshold = threshold
+        self.model = model
+        self.rule_confidence = {}
+
+    def fit(self, texts, labels, min_examples=20):
+        texts, labels = list(texts), list(labels)
+        self.rule_confidence = measure_rule_precision(texts, labels)
+        if len(texts) >= min_examples and len(set(labels)) >= 2:
+            self.model = TfidfSoftmaxModel().fit(texts, labels)
+        return self
+
+    def classify(self, texts):
+        """
+        Classify a list of reply texts.
+        Returns one entry per text: {"class", "reason", "confidence"} or None (escalate).
+        """
+        texts = list(texts)
+        results = [None] * len(texts)
+        leftovers = []
+        for i, text in enumerate(texts):
+            label, confidence = apply_rules(text, self.rule_confidence)
+            if label and confidence >= self.threshold:
+                results[i] = {"class": label, "confidence": confidence,
+                              "reason": f"{LOCAL_REASON_PREFIX}: keyword rule ({confidence:.2f})"}
+            elif not has_negated_rule(text):
+                # Negated keywords ("not currently interested") go straight to the LLM
+                leftovers.append(i)
+
+        if self.model is not None and leftovers:
+            probabilities = self.model.predict_proba([texts[i] for i in leftovers])
+            best = probabilities.argmax(axis=1)
+            for position, i in enumerate(leftovers):
+                confidence = float(probabilities[position, best[position]])
+                if confidence >= self.threshold:
+                    label = self.model.labels[best[position]]
+                    results[i] = {"class": label, "confidence": confidence,
+                                  "reason": f"{LOCAL_REASON_PREFIX}: tf-idf model ({confidence:.2f})"}
+        return results
+
+
+def load_training_data(csv_path=DEFAULT_TRAINING_CSV):
+    """LLM-labelled replies from a previous final.csv (locally labelled rows are excluded)"""
+    if not os.path.exists(csv_path):
+        return [], []
+    df = pd.read_csv(csv_path, usecols=lambda c: c in ('reply_mail_body', 'reply_class', 'reply_reason'))
+    if not {'reply_mail_body', 'reply_class'} <= set(df.columns):
+        return [], []
+    df = df[df['reply_mail_body'].notna() & df['reply_class'].isin(LABELS)]
+    if 'reply_reason' in df.columns:
+        reasons = df['reply_reason'].fillna('').astype(str)
+        df = df[~reasons.str.startswith(LOCAL_REASON_PREFIX) & ~reasons.str.startswith('Error')]
+    return df['reply_mail_body'].astype(str).tolist(), df['reply_class'].tolist()
+
+
+_classifier = None
+
+
+def get_local_classifier():
+    """Process-wide classifier, trained once from report/final.csv when available"""
+    global _classifier
+    if _classifier is None:
+        texts, labels = load_training_data(os.getenv('REPLY_LOCAL_TRAINING_CSV', DEFAULT_TRAINING_CSV))
+        _classifier = LocalReplyClassifier().fit(texts, labels)
+    return _classifier
+
+
+def local_classifier_enabled():
+    return os.getenv('REPLY_LOCAL_CLASSIFIER', '1').lower() not in ('0', 'false', 'no', 'off')
@@ -1,42 +1,51 @@
 import os
-import pandas as pd
+import asyncio
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.llms import HuggingFaceEndpoint
-import time
+from llm_scheduler import submit, estimate_tokens, HUGGINGFACE
 
 # Load API key
 load_dotenv()
 
-# Initialize LLM via HuggingFace endpoint
-llm = HuggingFaceEndpoint(
-        repo_id="meta-llama/Llama-2-7b-chat-hf",
-        task="text-generation",
-        api_url="https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf",
-        temperature=0.7,
-        huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-    )# JSON classification prompt
-prompt = ChatPromptTemplate.from_template(
-    """You are a classifier for customer email replies.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+allowed_labels = {"SKIP", "INTERESTED", "NOT_INTERESTED", "NEEDS_FOLLOW_UP", "UNCLEAR"}
+
+_chains = None
+
+
+def get_chains():
+    """(single, batch) classification chains, built on first use"""
+    global _chains
+    if _chains is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import JsonOutputParser
+        from reply_batching import batch_prompt
+        from llm_clients import get_client
+
+        # Shared HuggingFace endpoint client
+        llm = get_client('response_analysis')
+        # JSON classification prompt
+        prompt = ChatPromptTemplate.from_template(
+            """You are a classifier for customer email replies.
 Return a JSON object:
 {{"class": "<one_of: SKIP | INTERESTED | NOT_INTERESTED | NEEDS_FOLLOW_UP | UNCLEAR>","reason":"<short rationale>"}}
 
 Text:
 {reply}"""
-)
-parser = JsonOutputParser()
-chain = prompt | llm | parser
+        )
+        parser = JsonOutputParser()
+        _chains = (prompt | llm | parser, batch_prompt | llm | parser)
+    return _chains
 
-allowed_labels = {"SKIP", "INTERESTED", "NOT_INTERESTED", "NEEDS_FOLLOW_UP", "UNCLEAR"}
 
-def classify_reply(text):
+async def classify_reply_async(text):
+    """Classify one reply; the call goes through the shared HuggingFace scheduler"""
     text = str(text).strip() if text else ""
     if not text:
         return {"class": "NO_REPLY", "reason": "Empty content"}
     try:
-        res = chain.invoke({"reply": text})
+        chain, _ = get_chains()
+        res = await submit(HUGGINGFACE, lambda: chain.ainvoke({"reply": text}), tokens=estimate_tokens(text))
         label = res.get("class", "").upper()
         if label not in allowed_labels:
             label = "UNCLEAR"
@@ -44,20 +53,72 @@ def classify_reply(text):
     except Exception as e:
         return {"class": "UNCLEAR", "reason": f"Error: {e}"}
 
-# Load CSV
-df = pd.read_csv("/home/shahanahmed/AI-powered-Sales-Campaign-CRM/output/emails_with_replies.csv")
-if "reply_mail_body" not in df.columns:
-    raise ValueError("Column 'reply_mail_body' not found")
 
-# Process with batch delay
-results = []
-for i, reply in enumerate(df["reply_mail_body"], 1):
-    print(f"Processing {i}/{len(df)}...")
-    results.append(classify_reply(reply))
-    time.sleep(0.5)  # small delay to avoid hitting rate limits
+def classify_reply(text):
+    """Classify one reply - sync wrapper (still rate-limited by the scheduler)"""
+    return asyncio.run(classify_reply_async(text))
+
+
+async def classify_reply_batch_async(batch):
+    """Classify [(idx, text), ...] in one call; failed items fall back to classify_reply_async"""
+    from reply_batching import format_reply_batch, parse_batch_response
+
+    try:
+        _, batch_chain = get_chains()
+        res = await submit(HUGGINGFACE, lambda: batch_chain.ainvoke({"replies": format_reply_batch(batch)}),
+                           tokens=estimate_tokens([text for _, text in batch]))
+        results, failed_ids = parse_batch_response(res, batch)
+    except Exception:
+        results, failed_ids = {}, [idx for idx, _ in batch]
+    if failed_ids:
+        texts = dict(batch)
+        singles = await asyncio.gather(*(classify_reply_async(texts[idx]) for idx in failed_ids))
+        results.update(zip(failed_ids, singles))
+    return results
+
+
+def classify_reply_batch(batch):
+    """Classify a batch of replies - sync wrapper (still rate-limited by the scheduler)"""
+    return asyncio.run(classify_reply_batch_async(batch))
+
+
+def analyze_responses(input_csv, output_csv):
+    """Classify every reply in input_csv and save the labelled rows to output_csv (any storage format)"""
+    import pandas as pd
+    from reply_batching import batched, REPLY_BATCH_SIZE
+    from storage import read_table, write_table
+
+    # Load table
+    df = read_table(input_csv)
+    if "reply_mail_body" not in df.columns:
+        raise ValueError("Column 'reply_mail_body' not found")
+
+    # Empty replies are labelled locally; the rest go out K at a time
+    results = {}
+    pending = []
+    for i, reply in enumerate(df["reply_mail_body"]):
+        text = str(reply).strip() if pd.notna(reply) else ""
+        if text:
+            pending.append((i, text))
+        else:
+            results[i] = {"class": "NO_REPLY", "reason": "Empty content"}
+
+    # One batch at a time; the scheduler's rate limits replace the old fixed delays
+    for batch in batched(pending, REPLY_BATCH_SIZE):
+        print(f"Processing {batch[-1][0] + 1}/{len(df)}...")
+        results.update(classify_reply_batch(batch))
+
+    df["reply_class"] = [results[i]["class"] for i in range(len(df))]
+    df["reply_reason"] = [results[i]["reason"] for i in range(len(df))]
+
+    write_table(df, output_csv)
+    print(f"Finished! Classified table saved to {output_csv}")
 
-df["reply_class"] = [r["class"] for r in results]
-df["reply_reason"] = [r["reason"] for r in results]
 
-df.to_csv("output/final.csv", index=False)
-print("Finished! Classified CSV saved to output/final.csv")
+if __name__ == "__main__":
+    from storage import intermediate_path, require_table
+    output_dir = os.path.join(BASE_DIR, 'output')
+    analyze_responses(
+        require_table(output_dir, 'emails_with_replies'),
+        intermediate_path(output_dir, 'final'),
+    )
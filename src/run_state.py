@@ -0,0 +1,155 @@
+"""
+Workflow Run State
+SQLite checkpoint of which rows have finished which stage, so runs can resume
+
+Every workflow run gets a run id. Stages record each finished row (keyed by its
+lead fingerprint) together with the result they produced; a resumed run
+(`main_workflow.py --resume <run_id>`) reuses those results instead of calling
+the LLM or sending the email again. Completions are buffered and committed in
+batches, so checkpointing costs one transaction per RUN_STATE_BATCH_SIZE rows.
+
+Configuration (environment variables):
+- RUN_STATE_PATH             SQLite file (default: output/run_state.sqlite)
+- RUN_STATE_BATCH_SIZE       rows per commit (default: 100)
+- RUN_STATE_FLUSH_SECONDS    also commit when this much time has passed (default: 2)
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RUN_STATE_PATH = os.path.join(BASE_DIR, 'output', 'run_state.sqlite')
+
+RUN_STATE_BATCH_SIZE = int(os.getenv('RUN_STATE_BATCH_SIZE', '100'))
+RUN_STATE_FLUSH_SECONDS = float(os.getenv('RUN_STATE_FLUSH_SECONDS', '2'))
+
+KEY_COLUMN = 'lead_fingerprint'
+
+
+def new_run_id():
+    """Sortable, human-readable run id, e.g. 20250101-093000-1a2b3c"""
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def row_keys(df, column=KEY_COLUMN):
+    """
+    Checkpoint key per row: lead fingerprint plus occurrence number, so duplicate
+    leads stay distinct. Falls back to the row index when there is no fingerprint.
+    """
+    if column in df.columns:
+        base = df[column].fillna('').astype(str)
+    else:
+        base = df.index.to_series(index=df.index).astype(str)
+    return base + '#' + base.groupby(base).cumcount().astype(str)
+
+
+class RunState:
+    """Per-row stage completions for one workflow run, committed in batches"""
+
+    def __init__(self, run_id=None, path=None, batch_size=None, flush_seconds=None):
+        self.path = path or os.getenv('RUN_STATE_PATH', DEFAULT_RUN_STATE_PATH)
+        self.batch_size = batch_size or RUN_STATE_BATCH_SIZE
+        self.flush_seconds = RUN_STATE_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.resumed = run_id is not None
+        self.run_id = run_id or new_run_id()
+        self.rows_marked = 0
+        self.commits = 0
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS row_state (
+                run_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                result TEXT,
+                done_at REAL NOT NULL,
+                PRIMARY KEY (run_id, stage, row_key)
+            )"""
+        )
+
+        now = datetime.now().isoformat(timespec='seconds')
+        if self.resumed:
+            if self._conn.execute('SELECT 1 FROM runs WHERE run_id = ?', (self.run_id,)).fetchone() is None:
+                self._conn.close()
+                raise ValueError(f"Unknown run id: {self.run_id} (no checkpoint in {self.path})")
+            self._conn.execute('UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?',
+                               ('running', now, self.run_id))
+        else:
+            self._conn.execute('INSERT INTO runs (run_id, status, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                               (self.run_id, 'running', now, now))
+        self._conn.commit()
+
+    def completed(self, stage):
+        """{row_key: result} for every row already finished in `stage`"""
+        self.flush()
+        rows = self._conn.execute('SELECT row_key, result FROM row_state WHERE run_id = ? AND stage = ?',
+                                  (self.run_id, stage))
+        return {row_key: json.loads(result) if result is not None else None for row_key, result in rows}
+
+    def mark_done(self, stage, row_key, result=None):
+        """Record one finished row; committed with the next batch"""
+        data = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        self._pending.append((self.run_id, stage, row_key, data, time.time()))
+        self.rows_marked += 1
+        if (len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def flush(self):
+        """Commit buffered completions"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO row_state (run_id, stage, row_key, result, done_at) VALUES (?, ?, ?, ?, ?)',
+            self._pending,
+        )
+        self._conn.commit()
+        self._pending = []
+        self.commits += 1
+
+    def set_status(self, status):
+        self.flush()
+        self._conn.execute('UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?',
+                           (status, datetime.now().isoformat(timespec='seconds'), self.run_id))
+        self._conn.commit()
+
+    def stats(self):
+        self.flush()
+        counts = dict(self._conn.execute(
+            'SELECT stage, COUNT(*) FROM row_state WHERE run_id = ? GROUP BY stage', (self.run_id,)
+        ).fetchall())
+        return {'run_id': self.run_id, 'rows_marked': self.rows_marked, 'commits': self.commits,
+                'stages': counts}
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+def print_run_state_stats(run_state):
+    """Print per-stage checkpoint counts for a run"""
+    s = run_state.stats()
+    stages = ', '.join(f"{stage} {count}" for stage, count in s['stages'].items()) or 'nothing yet'
+    print(f"🧾 Run {s['run_id']}: {s['rows_marked']} rows checkpointed in {s['commits']} commits "
+          f"({stages})")
@@ -6,10 +6,15 @@ Reads CSV and sends personalized emails
 import smtplib
 import asyncio
 import os
+import time
 from email.mime.text import MIMEText
-import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
+from llm_scheduler import TokenBucket
+from run_state import row_keys
+from storage import intermediate_path, require_table, read_table, write_table
+from records import iter_records, assign_columns
+from tracing import span, traced_stage, Progress
 
 # Load environment variables
 load_dotenv()
@@ -19,8 +24,239 @@ SMTP_HOST = os.getenv('SMTP_HOST', 'localhost')
 SMTP_PORT = int(os.getenv('SMTP_PORT', '1025'))
 SENDER_EMAIL = 'sales@yourcompany.com'
 
-def _send_single_email(row, idx, total, sender_email, smtp_host, smtp_port):
-    """Helper function to send a single email (synchronous)"""
+# Default input/output tables (format from INTERMEDIATE_FORMAT, see storage)
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+
+# Columns written by the sending stage
+SEND_STATUS_COLUMNS = ['email_sent', 'email_sender', 'sent_at', 'send_status']
+
+# Connection pool configuration
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '4'))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', '100'))
+SMTP_SEND_RATE = float(os.getenv('SMTP_SEND_RATE', '0'))  # messages per second, 0 = unlimited
+
+# Transport backend: 'pool' (smtplib sessions on worker threads) or 'async' (aiosmtplib)
+SMTP_BACKEND = os.getenv('SMTP_BACKEND', 'pool')
+SMTP_ASYNC_POOL_SIZE = int(os.getenv('SMTP_ASYNC_POOL_SIZE', '64'))
+
+
+class PooledSMTPConnection:
+    """One long-lived SMTP session that sends many messages (synchronous)"""
+    
+    def __init__(self, smtp_host, smtp_port, max_messages):
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.max_messages = max_messages
+        self.server = None
+        self.messages_on_connection = 0
+        self.connects = 0
+        self.reconnects = 0
+    
+    def _connect(self):
+        self.close()
+        self.server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+        self.messages_on_connection = 0
+        self.connects += 1
+    
+    def send(self, sender_email, recipient, message):
+        # Recycle the session once it has carried its quota of messages
+        if self.server is None or (self.max_messages and self.messages_on_connection >= self.max_messages):
+            self._connect()
+        try:
+            self.server.sendmail(sender_email, recipient, message)
+        except smtplib.SMTPServerDisconnected:
+            # Connection dropped (idle timeout, server restart) - reconnect once and retry
+            self.reconnects += 1
+            self._connect()
+            self.server.sendmail(sender_email, recipient, message)
+        except smtplib.SMTPResponseException:
+            # Message-level rejection; the session itself is still usable
+            self.messages_on_connection += 1
+            raise
+        except Exception:
+            # Unknown state (socket error, timeout) - start fresh next time
+            self.close()
+            raise
+        self.messages_on_connection += 1
+    
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+        self.server = None
+
+
+class SMTPConnectionPool:
+    """
+    N persistent SMTP sessions shared by all sends.
+    Each send checks a session out, runs the blocking smtplib call on a worker
+    thread and returns it, so at most `size` threads are ever busy sending.
+    """
+    
+    def __init__(self, smtp_host=None, smtp_port=None, size=None, max_messages=None, send_rate=None):
+        self.smtp_host = smtp_host or SMTP_HOST
+        self.smtp_port = smtp_port or SMTP_PORT
+        self.size = max(1, size or SMTP_POOL_SIZE)
+        self.max_messages = SMTP_MAX_MESSAGES_PER_CONNECTION if max_messages is None else max_messages
+        send_rate = SMTP_SEND_RATE if send_rate is None else send_rate
+        # One second of burst at the configured rate
+        self.rate_limit = TokenBucket(send_rate * 60, capacity=max(1.0, send_rate))
+        self.connections = [
+            PooledSMTPConnection(self.smtp_host, self.smtp_port, self.max_messages)
+            for _ in range(self.size)
+        ]
+        self._available = None
+        self.messages_sent = 0
+    
+    def _queue(self):
+        if self._available is None:
+            self._available = asyncio.Queue()
+            for connection in self.connections:
+                self._available.put_nowait(connection)
+        return self._available
+    
+    async def send(self, sender_email, recipient, message):
+        """Send one message over a pooled session"""
+        with span('smtp.send', backend='pool', payload_bytes=len(message)) as trace:
+            queued_at = time.monotonic()
+            available = self._queue()
+            connection = await available.get()
+            try:
+                await self.rate_limit.acquire(1)
+                reconnects = connection.reconnects
+                trace.set(queue_wait_ms=round((time.monotonic() - queued_at) * 1000, 3))
+                await asyncio.to_thread(connection.send, sender_email, recipient, message)
+                self.messages_sent += 1
+            finally:
+                trace.set(retries=connection.reconnects - reconnects)
+                available.put_nowait(connection)
+    
+    async def close(self):
+        for connection in self.connections:
+            await asyncio.to_thread(connection.close)
+    
+    def stats(self):
+        return {
+            'pool_size': self.size,
+            'messages_sent': self.messages_sent,
+            'connections_opened': sum(c.connects for c in self.connections),
+            'reconnects': sum(c.reconnects for c in self.connections),
+        }
+
+
+class AsyncSMTPConnection:
+    """One long-lived aiosmtplib session - sends run on the event loop, no threads"""
+    
+    def __init__(self, smtp_host, smtp_port, max_messages):
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.max_messages = max_messages
+        self.client = None
+        self.messages_on_connection = 0
+        self.connects = 0
+        self.reconnects = 0
+    
+    async def _connect(self):
+        import aiosmtplib
+        await self.close()
+        self.client = aiosmtplib.SMTP(hostname=self.smtp_host, port=self.smtp_port, start_tls=False)
+        await self.client.connect()
+        self.messages_on_connection = 0
+        self.connects += 1
+    
+    async def send(self, sender_email, recipient, message):
+        import aiosmtplib
+        if self.client is None or (self.max_messages and self.messages_on_connection >= self.max_messages):
+            await self._connect()
+        try:
+            await self.client.sendmail(sender_email, [recipient], message)
+        except aiosmtplib.SMTPServerDisconnected:
+            self.reconnects += 1
+            await self._connect()
+            await self.client.sendmail(sender_email, [recipient], message)
+        except aiosmtplib.SMTPResponseException:
+            self.messages_on_connection += 1
+            raise
+        except Exception:
+            await self.close()
+            raise
+        self.messages_on_connection += 1
+    
+    async def close(self):
+        if self.client is None:
+            return
+        try:
+            await self.client.quit()
+        except Exception:
+            self.client.close()
+        self.client = None
+
+
+class AsyncSMTPConnectionPool(SMTPConnectionPool):
+    """
+    Fully asynchronous variant of the pool (SMTP_BACKEND=async).
+    Uses aiosmtplib, so hundreds of sessions can be multiplexed on one event
+    loop without tying up executor threads.
+    """
+    
+    def __init__(self, smtp_host=None, smtp_port=None, size=None, max_messages=None, send_rate=None):
+        try:
+            import aiosmtplib  # noqa: F401
+        except ImportError as e:
+            raise ImportError("SMTP_BACKEND=async requires aiosmtplib (pip install aiosmtplib)") from e
+        super().__init__(smtp_host, smtp_port, size or SMTP_ASYNC_POOL_SIZE, max_messages, send_rate)
+        self.connections = [
+            AsyncSMTPConnection(self.smtp_host, self.smtp_port, self.max_messages)
+            for _ in range(self.size)
+        ]
+    
+    async def send(self, sender_email, recipient, message):
+        """Send one message over a pooled aiosmtplib session"""
+        with span('smtp.send', backend='async', payload_bytes=len(message)) as trace:
+            queued_at = time.monotonic()
+            available = self._queue()
+            connection = await available.get()
+            try:
+                await self.rate_limit.acquire(1)
+                reconnects = connection.reconnects
+                trace.set(queue_wait_ms=round((time.monotonic() - queued_at) * 1000, 3))
+                await connection.send(sender_email, recipient, message)
+                self.messages_sent += 1
+            finally:
+                trace.set(retries=connection.reconnects - reconnects)
+                available.put_nowait(connection)
+    
+    async def close(self):
+        await asyncio.gather(*(connection.close() for connection in self.connections))
+
+
+def create_smtp_pool(backend=None):
+    """SMTP pool for the configured backend: 'pool' (smtplib + threads) or 'async' (aiosmtplib)"""
+    backend = (backend or SMTP_BACKEND).lower()
+    if backend == 'async':
+        return AsyncSMTPConnectionPool()
+    if backend in ('pool', 'thread', 'smtplib'):
+        return SMTPConnectionPool()
+    raise ValueError(f"Unknown SMTP backend: {backend} (expected 'pool' or 'async')")
+
+
+def _build_message(row, sender_email, recipient):
+    """Create the MIME message for one row"""
+    msg = MIMEText(row['email_body'], 'plain')
+    msg['Subject'] = row['email_subject']
+    msg['From'] = sender_email
+    msg['To'] = recipient
+    return msg.as_string()
+
+
+async def _send_single_email(pool, row, idx, sender_email):
+    """Helper function to send a single email over the connection pool"""
     try:
         # Get recipient email
         recipient = row.get('email', '')
@@ -33,15 +269,8 @@ def _send_single_email(row, idx, total, sender_email, smtp_host, smtp_port):
                 'send_status': 'No email address'
             }
         
-        # Create email
-        msg = MIMEText(row['email_body'], 'plain')
-        msg['Subject'] = row['email_subject']
-        msg['From'] = sender_email
-        msg['To'] = recipient
-        
-        # Connect and send (fresh connection for each email)
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            server.sendmail(sender_email, recipient, msg.as_string())
+        # Create email and send it over a pooled connection
+        await pool.send(sender_email, recipient, _build_message(row, sender_email, recipient))
         
         # Update status
         return {
@@ -63,13 +292,34 @@ def _send_single_email(row, idx, total, sender_email, smtp_host, smtp_port):
         }
 
 
-async def send_emails_async(input_csv='output/emails_generated.csv', output_csv='output/emails_sent_status.csv'):
-    """Read CSV and send emails via MailHog - async version"""
+def print_pool_stats(pool):
+    """Print connection reuse for a finished send run"""
+    s = pool.stats()
+    print(f"🔌 SMTP pool: {s['messages_sent']} messages over {s['connections_opened']} connections "
+          f"({s['pool_size']} sessions, {s['reconnects']} reconnects)")
+
+
+@traced_stage('send')
+async def send_emails_async(input_csv=None, output_csv=None, backend=None, run_state=None):
+    """
+    Read CSV and send emails via MailHog - async version
+    
+    Defaults: the newest output/emails_generated table in, output/emails_sent_status
+    in the configured intermediate format out.
+    
+    backend selects the SMTP transport: 'pool' (default) or 'async' (aiosmtplib);
+    falls back to the SMTP_BACKEND environment variable.
+    
+    With a run_state every delivered email is checkpointed; a resumed run only
+    sends the emails that were not delivered before, so nobody gets a duplicate.
+    """
+    input_csv = input_csv or require_table(OUTPUT_DIR, 'emails_generated')
+    output_csv = output_csv or intermediate_path(OUTPUT_DIR, 'emails_sent_status')
     
     print(f"\n📂 Loading emails from {input_csv}...")
     
-    # Load CSV
-    df = pd.read_csv(input_csv)
+    # Load generated emails
+    df = read_table(input_csv)
     
     print(f"✅ Loaded {len(df)} emails to send\n")
     
@@ -79,30 +329,34 @@ async def send_emails_async(input_csv='output/emails_generated.csv', output_csv=
     df['sent_at'] = ''
     df['send_status'] = ''
     
-    # Send emails in parallel (reconnect for each email to avoid connection drops)
-    print(f"🔗 Using MailHog at {SMTP_HOST}:{SMTP_PORT}\n")
-    print(f"📤 Sending {len(df)} emails in parallel...\n")
+    # Resumed run: emails delivered before the interruption are not sent again
+    results_dict = {}
+    stage_keys = None
+    if run_state is not None:
+        stage_keys = row_keys(df)
+        done = run_state.completed('send')
+        for idx in df.index[stage_keys.isin(done.keys())]:
+            results_dict[idx] = done[stage_keys[idx]]
+        print(f"🧾 Run {run_state.run_id}: {len(results_dict)} emails already delivered\n")
+    
+    # Send emails over a pool of persistent SMTP sessions
+    pool = create_smtp_pool(backend)
+    print(f"🔗 Using MailHog at {SMTP_HOST}:{SMTP_PORT} ({pool.size} pooled connections, "
+          f"{'async' if isinstance(pool, AsyncSMTPConnectionPool) else 'threaded'} transport)\n")
+    print(f"📤 Sending {len(df) - len(results_dict)} emails in parallel...\n")
     
     # Create tasks for parallel sending with real-time output
     async def send_with_index(idx, row):
-        result = await asyncio.to_thread(
-            _send_single_email,
-            row,
-            idx,
-            len(df),
-            SENDER_EMAIL,
-            SMTP_HOST,
-            SMTP_PORT
-        )
+        result = await _send_single_email(pool, row, idx, SENDER_EMAIL)
         return idx, row.get('name', 'Unknown'), result
     
     tasks = []
-    for idx, row in df.iterrows():
+    for idx, row in iter_records(df, df.index[~df.index.isin(list(results_dict))]):
         tasks.append(send_with_index(idx, row))
     
-    # Process results as they complete
+    # Process results as they complete (one progress line at a time in quiet mode)
     completed_count = 0
-    results_dict = {}
+    progress = Progress('send', len(tasks))
     
     for coro in asyncio.as_completed(tasks):
         try:
@@ -110,27 +364,47 @@ async def send_emails_async(input_csv='output/emails_generated.csv', output_csv=
             completed_count += 1
             
             # Print output immediately
-            if result['email_sent']:
-                print(f"✅ [{completed_count}/{len(df)}] Sent to {result['name']} ({result.get('recipient', '')})")
-            else:
-                print(f"❌ [{completed_count}/{len(df)}] Failed for {result.get('name', name)} - {result['send_status']}")
+            _report_send_result(progress, f"{completed_count}/{len(tasks)}", name, result)
             
             # Store result with original index
             results_dict[idx] = result
+            if run_state is not None and result['email_sent']:
+                _checkpoint_send(run_state, stage_keys[idx], result)
             
         except Exception as e:
             completed_count += 1
-            print(f"❌ [{completed_count}/{len(df)}] Error sending email: {e}")
+            progress.advance(f"❌ [{completed_count}/{len(tasks)}] Error sending email: {e}", failed=True)
             # We can't recover idx/name from exception, skip this entry
     
-    # Update dataframe with results
-    for idx, result in results_dict.items():
-        df.at[idx, 'email_sent'] = result['email_sent']
-        df.at[idx, 'sent_at'] = result['sent_at']
-        df.at[idx, 'send_status'] = result['send_status']
+    progress.finish()
+    await pool.close()
+    if run_state is not None:
+        run_state.flush()
+    
+    return _save_send_status(df, results_dict, output_csv, pool)
+
+
+def _report_send_result(progress, position, name, result):
+    if result['email_sent']:
+        progress.advance(f"✅ [{position}] Sent to {result['name']} ({result.get('recipient', '')})")
+    else:
+        progress.advance(f"❌ [{position}] Failed for {result.get('name', name)} - {result['send_status']}",
+                         failed=True)
+
+
+def _checkpoint_send(run_state, stage_key, result):
+    run_state.mark_done('send', stage_key, {
+        'email_sent': True, 'sent_at': result['sent_at'], 'send_status': result['send_status'],
+    })
+
+
+def _save_send_status(df, results_dict, output_csv, pool):
+    """Write the per-email send status table and print the send summary"""
+    # Update dataframe with results (one assignment per column)
+    assign_columns(df, results_dict, ['email_sent', 'sent_at', 'send_status'])
     
-    # Save status CSV
-    df.to_csv(output_csv, index=False)
+    # Save status table
+    write_table(df, output_csv)
     
     # Summary
     sent_count = df['email_sent'].sum()
@@ -140,14 +414,75 @@ async def send_emails_async(input_csv='output/emails_generated.csv', output_csv=
     print(f"✅ Successfully sent: {sent_count}/{len(df)} emails")
     print(f"❌ Failed: {len(df) - sent_count}")
     print(f"💾 Status saved to: {output_csv}")
-    print(f"{'='*60}\n")
+    print(f"{'='*60}")
+    print_pool_stats(pool)
+    print()
     
     return df
 
 
-def send_emails(input_csv='output/emails_generated.csv', output_csv='output/emails_sent_status.csv'):
+@traced_stage('send')
+async def send_from_queue_async(queue, output_csv=None, backend=None, run_state=None):
+    """
+    Send emails while they are still being generated - async version
+    
+    queue receives (index, row key, row) items from
+    generate_all_emails_async(send_queue=...) and a final None. Each email is
+    sent as soon as it arrives, so delivery overlaps generation instead of
+    waiting for the whole table. The status table is written in index order
+    once the queue ends. With a run_state, emails delivered before a resume are
+    not sent again.
+    """
+    import pandas as pd
+    
+    output_csv = output_csv or intermediate_path(OUTPUT_DIR, 'emails_sent_status')
+    pool = create_smtp_pool(backend)
+    print(f"🔗 Sending from the generation queue via MailHog at {SMTP_HOST}:{SMTP_PORT} "
+          f"({pool.size} pooled connections, "
+          f"{'async' if isinstance(pool, AsyncSMTPConnectionPool) else 'threaded'} transport)\n")
+    
+    done = run_state.completed('send') if run_state is not None else {}
+    rows = {}
+    results_dict = {}
+    progress = Progress('send', None)
+    
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                # Let the other workers see the end of the queue too
+                queue.put_nowait(None)
+                return
+            idx, stage_key, row = item
+            rows[idx] = row
+            if stage_key in done:
+                results_dict[idx] = done[stage_key]
+                continue
+            result = await _send_single_email(pool, row, idx, SENDER_EMAIL)
+            _report_send_result(progress, progress.done + 1, row.get('name', 'Unknown'), result)
+            results_dict[idx] = result
+            if run_state is not None and result['email_sent']:
+                _checkpoint_send(run_state, stage_key, result)
+    
+    try:
+        await asyncio.gather(*(worker() for _ in range(pool.size)))
+    finally:
+        progress.finish()
+        await pool.close()
+        if run_state is not None:
+            run_state.flush()
+    
+    df = pd.DataFrame.from_dict(rows, orient='index').sort_index()
+    df['email_sent'] = False
+    df['email_sender'] = SENDER_EMAIL
+    df['sent_at'] = ''
+    df['send_status'] = ''
+    return _save_send_status(df, results_dict, output_csv, pool)
+
+
+def send_emails(input_csv=None, output_csv=None, backend=None):
     """Read CSV and send emails via MailHog - sync wrapper for backward compatibility"""
-    return asyncio.run(send_emails_async(input_csv, output_csv))
+    return asyncio.run(send_emails_async(input_csv, output_csv, backend))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+"""
+Sharded Lead Pipeline
+Runs step 1 (score → email → send) on N shards of the leads file in separate
+worker processes, so per-row Python work (prompt rendering, JSON parsing,
+MIME building, DataFrame bookkeeping) uses every core instead of one
+
+    leads.csv → dedup → N contiguous shards → N processes, each with its own
+    event loop running the batch pipeline → merged output tables
+
+The parent deduplicates first (duplicates in different shards are still
+merged), then writes each shard to output/shards/shard_NN/leads.csv. Workers
+write their tables next to their shard and the parent concatenates them in
+shard order and re-applies the priority sort, so the merged tables are the
+same for any number of shards. Provider rate limits (RPM, TPM, in-flight
+calls) are split evenly between the workers, so N processes together stay
+within the limits one process would have. Sharded runs are not checkpointed
+(like streaming mode); tiered email templates are built per shard.
+
+Configuration (environment variables):
+- PIPELINE_SHARDS   worker processes for step 1 (default: 1 = no sharding)
+"""
+
+import os
+import math
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from tracing import traced_stage, configure as configure_tracing
+
+load_dotenv()
+
+PIPELINE_SHARDS = int(os.getenv('PIPELINE_SHARDS', '1'))
+
+# Tables every worker writes and the parent merges, in pipeline order
+SHARD_TABLES = ('analyzed_leads', 'emails_generated', 'emails_sent_status')
+
+
+def shard_bounds(rows, shards):
+    """(start, stop) row ranges that split rows into contiguous, near-equal shards"""
+    edges = [rows * i // shards for i in range(shards + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def shard_env(shards):
+    """Environment for a worker: provider limits divided by the number of shards"""
+    from llm_scheduler import PROVIDER_DEFAULTS
+    env = {}
+    for defaults in PROVIDER_DEFAULTS.values():
+        prefix = defaults['env_prefix']
+        for name, key in (('RPM', 'rpm'), ('TPM', 'tpm'), ('MAX_IN_FLIGHT', 'max_in_flight')):
+            value = os.getenv(f'{prefix}_{name}')
+            value = float(value) if value not in (None, '') else defaults[key]
+            # 0 means unlimited and stays unlimited
+            env[f'{prefix}_{name}'] = str(math.ceil(value / shards) if value else 0)
+    return env
+
+
+def _init_worker(env, initializer, initargs):
+    # Runs before any pipeline module is imported, so they read the shard's settings
+    os.environ.update(env)
+    # Per-row output from N processes would interleave; progress lines only
+    configure_tracing(quiet=True)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+async def _shard_pipeline_async(shard, shard_dir, overlap_send):
+    from lead_analysis import process_leads_async
+    from personalized_email import generate_all_emails_async
+    from sendMailHog import send_emails_async, send_from_queue_async
+    from storage import intermediate_path
+
+    started = time.perf_counter()
+    paths = {name: intermediate_path(shard_dir, name) for name in SHARD_TABLES}
+    # The parent already deduplicated across shards
+    await process_leads_async(os.path.join(shard_dir, 'leads.csv'), output_file=paths['analyzed_leads'],
+                              dedup=False)
+    if overlap_send:
+        send_queue = asyncio.Queue()
+
+        async def generate_then_close():
+            try:
+                await generate_all_emails_async(paths['analyzed_leads'], paths['emails_generated'],
+                                                send_queue=send_queue)
+            finally:
+                send_queue.put_nowait(None)
+
+        await asyncio.gather(generate_then_close(), send_from_queue_async(send_queue, paths['emails_sent_status']))
+    else:
+        await generate_all_emails_async(paths['analyzed_leads'], paths['emails_generated'])
+        await send_emails_async(paths['emails_generated'], paths['emails_sent_status'])
+    return {'shard': shard, 'paths': paths, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+def _run_shard(shard, shard_dir, overlap_send):
+    """Worker process entry point: one shard through the batch pipeline on its own event loop"""
+    return asyncio.run(_shard_pipeline_async(shard, shard_dir, overlap_send))
+
+
+def merge_shard_tables(results, output_dir):
+    """Concatenate every shard's tables in shard order into output_dir; returns {name: path}"""
+    import pandas as pd
+    from storage import intermediate_path, read_table, write_table
+
+    merged = {}
+    for name in SHARD_TABLES:
+        df = pd.concat([read_table(result['paths'][name]) for result in results], ignore_index=True)
+        if 'priority_score' in df.columns:
+            # Stable, so ties keep shard order = input order, as in a single-process run
+            df = df.sort_values('priority_score', ascending=False, kind='stable').reset_index(drop=True)
+        merged[name] = write_table(df, intermediate_path(output_dir, name))
+    return merged
+
+
+@traced_stage('sharded_pipeline')
+async def run_sharded_pipeline_async(leads_csv, output_dir, shards=None, overlap_send=False,
+                                     initializer=None, initargs=()):
+    """
+    Score, write and send leads in `shards` worker processes - async version
+
+    initializer(*initargs) runs in every worker before the pipeline starts.
+    Returns the path of the merged sent-status table, like the batch pipeline.
+    """
+    import pandas as pd
+    from storage import intermediate_path, write_table
+    from lead_dedup import dedupe_leads, print_dedup_stats, LEAD_DEDUP
+
+    shards = shards or PIPELINE_SHARDS
+    started = time.perf_counter()
+    df = pd.read_csv(leads_csv, dtype={'company_size': str})
+    if LEAD_DEDUP:
+        df, duplicates, index = dedupe_leads(df)
+        write_table(duplicates, intermediate_path(output_dir, 'lead_duplicates'))
+        print_dedup_stats(index)
+    shards = max(1, min(shards, len(df)))
+
+    shard_dirs = []
+    for shard, (start, stop) in enumerate(shard_bounds(len(df), shards)):
+        shard_dir = os.path.join(output_dir, 'shards', f'shard_{shard:02d}')
+        os.makedirs(shard_dir, exist_ok=True)
+        df.iloc[start:stop].to_csv(os.path.join(shard_dir, 'leads.csv'), index=False)
+        shard_dirs.append(shard_dir)
+    print(f"🧱 Sharding {len(df)} leads into {shards} shards of ~{len(df) // shards} "
+          f"({time.perf_counter() - started:.1f}s)\n")
+
+    # spawn, not fork: the parent may already hold threads, sockets and SQLite handles
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(shards, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(shard_env(shards), initializer, initargs)) as pool:
+        results = await asyncio.gather(*(loop.run_in_executor(pool, _run_shard, shard, shard_dir, bool(overlap_send))
+                                         for shard, shard_dir in enumerate(shard_dirs)))
+
+    merged = merge_shard_tables(results, output_dir)
+    print(f"🧱 Shards finished in {', '.join(str(result['seconds']) + 's' for result in results)}; "
+          f"merged in {time.perf_counter() - started:.1f}s total\n")
+    return merged['emails_sent_status']
@@ -0,0 +1,161 @@
+"""
+Intermediate Table Storage
+Columnar files between pipeline stages, with CSV kept as an export format
+
+Stages hand each other analyzed_leads, emails_generated, emails_sent_status,
+emails_with_replies and final tables. By default these are Arrow IPC files
+(.arrow): typed columns, no text parsing, and reads are memory-mapped so a
+stage that needs a few columns only touches those. Parquet (.parquet) and
+CSV (.csv) are also supported; the format is picked from the file extension,
+so callers passing a .csv path keep the old behaviour.
+
+Configuration (environment variables):
+- INTERMEDIATE_FORMAT        arrow | parquet | csv (default: arrow, csv without pyarrow)
+- INTERMEDIATE_CSV_EXPORT=1  also write a .csv copy next to every columnar file
+"""
+
+import os
+import shutil
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import pyarrow  # noqa: F401 - only checks that the columnar formats are available
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+EXTENSIONS = {'arrow': '.arrow', 'parquet': '.parquet', 'csv': '.csv'}
+FORMATS = {extension: fmt for fmt, extension in EXTENSIONS.items()}
+
+INTERMEDIATE_FORMAT = os.getenv('INTERMEDIATE_FORMAT', 'arrow' if HAVE_PYARROW else 'csv').lower()
+CSV_EXPORT = os.getenv('INTERMEDIATE_CSV_EXPORT', '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+def intermediate_format(fmt=None):
+    """Configured format, falling back to CSV when pyarrow is missing"""
+    fmt = (fmt or INTERMEDIATE_FORMAT).lower()
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown intermediate format: {fmt} (expected one of {', '.join(EXTENSIONS)})")
+    if fmt != 'csv' and not HAVE_PYARROW:
+        print(f"⚠️  pyarrow is not installed, writing CSV instead of {fmt}")
+        return 'csv'
+    return fmt
+
+
+def intermediate_path(directory, name, fmt=None):
+    """Path of an intermediate table, e.g. output/analyzed_leads.arrow"""
+    return os.path.join(directory, name + EXTENSIONS[intermediate_format(fmt)])
+
+
+def find_table(directory, name):
+    """Most recently written table `name` in any format, or None"""
+    paths = [os.path.join(directory, name + extension) for extension in EXTENSIONS.values()]
+    paths = [path for path in paths if os.path.exists(path)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def require_table(directory, name):
+    """find_table, raising FileNotFoundError when there is no table `name` in directory"""
+    path = find_table(directory, name)
+    if path is None:
+        raise FileNotFoundError(f"No {name} table (.arrow, .parquet or .csv) in: {directory}")
+    return path
+
+
+def _format_of(path):
+    return FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def _typed(df):
+    """Object columns mixing strings and numbers are stored as strings (Arrow needs one type)"""
+    mixed = [column for column in df.columns
+             if df[column].dtype == object
+             and pd.api.types.infer_dtype(df[column], skipna=True) in ('mixed', 'mixed-integer')]
+    if not mixed:
+        return df
+    df = df.copy()
+    for column in mixed:
+        values = df[column]
+        df[column] = values.where(values.isna(), values.astype(str))
+    return df
+
+
+def write_table(df, path, export_csv=None):
+    """Write df in the format given by the path's extension (plus an optional CSV copy)"""
+    fmt = _format_of(path)
+    if fmt == 'arrow':
+        # Uncompressed so readers can memory-map the file
+        _typed(df).reset_index(drop=True).to_feather(path, compression='uncompressed')
+    elif fmt == 'parquet':
+        _typed(df).to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    if fmt != 'csv' and (CSV_EXPORT if export_csv is None else export_csv):
+        df.to_csv(os.path.splitext(path)[0] + '.csv', index=False)
+    return path
+
+
+def read_table(path, columns=None, **csv_options):
+    """
+    Read a table written by write_table (or any CSV). With columns, only those
+    that exist are loaded; Arrow files are memory-mapped. csv_options are passed
+    to pd.read_csv for CSV files.
+    """
+    fmt = _format_of(path)
+    if fmt == 'arrow':
+        from pyarrow import feather
+        table = feather.read_table(path, memory_map=True)
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        return table.to_pandas()
+    if fmt == 'parquet':
+        if columns is not None:
+            import pyarrow.parquet as pq
+            available = pq.read_schema(path).names
+            columns = [c for c in columns if c in available]
+        return pd.read_parquet(path, columns=columns)
+    if columns is not None:
+        wanted = set(columns)
+        return pd.read_csv(path, usecols=lambda c: c in wanted, **csv_options)
+    return pd.read_csv(path, **csv_options)
+
+
+def iter_table(path, columns=None, chunk_size=100000, **csv_options):
+    """
+    Read a table chunk by chunk (DataFrames of at most chunk_size rows), so
+    tables larger than memory can be aggregated. Arrow files are memory-mapped
+    and sliced, Parquet is read batch by batch, CSV with pd.read_csv chunks
+    (csv_options are passed to pd.read_csv).
+    """
+    fmt = _format_of(path)
+    if fmt == 'arrow':
+        from pyarrow import feather
+        table = feather.read_table(path, memory_map=True)
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        for offset in range(0, table.num_rows, chunk_size):
+            yield table.slice(offset, chunk_size).to_pandas()
+        return
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        if columns is not None:
+            columns = [c for c in columns if c in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+        return
+    wanted = set(columns) if columns is not None else None
+    yield from pd.read_csv(path, usecols=(lambda c: c in wanted) if wanted is not None else None,
+                           chunksize=chunk_size, **csv_options)
+
+
+def export_csv(path, csv_path):
+    """Copy a table to csv_path as CSV (a plain file copy when it already is CSV)"""
+    if _format_of(path) == 'csv':
+        shutil.copyfile(path, csv_path)
+    else:
+        read_table(path).to_csv(csv_path, index=False)
+    return csv_path
@@ -0,0 +1,244 @@
+"""
+Streaming Lead Pipeline
+Reads leads in chunks and pipes every record through score → email → send
+
+Instead of finishing each stage on the whole file before the next one starts,
+records flow through bounded asyncio queues:
+
+    leads.csv (chunks) → [score workers] → [email workers] → [send workers]
+
+Each stage appends its rows to the usual output files as soon as they complete
+(analyzed_leads.csv, emails_generated.csv, emails_sent_status.csv), so memory
+stays bounded by the queue sizes and the first email goes out seconds after
+start-up. Rows are written in completion order, not sorted by priority.
+"""
+
+import os
+import csv
+import time
+import asyncio
+import pandas as pd
+from dotenv import load_dotenv
+
+from lead_analysis import (analyze_lead, analysis_columns, fingerprint_leads, rule_analysis_columns,
+                           ANALYSIS_COLUMNS, FINGERPRINT_COLUMN, LEAD_SCORING)
+from personalized_email import generate_email, email_columns, EMAIL_COLUMNS
+from sendMailHog import (_send_single_email, create_smtp_pool, print_pool_stats,
+                         SEND_STATUS_COLUMNS, SENDER_EMAIL)
+from llm_scheduler import print_scheduler_stats, HUGGINGFACE
+from llm_cache import print_cache_stats
+from tracing import traced_stage
+from prompt_metrics import report_prompt_stats
+from llm_json import print_parse_stats
+from email_templates import print_template_stats, EMAIL_GENERATION
+from lead_dedup import DedupIndex, dedupe_leads, print_dedup_stats, DEDUP_COLUMNS, LEAD_DEDUP
+from records import iter_records
+
+load_dotenv()
+
+CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', '500'))
+SCORE_WORKERS = int(os.getenv('STREAM_SCORE_WORKERS', '16'))
+EMAIL_WORKERS = int(os.getenv('STREAM_EMAIL_WORKERS', '16'))
+SEND_WORKERS = int(os.getenv('STREAM_SEND_WORKERS', '0'))  # 0 = one per pooled SMTP session
+
+
+class CsvAppender:
+    """Append dict rows to a CSV as they complete (header written on open)"""
+
+    def __init__(self, path, fieldnames, flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self.rows_written = 0
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+        self.rows_written += 1
+        if self.rows_written % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+async def _produce(leads_csv, chunk_size, queue, stats, dedup_index=None):
+    """Read the leads file chunk by chunk and feed records into the first queue"""
+    for chunk in pd.read_csv(leads_csv, dtype={'company_size': str}, chunksize=chunk_size):
+        if dedup_index is not None:
+            # One index for the whole file, so duplicates across chunks are caught too
+            chunk, duplicates, _ = dedupe_leads(chunk, dedup_index)
+            stats['duplicates'] += len(duplicates)
+        chunk[FINGERPRINT_COLUMN] = fingerprint_leads(chunk)
+        if LEAD_SCORING != 'llm':
+            # Rubric columns for the whole chunk in one vectorized pass
+            chunk[ANALYSIS_COLUMNS] = rule_analysis_columns(chunk)
+        chunk = chunk.astype(object).where(chunk.notna(), '')
+        for _, record in iter_records(chunk):
+            stats['read'] += 1
+            await queue.put(record)
+
+
+async def _score_worker(in_queue, out_queue, writer, stats):
+    while True:
+        record = await in_queue.get()
+        try:
+            if LEAD_SCORING != 'rules':
+                rule_score = record.get('priority_score')
+                result = await analyze_lead(record, LEAD_SCORING)
+                if LEAD_SCORING == 'hybrid':
+                    # Hybrid answers carry no score of their own
+                    result = {**result, 'priority_score': rule_score}
+                record.update(analysis_columns(record, result))
+            writer.write(record)
+            stats['scored'] += 1
+            await out_queue.put(record)
+        except Exception as e:
+            stats['errors'] += 1
+            print(f"❌ Error analyzing lead {record.get('name', '')}: {e}")
+        finally:
+            in_queue.task_done()
+
+
+async def _email_worker(in_queue, out_queue, writer, stats):
+    while True:
+        record = await in_queue.get()
+        try:
+            email = await generate_email(record)
+            record.update(email_columns(email))
+            writer.write(record)
+            stats['emailed'] += 1
+            await out_queue.put(record)
+        except Exception as e:
+            stats['errors'] += 1
+            print(f"❌ Error generating email for {record.get('name', '')}: {e}")
+        finally:
+            in_queue.task_done()
+
+
+async def _send_worker(in_queue, pool, writer, stats):
+    while True:
+        record = await in_queue.get()
+        try:
+            result = await _send_single_email(pool, record, stats['sent'], SENDER_EMAIL)
+            record['email_sent'] = result['email_sent']
+            record['email_sender'] = SENDER_EMAIL
+            record['sent_at'] = result['sent_at']
+            record['send_status'] = result['send_status']
+            writer.write(record)
+            stats['sent'] += 1
+            if result['email_sent']:
+                stats['delivered'] += 1
+                if stats['first_email_at'] is None:
+                    stats['first_email_at'] = time.monotonic()
+                    print(f"⏱️  First email sent after {stats['first_email_at'] - stats['started_at']:.2f}s")
+            if stats['sent'] % 100 == 0:
+                print(f"📤 Streaming: read {stats['read']} | scored {stats['scored']} | "
+                      f"emailed {stats['emailed']} | sent {stats['sent']}")
+        except Exception as e:
+            stats['errors'] += 1
+            print(f"❌ Error sending email to {record.get('name', '')}: {e}")
+        finally:
+            in_queue.task_done()
+
+
+@traced_stage('streaming_step1')
+async def run_streaming_pipeline_async(leads_csv, output_dir, chunk_size=None):
+    """
+    Score, write and send leads as a stream - async version
+
+    Returns the path of the sent-status CSV, like the batch pipeline.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    os.makedirs(output_dir, exist_ok=True)
+    analyzed_csv = os.path.join(output_dir, 'analyzed_leads.csv')
+    emails_csv = os.path.join(output_dir, 'emails_generated.csv')
+    sent_csv = os.path.join(output_dir, 'emails_sent_status.csv')
+
+    # Header only - the input columns decide every output file's layout
+    input_columns = list(pd.read_csv(leads_csv, nrows=0).columns)
+    dedup_index = DedupIndex() if LEAD_DEDUP else None
+    if dedup_index is not None:
+        input_columns += DEDUP_COLUMNS
+    analyzed_fields = input_columns + [FINGERPRINT_COLUMN] + ANALYSIS_COLUMNS
+    emails_fields = analyzed_fields + EMAIL_COLUMNS
+    sent_fields = emails_fields + SEND_STATUS_COLUMNS
+
+    writers = [
+        CsvAppender(analyzed_csv, analyzed_fields),
+        CsvAppender(emails_csv, emails_fields),
+        CsvAppender(sent_csv, sent_fields),
+    ]
+
+    pool = create_smtp_pool()
+    send_workers = SEND_WORKERS or pool.size
+    
+    # Bounded queues give back-pressure so memory stays flat on huge files
+    score_queue = asyncio.Queue(maxsize=chunk_size)
+    email_queue = asyncio.Queue(maxsize=chunk_size)
+    send_queue = asyncio.Queue(maxsize=chunk_size)
+
+    stats = {
+        'read': 0, 'duplicates': 0, 'scored': 0, 'emailed': 0, 'sent': 0, 'delivered': 0, 'errors': 0,
+        'started_at': time.monotonic(), 'first_email_at': None,
+    }
+
+    print(f"🌊 Streaming {leads_csv} in chunks of {chunk_size} "
+          f"({SCORE_WORKERS} score / {EMAIL_WORKERS} email / {send_workers} send workers)\n")
+
+    workers = (
+        [asyncio.create_task(_score_worker(score_queue, email_queue, writers[0], stats))
+         for _ in range(SCORE_WORKERS)]
+        + [asyncio.create_task(_email_worker(email_queue, send_queue, writers[1], stats))
+           for _ in range(EMAIL_WORKERS)]
+        + [asyncio.create_task(_send_worker(send_queue, pool, writers[2], stats))
+           for _ in range(send_workers)]
+    )
+
+    try:
+        await _produce(leads_csv, chunk_size, score_queue, stats, dedup_index)
+        # Drain stage by stage: a queue is only finished once its upstream is
+        await score_queue.join()
+        await email_queue.join()
+        await send_queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await pool.close()
+        for writer in writers:
+            writer.close()
+
+    elapsed = time.monotonic() - stats['started_at']
+    print(f"\n{'='*60}")
+    print(f"📊 STREAMING SUMMARY")
+    print(f"{'='*60}")
+    print(f"✅ Leads processed: {stats['sent']}/{stats['read']}")
+    print(f"✅ Successfully sent: {stats['delivered']}/{stats['sent']} emails")
+    if dedup_index is not None:
+        print(f"🧬 Duplicates skipped: {stats['duplicates']}")
+    print(f"❌ Pipeline errors: {stats['errors']}")
+    if stats['first_email_at'] is not None:
+        print(f"⏱️  Time to first email: {stats['first_email_at'] - stats['started_at']:.2f}s")
+    print(f"⏱️  Total time: {elapsed:.2f}s")
+    print(f"💾 Outputs: {analyzed_csv}, {emails_csv}, {sent_csv}")
+    print(f"{'='*60}")
+    print_pool_stats(pool)
+    print_scheduler_stats(HUGGINGFACE)
+    print_cache_stats()
+    report_prompt_stats('lead_analysis')
+    report_prompt_stats('email_generation')
+    print_parse_stats('lead_analysis')
+    print_parse_stats('email_generation')
+    print_template_stats()
+    if dedup_index is not None:
+        print_dedup_stats(dedup_index, LEAD_SCORING, templated=EMAIL_GENERATION == 'tiered')
+    print()
+
+    return sent_csv
+
+
+def run_streaming_pipeline(leads_csv, output_dir, chunk_size=None):
+    """Score, write and send leads as a stream - sync wrapper"""
+    return asyncio.run(run_streaming_pipeline_async(leads_csv, output_dir, chunk_size))
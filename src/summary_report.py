@@ -1,76 +1,303 @@
 """
 Email Campaign Report Generator using LangChain and Gemini AI
 This script analyzes email campaign data and generates a comprehensive markdown report
+
+Segment breakdowns (industry, company size, location and their reply-class
+cross-tabs) are cut to the REPORT_TOP_K largest segments plus one "Other"
+bucket, so the prompt stays the same size however many distinct segments a
+campaign has. REPORT_MODE picks how the report is written:
+- single      one prompt for the whole report
+- map_reduce  the overview, response analysis and segmentation sections are
+              drafted concurrently from their own metrics (map), then the
+              executive summary and the findings / recommendations are written
+              from those drafts (reduce) and the report is assembled from the parts
+
+Every section (the whole report in single mode) is stored in the LLM cache
+together with the metrics it was written from, one entry per campaign table
+and section. A refresh reuses the stored text while none of the section's
+own metrics moved by more than REPORT_CACHE_TOLERANCE, so only sections whose
+numbers changed are regenerated; the reduce step is reused when every
+section was.
+
+Breakdowns the campaign table cannot provide (no reply_class column, say)
+reach the prompt as "not available" instead of an empty {}, and a map section
+whose required inputs are all empty is not generated at all: the report
+carries a short note in its place.
+
+Configuration (environment variables):
+- REPORT_MODE              single | map_reduce (default: single)
+- REPORT_TOP_K             segments kept per breakdown before the "Other" bucket (default: 15, 0 = all)
+- REPORT_CACHE_TOLERANCE   relative change per metric a reused section may lag behind
+                           (default: 0 = reuse only for identical metrics; LLM_CACHE=0 disables reuse)
 """
 
-import pandas as pd
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.llms import HuggingFaceEndpoint
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 import os
+import re
+import json
+import asyncio
 from dotenv import load_dotenv
+from llm_scheduler import submit, estimate_tokens, print_scheduler_stats, GEMINI
+from llm_cache import get_cache, cache_key, store_result
+from llm_clients import get_client, CLIENT_CONFIGS
+from campaign_metrics import campaign_metrics
+from tracing import traced_stage
 
 # Load environment variables from .env file
 load_dotenv()
 
-def load_and_analyze_csv(file_path):
-    """Load CSV and extract key metrics"""
-    df = pd.read_csv(file_path)
-    
-    # Calculate campaign metrics
-    total_contacts = len(df)
-    emails_sent = df['email_sent'].sum() if 'email_sent' in df.columns else 0
-    emails_successful = len(df[df['send_status'] == 'Success']) if 'send_status' in df.columns else 0
-    
-    # Reply analysis
-    replies_received = df['reply'].notna().sum() if 'reply' in df.columns else 0
-    positive_replies = 0
-    negative_replies = 0
-    neutral_replies = 0
-    
-    if 'reply' in df.columns:
-        for reply in df['reply'].dropna():
-            if reply.lower() == 'yes':
-                positive_replies += 1
-            elif reply.lower() == 'no':
-                negative_replies += 1
-            else:
-                neutral_replies += 1
-    
-    # Industry breakdown
-    industry_distribution = df['industry'].value_counts().to_dict() if 'industry' in df.columns else {}
-    
-    # Company size breakdown
-    company_size_dist = df['company_size'].value_counts().to_dict() if 'company_size' in df.columns else {}
-    
-    # Priority score analysis
-    avg_priority = df['priority_score'].mean() if 'priority_score' in df.columns else 0
-    high_priority = len(df[df['priority_score'] >= 70]) if 'priority_score' in df.columns else 0
-    
-    # Location breakdown
-    location_dist = df['location'].value_counts().to_dict() if 'location' in df.columns else {}
-    
-    return {
-        'total_contacts': total_contacts,
-        'emails_sent': emails_sent,
-        'emails_successful': emails_successful,
-        'replies_received': replies_received,
-        'positive_replies': positive_replies,
-        'negative_replies': negative_replies,
-        'neutral_replies': neutral_replies,
-        'response_rate': round((replies_received / emails_successful * 100), 2) if emails_successful > 0 else 0,
-        'positive_rate': round((positive_replies / replies_received * 100), 2) if replies_received > 0 else 0,
-        'industry_distribution': industry_distribution,
-        'company_size_distribution': company_size_dist,
-        'avg_priority_score': round(avg_priority, 2),
-        'high_priority_leads': high_priority,
-        'location_distribution': location_dist,
-        'success_rate': round((emails_successful / emails_sent * 100), 2) if emails_sent > 0 else 0
-    }
-
-def generate_campaign_report(csv_file_path):
-    """Generate comprehensive campaign report using LangChain and Gemini"""
+REPORT_MODES = ('single', 'map_reduce')
+REPORT_MODE = os.getenv('REPORT_MODE', 'single').lower()
+REPORT_TOP_K = int(os.getenv('REPORT_TOP_K', '15'))
+REPORT_CACHE_TOLERANCE = float(os.getenv('REPORT_CACHE_TOLERANCE', '0'))
+
+SEGMENT_DISTRIBUTIONS = ('industry_distribution', 'company_size_distribution', 'location_distribution')
+SEGMENT_CROSSTABS = ('industry_by_reply_class', 'company_size_by_reply_class', 'location_by_reply_class')
+
+# Shown to the model in place of an empty breakdown
+UNAVAILABLE = "not available (not in the campaign table)"
+
+
+def load_and_analyze_csv(file_path, chunk_size=None):
+    """
+    Load the campaign table (CSV or columnar) and extract key metrics - one
+    vectorized pass per chunk, so huge tables are never loaded whole (see campaign_metrics)
+    """
+    return campaign_metrics(file_path, chunk_size)
+
+
+def top_k_buckets(distribution, k=None):
+    """The k largest segments plus one "Other (n more)" bucket holding the tail"""
+    k = REPORT_TOP_K if k is None else k
+    if not k or len(distribution) <= k:
+        return dict(distribution)
+    ranked = sorted(distribution.items(), key=lambda item: item[1], reverse=True)
+    buckets = dict(ranked[:k])
+    buckets[f"Other ({len(ranked) - k} more)"] = sum(count for _, count in ranked[k:])
+    return buckets
+
+
+def top_k_crosstab(crosstab, k=None):
+    """Cross-tab rows of the k largest segments; the remaining rows are summed into one Other row"""
+    k = REPORT_TOP_K if k is None else k
+    if not k or len(crosstab) <= k:
+        return dict(crosstab)
+    kept = top_k_buckets({segment: sum(row.values()) for segment, row in crosstab.items()}, k)
+    result = {segment: row for segment, row in crosstab.items() if segment in kept}
+    other = {}
+    for segment, row in crosstab.items():
+        if segment not in result:
+            for label, count in row.items():
+                other[label] = other.get(label, 0) + count
+    result[f"Other ({len(crosstab) - len(result)} more)"] = other
+    return result
+
+
+def report_inputs(metrics, k=None):
+    """Metrics with every segment breakdown bucketed to its top k (bounded prompt size)"""
+    inputs = dict(metrics)
+    for key in SEGMENT_DISTRIBUTIONS:
+        inputs[key] = top_k_buckets(metrics.get(key, {}), k)
+    for key in SEGMENT_CROSSTABS:
+        inputs[key] = top_k_crosstab(metrics.get(key, {}), k)
+    return inputs
+
+
+# Map step: each section is drafted from its own metrics only
+SECTION_PROMPTS = {
+    'overview': """
+    You are an expert data analyst writing one part of an email marketing campaign report.
+    Write the "## Campaign Overview" and "## Lead Quality Assessment" sections in markdown
+    (tables where useful, percentages, 150-250 words). Output only these two sections.
+    
+    - Total Contacts: {total_contacts}
+    - Emails Sent: {emails_sent}
+    - Successfully Delivered: {emails_successful} ({success_rate}%)
+    - Replies Received: {replies_received} (response rate {response_rate}%)
+    - Average Priority Score: {avg_priority_score}
+    - High Priority Leads (Score ≥70): {high_priority_leads}
+    - Priority Score Histogram: {priority_histogram}
+    """,
+    'responses': """
+    You are an expert data analyst writing one part of an email marketing campaign report.
+    Write the "## Response Analysis" section in markdown (tables where useful, percentages,
+    150-250 words) with insights on what drove positive and negative replies. Output only this section.
+    Metrics marked "not available" are missing from the campaign data; say so instead of estimating them.
+    
+    - Replies Received: {replies_received} (response rate {response_rate}%)
+    - Positive Responses: {positive_replies} ({positive_rate}%)
+    - Negative Responses: {negative_replies}
+    - Neutral/Inquiry Responses: {neutral_replies}
+    - Reply Classes: {reply_class_distribution}
+    - Reply Classes by Industry: {industry_by_reply_class}
+    """,
+    'segmentation': """
+    You are an expert data analyst writing one part of an email marketing campaign report.
+    Write the "## Audience Segmentation" section in markdown (tables where useful, percentages,
+    150-250 words) covering industry, company size and location. "Other" rows group the
+    smaller segments. Output only this section.
+    Metrics marked "not available" are missing from the campaign data; say so instead of estimating them.
+    
+    - Industry Distribution: {industry_distribution}
+    - Company Size Distribution: {company_size_distribution}
+    - Location Distribution: {location_distribution}
+    - Reply Classes by Company Size: {company_size_by_reply_class}
+    - Reply Classes by Location: {location_by_reply_class}
+    """,
+}
+
+# A map section is only written when at least one of its required inputs has data
+SECTION_REQUIRED_INPUTS = {
+    'responses': ('reply_class_distribution',),
+    'segmentation': SEGMENT_DISTRIBUTIONS,
+}
+# Written in place of a section that has no data to work from
+SECTION_PLACEHOLDERS = {
+    'responses': "## Response Analysis\n\n_Not available: the campaign table has no reply classifications._",
+    'segmentation': "## Audience Segmentation\n\n_Not available: the campaign table has no segment columns._",
+}
+
+# Reduce step: written from the section drafts, not the raw metrics
+SUMMARY_PROMPTS = {
+    'executive_summary': """
+    You are an expert data analyst finishing an email marketing campaign report.
+    From the section drafts below, write only the "## Executive Summary" section in markdown:
+    key highlights and overall campaign performance, 80-150 words.
+    
+    {sections}
+    """,
+    'recommendations': """
+    You are an expert data analyst finishing an email marketing campaign report.
+    From the section drafts below, write only the "## Key Findings and Insights",
+    "## Strategic Recommendations" (actionable next steps) and "## Conclusion" sections in markdown.
+    
+    {sections}
+    """,
+}
+
+
+# "Other (n more)" labels change with n; the bucket is compared by its count
+_OTHER_BUCKET = re.compile(r'^Other \(\d+ more\)$')
+
+
+def _flatten(value, path=()):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            key = 'Other' if _OTHER_BUCKET.match(str(key)) else str(key)
+            yield from _flatten(item, path + (key,))
+    else:
+        yield path, value
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def metrics_changed(old, new, tolerance=None):
+    """
+    True when any value in new differs from old by more than tolerance (relative
+    change; 0 = any change). Missing values count as 0, text must match exactly.
+    """
+    tolerance = REPORT_CACHE_TOLERANCE if tolerance is None else tolerance
+    old, new = dict(_flatten(old)), dict(_flatten(new))
+    for path in old.keys() | new.keys():
+        before, after = old.get(path, 0), new.get(path, 0)
+        if _is_number(before) and _is_number(after):
+            if abs(after - before) > tolerance * max(abs(before), abs(after)):
+                return True
+        elif before != after:
+            return True
+    return False
+
+
+def section_key(scope, name, template):
+    """Cache slot of one report section: model settings, campaign table, section and its prompt"""
+    _, params = CLIENT_CONFIGS['campaign_report']
+    return cache_key(params['model'], params['temperature'],
+                     ['campaign_report', os.path.abspath(scope), name, template])
+
+
+async def _cached_section(name, template, inputs, scope, stats, generate):
+    """Stored text of a section while its inputs are within tolerance, else generate() and store"""
+    # Compare in the form the cache stores (JSON keys are strings)
+    inputs = json.loads(json.dumps(inputs, default=str))
+    cache = get_cache()
+    key = section_key(scope, name, template)
+    cached = cache.get(key)
+    if cached is not None and not metrics_changed(cached['inputs'], inputs):
+        stats['reused'] += 1
+        return cached['text']
+    text = await generate()
+    store_result(cache, key, {'inputs': inputs, 'text': text})
+    stats['generated'] += 1
+    return text
+
+
+def _is_empty(value):
+    return isinstance(value, dict) and not value
+
+
+def prompt_inputs(metrics, variables):
+    """The metrics a prompt uses, with empty breakdowns spelled out as UNAVAILABLE"""
+    return {variable: UNAVAILABLE if _is_empty(metrics[variable]) else metrics[variable]
+            for variable in variables}
+
+
+def section_has_no_data(name, metrics):
+    """True when every required input of a map section is empty (nothing to write it from)"""
+    required = SECTION_REQUIRED_INPUTS.get(name, ())
+    return bool(required) and all(_is_empty(metrics.get(variable, {})) for variable in required)
+
+
+async def _write_section(model, name, template, metrics, scope, stats):
+    if section_has_no_data(name, metrics):
+        stats['skipped'] += 1
+        return SECTION_PLACEHOLDERS[name]
+    prompt = PromptTemplate.from_template(template)
+    # Each section is keyed on the metrics its prompt uses, not on the whole set
+    inputs = prompt_inputs(metrics, prompt.input_variables)
+    chain = prompt | model | StrOutputParser()
+    return await _cached_section(name, template, inputs, scope, stats, lambda: submit(
+        GEMINI, lambda: chain.ainvoke(inputs), tokens=estimate_tokens(template) + estimate_tokens(inputs)))
+
+
+def print_section_stats(stats):
+    skipped = f", {stats['skipped']} skipped (no data)" if stats['skipped'] else ""
+    print(f"♻️  Report sections: {stats['reused']} reused, {stats['generated']} regenerated{skipped}")
+
+
+async def map_reduce_report(model, metrics, scope, stats):
+    """
+    Report from concurrently drafted sections (map) and summaries written from
+    those drafts (reduce); prompt sizes do not grow with the number of segments.
+    scope (the campaign table) and stats are used for section reuse.
+    """
+    names = list(SECTION_PROMPTS)
+    drafts = await asyncio.gather(*(_write_section(model, name, SECTION_PROMPTS[name], metrics, scope, stats)
+                                    for name in names))
+    sections = dict(zip(names, (draft.strip() for draft in drafts)))
+    
+    joined = {'sections': "\n\n".join(sections.values())}
+    summary, recommendations = await asyncio.gather(
+        *(_write_section(model, name, SUMMARY_PROMPTS[name], joined, scope, stats) for name in SUMMARY_PROMPTS))
+    
+    return "\n\n".join([
+        "# Email Campaign Report",
+        summary.strip(),
+        sections['overview'],
+        sections['responses'],
+        sections['segmentation'],
+        recommendations.strip(),
+    ]) + "\n"
+
+
+@traced_stage('summary_report')
+async def generate_campaign_report_async(csv_file_path, mode=None):
+    """Generate comprehensive campaign report using LangChain and Gemini - async version"""
+    mode = (mode or REPORT_MODE).lower()
+    if mode not in REPORT_MODES:
+        raise ValueError(f"Unknown report mode: {mode} (expected one of {', '.join(REPORT_MODES)})")
     
     # Load API key from environment
     google_api_key = os.getenv("GOOGLE_API_KEY")
@@ -78,19 +305,18 @@ def generate_campaign_report(csv_file_path):
     if not google_api_key:
         raise ValueError("GOOGLE_API_KEY not found in environment variables. Please add it to your .env file.")
     
-    # Use Google's Gemini Pro model
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.7,
-        top_p=0.95,
-        top_k=40,
-        max_output_tokens=2048,
-        google_api_key=google_api_key,
-        convert_system_message_to_human=True,
-    )
+    # Use Google's Gemini model (shared client, built on first use)
+    model = get_client('campaign_report')
+    
+    # Load and analyze data; large segment sets are bucketed into top k + "Other"
+    metrics = report_inputs(load_and_analyze_csv(csv_file_path))
+    stats = {'reused': 0, 'generated': 0, 'skipped': 0}
     
-    # Load and analyze data
-    metrics = load_and_analyze_csv(csv_file_path)
+    if mode == 'map_reduce':
+        report = await map_reduce_report(model, metrics, csv_file_path, stats)
+        print_section_stats(stats)
+        print_scheduler_stats(GEMINI)
+        return report
     
     # Create prompt template
     prompt_template = """
@@ -111,11 +337,14 @@ def generate_campaign_report(csv_file_path):
     - Positive Reply Rate: {positive_rate}%
     - Average Priority Score: {avg_priority_score}
     - High Priority Leads (Score ≥70): {high_priority_leads}
+    - Reply Classes: {reply_class_distribution}
+    - Priority Score Histogram: {priority_histogram}
     
     **Segmentation Data:**
     - Industry Distribution: {industry_distribution}
     - Company Size Distribution: {company_size_distribution}
     - Location Distribution: {location_distribution}
+    - Reply Classes by Industry: {industry_by_reply_class}
     
     Please create a detailed report with the following sections:
     1. Executive Summary (key highlights and overall campaign performance)
@@ -128,6 +357,7 @@ def generate_campaign_report(csv_file_path):
     8. Conclusion
     
     Use professional language, include percentages, and provide actionable insights.
+    Metrics marked "not available" are missing from the campaign data; say so instead of estimating them.
     Format the report in clean markdown with proper headers, tables where appropriate, and bullet points.
     """
     
@@ -136,7 +366,8 @@ def generate_campaign_report(csv_file_path):
             "total_contacts", "emails_sent", "emails_successful", "success_rate",
             "replies_received", "response_rate", "positive_replies", "negative_replies",
             "neutral_replies", "positive_rate", "avg_priority_score", "high_priority_leads",
-            "industry_distribution", "company_size_distribution", "location_distribution"
+            "industry_distribution", "company_size_distribution", "location_distribution",
+            "reply_class_distribution", "priority_histogram", "industry_by_reply_class"
         ],
         template=prompt_template
     )
@@ -147,17 +378,28 @@ def generate_campaign_report(csv_file_path):
     # Create chain using LCEL: prompt | model | parser
     chain = prompt | model | parser
     
-    # Generate report by invoking the chain
-    report = chain.invoke(metrics)
+    # Generate report by invoking the chain through the shared Gemini scheduler,
+    # unless the stored report was written from (nearly) the same metrics
+    inputs = prompt_inputs(metrics, prompt.input_variables)
+    report = await _cached_section('report', prompt_template, inputs, csv_file_path, stats, lambda: submit(
+        GEMINI, lambda: chain.ainvoke(inputs), tokens=estimate_tokens(prompt_template) + estimate_tokens(inputs)))
+    print_section_stats(stats)
+    print_scheduler_stats(GEMINI)
     
     return report
 
+
+def generate_campaign_report(csv_file_path, mode=None):
+    """Generate comprehensive campaign report - sync wrapper for backward compatibility"""
+    return asyncio.run(generate_campaign_report_async(csv_file_path, mode))
+
 # Example usage
 if __name__ == "__main__":
-    # Replace with your actual file path
-    CSV_FILE_PATH = "output/emails_with_replies.csv"
+    from storage import require_table
     
     try:
+        # The analyzed campaign table (final.arrow by default; any storage format works)
+        CSV_FILE_PATH = require_table("output", "final")
         print("🔄 Analyzing campaign data...")
         report = generate_campaign_report(CSV_FILE_PATH)
         
@@ -175,5 +417,5 @@ if __name__ == "__main__":
         print(f"❌ Error generating report: {str(e)}")
         print("\nPlease ensure:")
         print("1. Your .env file contains GOOGLE_API_KEY")
-        print("2. The CSV file path is correct")
+        print("2. output/ holds the final table from response analysis")
         print("3. You have installed required packages:")
\ No newline at end of file
@@ -0,0 +1,377 @@
+"""
+Pipeline Tracing
+Spans for every stage and every LLM / SMTP call, plus quiet progress output
+
+A span records a name, start/end time, status and attributes such as
+queue_wait_ms, retries, tokens and payload_bytes. Spans nest: an llm.call span
+opened inside a stage span records the stage it belongs to. Finished spans go
+to the configured sinks:
+- jsonl        one JSON object per span (TRACE_JSONL_PATH)
+- prometheus   counters and duration histograms in the textfile-collector
+               format (TRACE_PROM_PATH), rewritten on every flush
+- otel         live OpenTelemetry spans on the globally configured
+               TracerProvider (needs opentelemetry-api; exporter set up by
+               the user, e.g. opentelemetry-instrument with OTLP)
+With no sinks configured, span() returns a shared no-op span.
+
+PIPELINE_QUIET=1 (or main_workflow.py --quiet) replaces the per-row prints of
+every stage with one progress line every PROGRESS_INTERVAL seconds.
+
+Configuration (environment variables):
+- TRACE_SINKS          comma-separated sinks: jsonl, prometheus, otel (default: none)
+- TRACE_JSONL_PATH     default: output/trace.jsonl
+- TRACE_PROM_PATH      default: output/pipeline.prom
+- PIPELINE_QUIET       1 to print progress lines instead of per-row output
+- PROGRESS_INTERVAL    seconds between progress lines (default: 5)
+"""
+
+import os
+import json
+import time
+import atexit
+import itertools
+import functools
+import threading
+import contextvars
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_JSONL_PATH = os.path.join(BASE_DIR, 'output', 'trace.jsonl')
+DEFAULT_PROM_PATH = os.path.join(BASE_DIR, 'output', 'pipeline.prom')
+
+QUIET = os.getenv('PIPELINE_QUIET', '0').lower() in ('1', 'true', 'yes', 'on')
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '5'))
+
+# Duration histogram buckets (seconds) for the Prometheus sink
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Attributes used as Prometheus labels; everything numeric else becomes a counter
+LABEL_ATTRIBUTES = ('stage', 'provider', 'backend')
+
+_current = contextvars.ContextVar('current_span', default=None)
+_ids = itertools.count(1)
+
+
+class Span:
+    """One timed operation; use as a context manager"""
+
+    __slots__ = ('name', 'attributes', 'span_id', 'parent_id', 'start', 'end', 'status', 'error',
+                 '_token', '_parent', 'otel')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_ids)
+        self.parent_id = None
+        self.start = None
+        self.end = None
+        self.status = 'ok'
+        self.error = None
+        self.otel = None
+
+    def set(self, **attributes):
+        """Add or overwrite attributes"""
+        self.attributes.update(attributes)
+        return self
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    def __enter__(self):
+        parent = _current.get()
+        self._parent = parent
+        if parent is not None:
+            self.parent_id = parent.span_id
+            if 'stage' in parent.attributes:
+                self.attributes.setdefault('stage', parent.attributes['stage'])
+        self.start = time.time()
+        self._token = _current.set(self)
+        for sink in _sinks:
+            sink.start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time()
+        if exc is not None:
+            self.status = 'error'
+            self.error = f"{exc_type.__name__}: {exc}"[:300]
+        _current.reset(self._token)
+        for sink in _sinks:
+            sink.finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name, 'span_id': self.span_id, 'parent_id': self.parent_id,
+            'start': round(self.start, 6), 'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status, 'error': self.error, **self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned by span() when tracing is off; costs one attribute lookup per call"""
+
+    def set(self, **attributes):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlSink:
+    """Buffered JSON-lines file, one object per finished span"""
+
+    def __init__(self, path=None, buffer_size=256):
+        self.path = path or os.getenv('TRACE_JSONL_PATH', DEFAULT_JSONL_PATH)
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def start(self, span):
+        pass
+
+    def finish(self, span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) < self.buffer_size:
+                return
+            lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+    def _write(self, lines):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if lines:
+            self._write(lines)
+
+
+class PrometheusSink:
+    """Aggregated span counters and histograms in the node_exporter textfile format"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('TRACE_PROM_PATH', DEFAULT_PROM_PATH)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def start(self, span):
+        pass
+
+    def finish(self, span):
+        labels = (('span', span.name),) + tuple(
+            (name, str(span.attributes[name])) for name in LABEL_ATTRIBUTES if name in span.attributes
+        )
+        duration = span.duration
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    'count': 0, 'errors': 0, 'sum': 0.0, 'buckets': [0] * len(DURATION_BUCKETS), 'totals': {},
+                }
+            series['count'] += 1
+            series['sum'] += duration
+            if span.status != 'ok':
+                series['errors'] += 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    series['buckets'][i] += 1
+            for name, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and name not in LABEL_ATTRIBUTES:
+                    series['totals'][name] = series['totals'].get(name, 0) + value
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self):
+        with self._lock:
+            series = {labels: dict(s, buckets=list(s['buckets']), totals=dict(s['totals']))
+                      for labels, s in self._series.items()}
+        lines = [
+            '# HELP pipeline_span_duration_seconds Duration of pipeline stages and LLM/SMTP calls',
+            '# TYPE pipeline_span_duration_seconds histogram',
+        ]
+        for labels, s in series.items():
+            for bound, count in zip(DURATION_BUCKETS, s['buckets']):
+                lines.append(f"pipeline_span_duration_seconds_bucket{self._labels(labels, [('le', bound)])} {count}")
+            lines.append(f"pipeline_span_duration_seconds_bucket{self._labels(labels, [('le', '+Inf')])} {s['count']}")
+            lines.append(f"pipeline_span_duration_seconds_sum{self._labels(labels)} {s['sum']:.6f}")
+            lines.append(f"pipeline_span_duration_seconds_count{self._labels(labels)} {s['count']}")
+        lines.append('# TYPE pipeline_span_errors_total counter')
+        for labels, s in series.items():
+            lines.append(f"pipeline_span_errors_total{self._labels(labels)} {s['errors']}")
+        lines.append('# TYPE pipeline_span_attribute_total counter')
+        for labels, s in series.items():
+            for name, total in sorted(s['totals'].items()):
+                lines.append(f"pipeline_span_attribute_total{self._labels(labels, [('attribute', name)])} {total}")
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        if not self._series:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Write then rename so the collector never reads a half-written file
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+
+class OtelSink:
+    """Mirrors spans onto OpenTelemetry spans (exporter configured outside this module)"""
+
+    def __init__(self):
+        from opentelemetry import trace
+        self._trace = trace
+        self._tracer = trace.get_tracer('sales_campaign_pipeline')
+
+    def start(self, span):
+        parent = span._parent.otel if span._parent is not None else None
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        span.otel = self._tracer.start_span(span.name, context=context,
+                                            start_time=int(span.start * 1e9))
+
+    def finish(self, span):
+        otel = span.otel
+        if otel is None:
+            return
+        for name, value in span.attributes.items():
+            if value is not None:
+                otel.set_attribute(name, value if isinstance(value, (bool, int, float, str)) else str(value))
+        if span.status != 'ok':
+            otel.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel.end(end_time=int(span.end * 1e9))
+
+    def flush(self):
+        pass
+
+
+SINKS = {'jsonl': JsonlSink, 'prometheus': PrometheusSink, 'otel': OtelSink}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _configure_sinks(names):
+    sinks = []
+    for name in [n.strip().lower() for n in names.split(',') if n.strip()]:
+        if name not in SINKS:
+            print(f"⚠️  Unknown trace sink '{name}' (expected one of {', '.join(SINKS)})")
+            continue
+        try:
+            sinks.append(SINKS[name]())
+        except ImportError:
+            print(f"⚠️  Trace sink '{name}' needs opentelemetry-api; skipping it")
+    return sinks
+
+
+_sinks = _configure_sinks(os.getenv('TRACE_SINKS', ''))
+
+
+def enabled():
+    return bool(_sinks)
+
+
+def span(name, **attributes):
+    """Context manager timing one operation; a shared no-op when tracing is off"""
+    if not _sinks:
+        return NOOP_SPAN
+    return Span(name, attributes)
+
+
+def traced_stage(stage):
+    """Decorator running an async stage function inside a 'stage' span"""
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with span('stage', stage=stage):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def is_quiet():
+    return QUIET
+
+
+def configure(sinks=None, quiet=None):
+    """Override TRACE_SINKS / PIPELINE_QUIET at run time (e.g. from CLI flags)"""
+    global QUIET
+    if sinks is not None:
+        flush_traces()
+        _sinks[:] = _configure_sinks(sinks)
+    if quiet is not None:
+        QUIET = quiet
+
+
+def flush_traces():
+    """Write buffered spans and the Prometheus textfile"""
+    for sink in _sinks:
+        sink.flush()
+
+
+atexit.register(flush_traces)
+
+
+class Progress:
+    """
+    Per-row output for one stage. Normally prints each row's message; in quiet
+    mode prints one line every PROGRESS_INTERVAL seconds instead. total may be
+    None when rows arrive from a queue.
+    """
+
+    def __init__(self, stage, total, interval=None):
+        self.stage = stage
+        self.total = total
+        self.interval = PROGRESS_INTERVAL if interval is None else interval
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last_print = self.started
+
+    def advance(self, message=None, failed=False):
+        """
+        Count one finished row. message (a string, or a function building one so
+        quiet runs skip the formatting) is printed only outside quiet mode.
+        """
+        self.done += 1
+        if failed:
+            self.failed += 1
+        if not QUIET:
+            if message is not None:
+                print(message() if callable(message) else message)
+            return
+        now = time.monotonic()
+        if now - self._last_print >= self.interval:
+            self._last_print = now
+            self._print_line(now)
+
+    def _print_line(self, now):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        percent = f" ({self.done / self.total * 100:.0f}%)" if self.total else ''
+        eta = f" | ETA {(self.total - self.done) / rate:.0f}s" if rate > 0 and self.total else ''
+        total = f"/{self.total}" if self.total is not None else ''
+        print(f"⏳ {self.stage}: {self.done}{total}{percent} | {rate:.1f} rows/s "
+              f"| {self.failed} failed{eta}")
+
+    def finish(self):
+        """Final progress line (quiet mode only)"""
+        if QUIET and self.done:
+            self._print_line(time.monotonic())
@@ -0,0 +1,46 @@
+import pandas as pd
+
+from campaign_metrics import CampaignAggregate, campaign_metrics
+
+CAMPAIGN = pd.DataFrame({
+    'email_sent': [True, True, True, False, True, True],
+    'send_status': ['Success', 'Success', 'Failed', None, 'Success', 'Success'],
+    'reply': ['yes', 'no', None, None, 'yes', 'maybe'],
+    'reply_class': ['INTERESTED', 'NOT_INTERESTED', 'NO_REPLY', 'NO_REPLY', 'INTERESTED', 'UNCLEAR'],
+    'industry': ['Software', 'Retail', 'Software', 'Retail', 'Software', 'Health'],
+    'company_size': ['50-100', '500+', '50-100', '10-50', '500+', '10-50'],
+    'priority_score': [85, 40, 72, 10, 100, 55],
+    'location': ['Dhaka', 'Dhaka', 'Chittagong', 'Sylhet', 'Dhaka', 'Chittagong'],
+})
+
+
+def test_merged_partials_equal_one_pass():
+    whole = CampaignAggregate().add(CAMPAIGN).to_metrics()
+    merged = CampaignAggregate().add(CAMPAIGN.iloc[:2]).merge(
+        CampaignAggregate().add(CAMPAIGN.iloc[2:5]).merge(CampaignAggregate().add(CAMPAIGN.iloc[5:])))
+    assert merged.to_metrics() == whole
+
+
+def test_metrics_values():
+    metrics = CampaignAggregate().add(CAMPAIGN).to_metrics()
+    assert metrics['emails_sent'] == 5
+    assert metrics['emails_successful'] == 4
+    assert (metrics['replies_received'], metrics['positive_replies'], metrics['neutral_replies']) == (4, 2, 1)
+    assert metrics['high_priority_leads'] == 3
+    assert metrics['priority_histogram']['90-100'] == 1
+    assert metrics['reply_class_distribution'] == {'INTERESTED': 2, 'NO_REPLY': 2, 'NOT_INTERESTED': 1,
+                                                   'UNCLEAR': 1}
+    assert metrics['industry_by_reply_class']['Software'] == {'INTERESTED': 2, 'NO_REPLY': 1}
+
+
+def test_table_without_reply_class_has_empty_breakdowns():
+    metrics = CampaignAggregate().add(CAMPAIGN.drop(columns='reply_class')).to_metrics()
+    assert metrics['reply_class_distribution'] == {}
+    assert metrics['industry_by_reply_class'] == {}
+
+
+def test_chunked_table_matches_in_memory(tmp_path):
+    path = tmp_path / 'final.csv'
+    CAMPAIGN.to_csv(path, index=False)
+    assert campaign_metrics(str(path), chunk_size=2) == CampaignAggregate().add(
+        pd.read_csv(path, dtype={'company_size': str})).to_metrics()
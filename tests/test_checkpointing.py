@@ -0,0 +1,50 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+import llm_cache
+import lead_analysis
+import personalized_email
+from run_state import RunState
+
+LEADS = pd.DataFrame({
+    'name': ['Rahim Uddin', 'Ayesha Khan'], 'email': ['rahim@techbangla.com', 'ayesha@finedge.com'],
+    'company': ['TechBangla', 'FinEdge'], 'industry': ['Software', 'Finance'], 'job_title': ['CTO', 'Analyst'],
+    'company_size': ['50-100', '500+'], 'location': ['Dhaka', 'Dhaka'], 'last_contact': ['', ''],
+    'notes': ['Asked for a demo', ''],
+})
+
+
+class FailingLLM:
+    """Model client whose every call fails, so each stage falls back"""
+    repo_id = 'test/failing-llm'
+    temperature = 0.7
+
+    async def ainvoke(self, messages):
+        raise RuntimeError("model unavailable")
+
+
+@pytest.fixture
+def failing_model(monkeypatch, tmp_path):
+    monkeypatch.setenv('PROMPT_METRICS_PATH', str(tmp_path / 'prompt_metrics.json'))
+    monkeypatch.setattr(llm_cache, '_cache', llm_cache._DisabledCache())
+    monkeypatch.setattr(lead_analysis, 'get_client', lambda name: FailingLLM())
+    monkeypatch.setattr(personalized_email, 'get_client', lambda name: FailingLLM())
+
+
+def test_fallback_results_are_not_checkpointed(tmp_path, failing_model):
+    leads = tmp_path / 'leads.csv'
+    LEADS.to_csv(leads, index=False)
+    analyzed, emails = str(tmp_path / 'analyzed_leads.csv'), str(tmp_path / 'emails_generated.csv')
+    run_state = RunState(path=str(tmp_path / 'run_state.sqlite'))
+
+    df = asyncio.run(lead_analysis.process_leads_async(str(leads), scoring='llm', output_file=analyzed,
+                                                       run_state=run_state, dedup=False))
+    assert (df['priority_score'] == 50).all()
+    assert run_state.completed('lead_analysis') == {}
+
+    df = asyncio.run(personalized_email.generate_all_emails_async(analyzed, emails, run_state=run_state))
+    assert (df['email_tone'] == 'Generic fallback').all()
+    assert run_state.completed('email_generation') == {}
+    run_state.close()
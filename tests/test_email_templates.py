@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pytest
+
+import email_templates
+import llm_cache
+from email_templates import cluster_key, generate_template_email, normalize_persona, template_stats, use_template
+
+TEMPLATE = {'subject': 'Ideas for {{company}}', 'body': 'Hi {name},\n\nAs {job_title} at {company}... ({contact_status})',
+            'tone_used': 'Educational', 'key_personalization': 'Persona and industry'}
+
+
+class TemplateLLM:
+    repo_id = 'test/template-llm'
+    temperature = 0.7
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return json.dumps(TEMPLATE)
+
+
+@pytest.fixture
+def template_llm(monkeypatch, tmp_path):
+    monkeypatch.setenv('PROMPT_METRICS_PATH', str(tmp_path / 'prompt_metrics.json'))
+    monkeypatch.setattr(llm_cache, '_cache', llm_cache._DisabledCache())
+    llm = TemplateLLM()
+    monkeypatch.setattr(email_templates, 'get_client', lambda name: llm)
+    email_templates.reset_templates()
+    yield llm
+    email_templates.reset_templates()
+
+
+def test_only_low_priority_leads_use_templates():
+    assert not use_template({'priority_score': 30}, mode='personalized')
+    assert use_template({'priority_score': 69}, mode='tiered', min_score=70)
+    assert not use_template({'priority_score': 70}, mode='tiered', min_score=70)
+    assert use_template({'priority_score': 'n/a'}, mode='tiered', min_score=70)
+
+
+@pytest.mark.parametrize('persona, expected', [
+    ('Enterprise Technology Decision Maker', 'Enterprise Decision Maker'),
+    ('enterprise  software decision-maker', 'Enterprise Decision Maker'),
+    ('Growth-Stage Startup Founder', 'SMB Founder / Owner'),
+    ('Mid-Market Operations Leader', 'Mid-Market Leader'),
+    ('SMB Software Practitioner', 'SMB Professional'),
+    ('', 'Business Professional'),
+    (None, 'Business Professional'),
+])
+def test_personas_map_onto_the_fixed_set(persona, expected):
+    assert normalize_persona(persona) == expected
+
+
+def test_persona_variants_share_a_cluster():
+    a = {'buyer_persona': 'Enterprise Technology Decision Maker', 'industry': 'Software'}
+    b = {'buyer_persona': 'enterprise software decision-maker', 'industry': ' Software '}
+    c = {'buyer_persona': 'Mid-Market Operations Leader', 'ai_filled_industry': 'Software'}
+    assert cluster_key(a) == cluster_key(b) == ('Enterprise Decision Maker', 'Software')
+    assert cluster_key(c) == ('Mid-Market Leader', 'Software')
+
+
+def test_blank_industry_from_csv_is_treated_as_missing():
+    nan = float('nan')
+    assert cluster_key({'buyer_persona': 'SMB Business Owner', 'industry': nan,
+                        'ai_filled_industry': 'Retail'}) == ('SMB Founder / Owner', 'Retail')
+    assert cluster_key({'buyer_persona': nan, 'industry': nan, 'ai_filled_industry': nan}) == \
+        ('Business Professional', 'Business')
+    assert cluster_key({'buyer_persona': 'SMB Business Owner', 'industry': '  '})[1] == 'Business'
+
+
+def test_one_template_call_per_cluster(template_llm):
+    leads = [
+        {'name': 'Rahim', 'company': 'TechBangla', 'job_title': 'CTO', 'industry': 'Software',
+         'buyer_persona': 'Enterprise Technology Decision Maker'},
+        {'name': 'Ayesha', 'company': 'FinEdge', 'job_title': 'CIO', 'industry': 'Software',
+         'buyer_persona': 'enterprise software decision-maker'},
+        {'name': 'Tanvir', 'company': 'GreenGrid', 'job_title': '', 'industry': 'Energy',
+         'buyer_persona': 'SMB Business Owner'},
+    ]
+
+    async def generate():
+        return await asyncio.gather(*(generate_template_email(lead, 'Never contacted') for lead in leads))
+
+    emails = asyncio.run(generate())
+
+    assert template_llm.calls == 2
+    assert emails[0]['subject'] == 'Ideas for TechBangla'
+    assert emails[1]['body'] == 'Hi Ayesha,\n\nAs CIO at FinEdge... (Never contacted)'
+    assert emails[2]['body'].startswith('Hi Tanvir,\n\nAs leader at GreenGrid')
+    assert emails[2]['key_personalization'].startswith('Template:')
+    stats = template_stats()
+    assert (stats['templated'], stats['clusters'], stats['templates_generated']) == (3, 2, 2)
+
+
+def test_cached_personalized_emails_are_not_counted_as_llm_calls(template_llm, monkeypatch, tmp_path):
+    import personalized_email
+    monkeypatch.setattr(llm_cache, '_cache', llm_cache.LLMCache(path=str(tmp_path / 'cache.sqlite')))
+    monkeypatch.setattr(personalized_email, 'get_client', lambda name: template_llm)
+    lead = {'name': 'Rahim', 'company': 'TechBangla', 'job_title': 'CTO', 'industry': 'Software',
+            'priority_score': 90, 'buyer_persona': 'Enterprise Technology Decision Maker'}
+
+    for _ in range(2):
+        asyncio.run(personalized_email.generate_email(lead))
+
+    stats = template_stats()
+    assert template_llm.calls == 1
+    assert (stats['personalized'], stats['personalized_cache_hits'], stats['llm_calls']) == (2, 1, 1)
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import http_pool
+from http_pool import PooledTransport
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+
+def test_clients_sharing_the_transport_reuse_one_connection(server_url):
+    pool = PooledTransport(httpx, max_connections=4)
+    for _ in range(2):
+        # Each SDK-style client is closed after use; the pool must survive it
+        with httpx.Client(transport=pool) as client:
+            assert client.get(server_url).text == 'ok'
+            assert client.get(server_url).text == 'ok'
+
+    stats = pool.stats()
+    assert (stats['requests'], stats['connections_opened'], stats['reused_connections']) == (4, 1, 3)
+    assert (stats['max_connections'], stats['open_connections']) == (4, 1)
+    pool.shutdown()
+
+
+def test_async_clients_share_the_pool_within_an_event_loop(server_url):
+    pool = PooledTransport(httpx, max_connections=2)
+
+    async def run():
+        async with httpx.AsyncClient(transport=pool) as first, httpx.AsyncClient(transport=pool) as second:
+            for client in (first, second, first):
+                assert (await client.get(server_url)).text == 'ok'
+
+    asyncio.run(run())
+    stats = pool.stats()
+    assert (stats['requests'], stats['connections_opened'], stats['reused_connections']) == (3, 1, 2)
+
+
+def test_pool_size_defaults_to_the_provider_in_flight_cap(monkeypatch):
+    monkeypatch.delenv('HF_HTTP_POOL_SIZE', raising=False)
+    monkeypatch.setenv('HF_MAX_IN_FLIGHT', '6')
+    assert http_pool.pool_size('huggingface') == 6
+    monkeypatch.setenv('HF_HTTP_POOL_SIZE', '16')
+    assert http_pool.pool_size('huggingface') == 16
+
+    http_pool.close_pools()
+    try:
+        assert http_pool.get_pool('huggingface', httpx) is http_pool.get_pool('huggingface', httpx)
+        assert http_pool.pool_stats()['huggingface']['max_connections'] == 16
+    finally:
+        http_pool.close_pools()
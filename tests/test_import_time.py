@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from bench_import_time import IMPORT_BUDGETS_MS, check_module  # noqa: E402
+
+# Slow CI machines can stretch the time budgets; forbidden imports are never relaxed
+SCALE = float(os.getenv('IMPORT_BUDGET_SCALE', '1.0'))
+
+
+@pytest.mark.parametrize('module', list(IMPORT_BUDGETS_MS))
+def test_module_import_stays_within_budget(module):
+    result = check_module(module, repeat=2, scale=SCALE)
+    assert result['forbidden_loaded'] == [], f"import {module} eagerly loads {result['forbidden_loaded']}"
+    assert result['import_ms'] <= result['budget_ms'], (
+        f"import {module} took {result['import_ms']} ms (budget {result['budget_ms']} ms)")
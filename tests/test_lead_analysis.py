@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+import llm_cache
+import lead_analysis
+from lead_scoring import score_leads_vectorized
+
+LEADS = pd.DataFrame({
+    'name': ['Rahim Uddin', 'Ayesha Khan'], 'email': ['rahim@techbangla.com', 'ayesha@finedge.com'],
+    'company': ['TechBangla', 'FinEdge'], 'industry': ['Software', ''], 'job_title': ['CTO', 'Analyst'],
+    'company_size': ['50-100', '500+'], 'location': ['Dhaka', 'Dhaka'], 'last_contact': ['', ''],
+    'notes': ['Asked for a demo', ''],
+})
+
+
+class PersonaLLM:
+    """Answers only the fields the prompt asks for and records every prompt"""
+    repo_id = 'test/persona-llm'
+    temperature = 0.7
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        text = '\n'.join(message.content for message in messages)
+        self.prompts.append(text)
+        answer = {'buyer_persona': 'Mid-Market Technology Leader'}
+        if '"filled_industry"' in text:
+            answer['filled_industry'] = 'Finance'
+        if '"filled_notes"' in text:
+            answer['filled_notes'] = 'Needs reporting automation'
+        return json.dumps(answer)
+
+
+@pytest.fixture
+def persona_model(monkeypatch, tmp_path):
+    monkeypatch.setenv('PROMPT_METRICS_PATH', str(tmp_path / 'prompt_metrics.json'))
+    monkeypatch.setattr(llm_cache, '_cache', llm_cache._DisabledCache())
+    llm = PersonaLLM()
+    monkeypatch.setattr(lead_analysis, 'get_client', lambda name: llm)
+    return llm
+
+
+@pytest.mark.parametrize('mode', ['full', 'compact'])
+def test_hybrid_prompt_asks_only_for_persona_and_missing_fields(persona_model, monkeypatch, mode):
+    monkeypatch.setenv('PROMPT_MODE', mode)
+    row = LEADS.iloc[1].to_dict()
+
+    result = asyncio.run(lead_analysis.analyze_lead(row, scoring='hybrid'))
+
+    prompt = persona_model.prompts[0]
+    assert 'priority_score' not in prompt and 'PRIORITY SCORING' not in prompt
+    assert '"filled_industry"' in prompt and '"filled_notes"' in prompt
+    assert '"filled_job_title"' not in prompt and '"filled_company_size"' not in prompt
+    assert result == {'buyer_persona': 'Mid-Market Technology Leader', 'filled_industry': 'Finance',
+                      'filled_notes': 'Needs reporting automation'}
+
+
+def test_hybrid_mode_keeps_rubric_scores_and_present_fields(persona_model, tmp_path):
+    leads = tmp_path / 'leads.csv'
+    LEADS.to_csv(leads, index=False)
+
+    df = asyncio.run(lead_analysis.process_leads_async(str(leads), scoring='hybrid', dedup=False,
+                                                       output_file=str(tmp_path / 'analyzed_leads.csv')))
+
+    df = df.set_index('name')
+    expected = score_leads_vectorized(LEADS.fillna('')).set_axis(LEADS['name'])
+    assert df['priority_score'].to_dict() == expected.to_dict()
+    assert df.loc['Rahim Uddin', 'ai_filled_industry'] == 'Software'
+    assert df.loc['Ayesha Khan', 'ai_filled_industry'] == 'Finance'
+    assert df.loc['Ayesha Khan', 'ai_filled_job_title'] == 'Analyst'
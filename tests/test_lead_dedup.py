@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from lead_dedup import (DedupIndex, NUM_PERM, band_keys, dedupe_leads, minhash_signatures, normalize_emails,
+                        normalize_names)
+
+
+def jaccard(a, b, size=3):
+    grams = [{key[i:i + size] for i in range(len(key) - size + 1)} for key in (a, b)]
+    return len(grams[0] & grams[1]) / len(grams[0] | grams[1])
+
+
+def test_normalization():
+    assert normalize_emails(['Rahim+crm@TechBangla.com ', 'not an email', None]).tolist() == \
+        ['rahim@techbangla.com', '', '']
+    assert normalize_names(['Rahim Uddin', 'rahim  uddin.', ''], ['TechBangla Ltd.', 'Techbangla', 'X']).tolist() == \
+        ['rahimuddin|techbangla', 'rahimuddin|techbangla', '']
+
+
+def test_signatures_estimate_jaccard_similarity():
+    keys = ['ayeshakhan|finedgesolutions', 'ayeshakhan|finedgesolution', 'tanvirahmed|greengrid', '']
+    signatures = minhash_signatures(keys)
+    assert signatures.shape == (4, NUM_PERM)
+    assert (signatures[3] == np.iinfo(np.uint32).max).all()
+    np.testing.assert_array_equal(signatures, minhash_signatures(keys, block_size=1))
+
+    close = np.mean(signatures[0] == signatures[1])
+    assert abs(close - jaccard(keys[0], keys[1])) < 0.25
+    assert np.mean(signatures[0] == signatures[2]) < 0.2
+    # Near-identical keys share at least one LSH bucket
+    buckets = band_keys(signatures)
+    assert (buckets[0] == buckets[1]).any()
+
+
+def test_dedupe_merges_exact_and_fuzzy_duplicates():
+    leads = pd.DataFrame({
+        'name': ['Rahim Uddin', 'Rahim Uddin', 'Ayesha Khan', 'Ayesha  Khan', 'Tanvir Ahmed'],
+        'email': ['rahim@techbangla.com', 'Rahim+events@techbangla.com', 'ayesha@finedge.com', '',
+                  'tanvir@greengrid.com'],
+        'company': ['TechBangla', 'TechBangla Ltd', 'FinEdge Solutions', 'FinEdge Solutions Ltd.', 'GreenGrid'],
+        'job_title': ['CTO', 'CTO', '', 'CFO', 'Engineer'],
+        'notes': ['Asked for a demo', 'Met at expo', '', 'Budget approved', ''],
+    })
+    merged, duplicates, index = dedupe_leads(leads)
+
+    assert merged['name'].tolist() == ['Rahim Uddin', 'Ayesha Khan', 'Tanvir Ahmed']
+    assert len(duplicates) == 2
+    stats = index.stats()
+    assert (stats['exact_matches'], stats['fuzzy_matches'], stats['clusters']) == (1, 1, 2)
+    ayesha = merged.iloc[1]
+    assert ayesha['job_title'] == 'CFO'
+    assert ayesha['notes'] == 'Budget approved'
+    assert merged.iloc[0]['notes'] == 'Asked for a demo; Met at expo'
+    assert merged['duplicate_count'].tolist() == [1, 1, 0]
+
+
+def test_index_is_incremental_across_chunks():
+    index = DedupIndex()
+    first = pd.DataFrame({'name': ['Nusrat Jahan'], 'email': ['nusrat@healthcarebd.com'], 'company': ['HealthCare BD']})
+    second = pd.DataFrame({'name': ['Nusrat Jahan', 'Farhan Hossain'], 'email': ['', 'farhan@dhakalogistics.com'],
+                           'company': ['Healthcare BD Ltd', 'Dhaka Logistics']})
+    dedupe_leads(first, index)
+    merged, duplicates, _ = dedupe_leads(second, index)
+
+    assert merged['name'].tolist() == ['Farhan Hossain']
+    assert duplicates['name'].tolist() == ['Nusrat Jahan']
@@ -0,0 +1,54 @@
+import pandas as pd
+
+from lead_scoring import (engagement_points, recency_points, seniority_points, company_size_points,
+                          score_leads_vectorized)
+
+
+def test_negated_signals_earn_no_engagement_points():
+    notes = pd.Series([
+        "Interested in a demo",
+        "not interested",
+        "We are not currently interested",
+        "Wouldn't be ready to buy before Q3",
+    ])
+    assert engagement_points(notes).tolist() == [20, 0, 0, 0]
+
+
+def test_negation_in_another_clause_does_not_cancel_a_signal():
+    notes = pd.Series(["No rush, but keen to see pricing", "not interested in pricing, but wants a demo"])
+    assert engagement_points(notes).tolist() == [20, 20]
+
+
+def test_recency_buckets_by_days_since_last_contact():
+    last_contact = pd.Series(['2024-06-28', '2024-06-10', '2024-04-15', '2023-01-01', '', None, 'soon'])
+    assert recency_points(last_contact, as_of='2024-07-01').tolist() == [25, 15, 10, 5, 0, 0, 0]
+
+
+def test_seniority_takes_the_highest_matching_class():
+    titles = pd.Series(['CEO', 'Co-Founder', 'VP of Sales', 'Engineering Manager', 'Data Analyst',
+                        'Marketing Intern', 'Not provided', None])
+    assert seniority_points(titles).tolist() == [25, 25, 20, 15, 10, 5, 0, 0]
+
+
+def test_company_size_uses_the_range_lower_bound_then_size_words():
+    sizes = pd.Series(['500+', '1,000-5,000', '200-500', '100-200', '50-100', '10-50', '1-10',
+                       'Enterprise', 'small business', 'unknown'])
+    assert company_size_points(sizes).tolist() == [20, 20, 15, 12, 10, 7, 5, 20, 7, 0]
+
+
+def test_vectorized_score_sums_components_within_0_to_100():
+    leads = pd.DataFrame({
+        'notes': ['Interested, requested demo and budget approved', 'Needs follow-up', None],
+        'last_contact': ['2024-06-30', '2024-05-01', None],
+        'job_title': ['CEO', 'Manager', None],
+        'company_size': ['1000+', '10-50', None],
+    }, index=[10, 11, 12])
+
+    breakdown = score_leads_vectorized(leads, as_of='2024-07-01', breakdown=True)
+    assert breakdown.loc[10].tolist() == [30, 25, 25, 20, 100]
+    assert breakdown.loc[11].tolist() == [8, 10, 15, 7, 40]
+    assert breakdown.loc[12].tolist() == [0, 0, 0, 0, 0]
+
+    scores = score_leads_vectorized(leads, as_of='2024-07-01')
+    assert scores.index.tolist() == [10, 11, 12]
+    assert scores.between(0, 100).all() and scores.tolist() == [100, 40, 0]
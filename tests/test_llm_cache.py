@@ -0,0 +1,96 @@
+import asyncio
+import json
+import sqlite3
+import threading
+
+import llm_cache
+import lead_analysis
+from llm_cache import LLMCache, store_result
+
+RESULT = {'priority_score': 82, 'buyer_persona': 'Mid-Market Technology Leader', 'filled_industry': 'Software',
+          'filled_job_title': 'CTO', 'filled_company_size': '50-100', 'filled_notes': 'Asked for a demo'}
+
+
+def test_writer_waits_for_another_connections_lock(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = LLMCache(path=path, busy_timeout=5)
+    other = sqlite3.connect(path, check_same_thread=False)
+    other.execute('BEGIN IMMEDIATE')
+    release = threading.Timer(0.3, other.commit)
+    release.start()
+
+    cache.set('key', RESULT)
+    release.join()
+    assert LLMCache(path=path).get('key') == RESULT
+
+
+def test_locked_write_fails_fast_without_timeout_but_is_only_logged(tmp_path, capsys):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = LLMCache(path=path, busy_timeout=0)
+    other = sqlite3.connect(path)
+    other.execute('BEGIN IMMEDIATE')
+
+    store_result(cache, 'key', RESULT)
+    assert 'cache write failed' in capsys.readouterr().out
+    other.rollback()
+    # The failed write left no transaction open
+    cache.set('key', RESULT)
+    assert cache.get('key') == RESULT
+
+
+class BrokenCache(llm_cache._DisabledCache):
+    def set(self, key, value):
+        raise sqlite3.OperationalError("database is locked")
+
+
+class AnsweringLLM:
+    repo_id = 'test/answering-llm'
+    temperature = 0.7
+
+    async def ainvoke(self, messages):
+        return json.dumps(RESULT)
+
+
+def test_cache_error_keeps_the_paid_result(monkeypatch, tmp_path):
+    monkeypatch.setenv('PROMPT_METRICS_PATH', str(tmp_path / 'prompt_metrics.json'))
+    monkeypatch.setattr(llm_cache, '_cache', BrokenCache())
+    monkeypatch.setattr(lead_analysis, 'get_client', lambda name: AnsweringLLM())
+    row = {'name': 'Rahim Uddin', 'company': 'TechBangla', 'industry': 'Software', 'job_title': 'CTO',
+           'company_size': '50-100', 'location': 'Dhaka', 'notes': 'Asked for a demo', 'last_contact': ''}
+
+    assert asyncio.run(lead_analysis.analyze_lead(row)) == RESULT
+
+
+def test_writes_keep_a_running_total_instead_of_scanning(tmp_path):
+    cache = LLMCache(path=str(tmp_path / 'cache.sqlite'), max_bytes=10 ** 6)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    for i in range(200):
+        cache.set(f'key-{i}', RESULT)
+    cache.set('key-0', {'priority_score': 1})
+
+    assert not [sql for sql in statements if 'SUM(size)' in sql or 'created_at <' in sql]
+    assert cache._bytes == cache._total_bytes()
+
+
+def test_expiry_sweep_uses_the_created_at_index(tmp_path):
+    cache = LLMCache(path=str(tmp_path / 'cache.sqlite'))
+    plan = cache._conn.execute('EXPLAIN QUERY PLAN DELETE FROM llm_cache WHERE created_at < ?', (0,)).fetchall()
+    assert 'idx_llm_cache_created' in ' '.join(str(step[-1]) for step in plan)
+
+
+def test_over_budget_write_evicts_least_recently_used_down_to_target(tmp_path):
+    entry = len(json.dumps(RESULT, ensure_ascii=False))
+    cache = LLMCache(path=str(tmp_path / 'cache.sqlite'), max_bytes=entry * 10)
+    for i in range(10):
+        cache.set(f'key-{i}', RESULT)
+    cache.get('key-0')
+    assert cache.evictions == 0
+
+    cache.set('key-10', RESULT)
+    # 11 entries over a 10-entry budget: evict down to 9 (EVICT_TARGET), oldest access first
+    assert cache.evictions == 2
+    assert cache._bytes == cache._total_bytes() == entry * 9
+    assert cache.get('key-0') == RESULT and cache.get('key-10') == RESULT
+    assert cache.get('key-1') is None and cache.get('key-2') is None
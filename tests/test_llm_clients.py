@@ -0,0 +1,24 @@
+import pytest
+
+import llm_clients
+from llm_scheduler import HUGGINGFACE
+
+
+@pytest.fixture
+def fake_builders(monkeypatch):
+    monkeypatch.setitem(llm_clients.BUILDERS, HUGGINGFACE, lambda **params: object())
+    llm_clients.reset_clients()
+    yield
+    llm_clients.reset_clients()
+
+
+def test_stages_with_the_same_settings_share_a_client(fake_builders):
+    first = llm_clients.get_client('lead_analysis')
+    assert llm_clients.get_client('email_generation') is first
+    assert llm_clients.get_client('reply_classifier') is not first
+
+    stats = llm_clients.client_stats()
+    assert (stats['clients'], stats['handouts'], stats['repeat_handouts']) == (2, 3, 1)
+    assert sorted(client['handouts'] for client in stats['per_client']) == [1, 2]
+    # Fake clients never send HTTP requests, so no pool was created
+    assert stats['pools'] == {}
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+from llm_json import (JsonObjectScanner, JsonParseError, ainvoke_json, extract_json_object, parse_json,
+                      parse_stats, reset_parse_stats)
+from llm_scheduler import HUGGINGFACE
+
+SCHEMA = {'priority_score': int, 'buyer_persona': str}
+EMAIL_SCHEMA = {'subject': str, 'body': str}
+
+
+def test_strict_json_is_not_marked_repaired():
+    assert parse_json('{"priority_score": 80, "buyer_persona": "CTO"}', SCHEMA) == \
+        ({'priority_score': 80, 'buyer_persona': 'CTO'}, False)
+
+
+@pytest.mark.parametrize('text', [
+    'Sure! Here is the analysis:\n```json\n{"priority_score": 80, "buyer_persona": "CTO"}\n```\nHope it helps.',
+    '{"priority_score": 80, "buyer_persona": "CTO",}',
+    '{“priority_score”: 80, “buyer_persona”: “CTO”}',
+    '{"priority_score": 80, "buyer_persona": "CTO", "verified": True}',
+])
+def test_common_defects_are_repaired(text):
+    result, repaired = parse_json(text, SCHEMA)
+    assert repaired
+    assert (result['priority_score'], result['buyer_persona']) == (80, 'CTO')
+
+
+def test_repairs_leave_string_contents_alone():
+    text = ('{"priority_score": 80, "buyer_persona": "CTO", "verified": True,\n'
+            ' "notes": "Budget: None, thanks , } and ,] stay", "quote": "He said \u201cyes\u201d",}')
+    result, repaired = parse_json(text, SCHEMA)
+    assert repaired
+    assert result['verified'] is True
+    assert result['notes'] == 'Budget: None, thanks , } and ,] stay'
+    assert result['quote'] == 'He said \u201cyes\u201d'
+
+
+def test_values_are_coerced_to_the_schema_types():
+    text = '{"priority_score": "80/100", "buyer_persona": "CTO", "notes": "a {brace} in a string"}'
+    result, repaired = parse_json(text, SCHEMA)
+    assert not repaired
+    assert result == {'priority_score': 80, 'buyer_persona': 'CTO', 'notes': 'a {brace} in a string'}
+
+
+def test_truncated_object_is_closed_unless_disallowed():
+    text = '{"subject": "Hello", "body": "Dear Rahim,\nWe help teams like yours'
+    result, repaired = parse_json(text, EMAIL_SCHEMA)
+    assert repaired and result['body'] == 'Dear Rahim,\nWe help teams like yours'
+    with pytest.raises(JsonParseError, match='cut off'):
+        parse_json(text, EMAIL_SCHEMA, allow_truncated=False)
+
+
+@pytest.mark.parametrize('text, error', [
+    ('I cannot help with that.', 'no JSON object'),
+    ('{"priority_score": 80}', 'missing fields: buyer_persona'),
+    ('{"priority_score": "high", "buyer_persona": "CTO"}', 'field priority_score'),
+])
+def test_unusable_output_raises(text, error):
+    with pytest.raises(JsonParseError, match=error):
+        parse_json(text, SCHEMA)
+
+
+def test_scanner_finds_the_end_across_pieces():
+    scanner = JsonObjectScanner()
+    pieces = ['Here: {"subject": "Hi', ' {there}", "body": "x\\"}', '"} and some trailing prose']
+    assert [scanner.feed(piece) for piece in pieces] == [False, False, True]
+    assert json.loads(scanner.text[scanner.start:scanner.end]) == {'subject': 'Hi {there}', 'body': 'x"}'}
+    assert extract_json_object('no object here') == (None, False)
+
+
+class ScriptedLLM:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages)
+        return self.replies.pop(0)
+
+
+def test_model_is_re_asked_only_when_local_repair_fails():
+    reset_parse_stats()
+    llm = ScriptedLLM('{"priority_score": 80, "buyer_persona": "CTO",}')
+    assert asyncio.run(ainvoke_json('test_stage', HUGGINGFACE, llm, 'prompt', SCHEMA, tokens=10))['priority_score'] == 80
+    assert len(llm.prompts) == 1
+
+    llm = ScriptedLLM('No idea.', '{"priority_score": 55, "buyer_persona": "Analyst"}')
+    assert asyncio.run(ainvoke_json('test_stage', HUGGINGFACE, llm, 'prompt', SCHEMA, tokens=10))['priority_score'] == 55
+    assert 'could not be parsed' in llm.prompts[1]
+
+    stats = parse_stats()['test_stage']
+    assert (stats['responses'], stats['repaired'], stats['reasked'], stats['recovered'], stats['failed']) == \
+        (2, 1, 1, 1, 0)
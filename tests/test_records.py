@@ -0,0 +1,41 @@
+import pandas as pd
+
+from records import assign_columns, iter_records
+
+
+def leads():
+    return pd.DataFrame({'name': ['Rahim', 'Ayesha', 'Tanvir'], 'priority_score': [0, 0, 0],
+                         'buyer_persona': ['', '', '']}, index=[10, 20, 30])
+
+
+def test_iter_records_yields_labels_and_plain_dicts():
+    rows = list(iter_records(leads()))
+    assert [idx for idx, _ in rows] == [10, 20, 30]
+    assert rows[1][1] == {'name': 'Ayesha', 'priority_score': 0, 'buyer_persona': ''}
+    assert [idx for idx, _ in iter_records(leads(), [30, 10])] == [30, 10]
+
+
+def test_assign_columns_writes_only_the_given_rows_and_columns():
+    df = leads()
+    results = {30: {'priority_score': 90, 'buyer_persona': 'Founder', 'ignored': 1},
+               10: {'priority_score': 40, 'buyer_persona': 'Analyst', 'ignored': 2}}
+    assign_columns(df, results, ['priority_score', 'buyer_persona'])
+
+    assert df['priority_score'].tolist() == [40, 0, 90]
+    assert df['buyer_persona'].tolist() == ['Analyst', '', 'Founder']
+    assert 'ignored' not in df.columns
+
+
+def test_assign_columns_matches_per_cell_writes():
+    expected, df = leads(), leads()
+    results = {idx: {'priority_score': len(row['name']), 'buyer_persona': row['name'].upper()}
+               for idx, row in iter_records(df)}
+    for idx, columns in results.items():
+        for column, value in columns.items():
+            expected.at[idx, column] = value
+    pd.testing.assert_frame_equal(assign_columns(df, results, ['priority_score', 'buyer_persona']), expected)
+
+
+def test_assign_columns_without_results_leaves_the_frame_alone():
+    df = leads()
+    pd.testing.assert_frame_equal(assign_columns(df, {}, ['priority_score']), leads())
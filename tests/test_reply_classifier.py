@@ -0,0 +1,58 @@
+import pytest
+
+from reply_classifier import LocalReplyClassifier, apply_rules, has_negated_rule, measure_rule_precision
+
+NEGATED_INTERESTED = [
+    "We are not currently interested in this.",
+    "I'm not sure we'd be interested.",
+    "Honestly, we are not very interested.",
+    "We wouldn't be interested right now.",
+]
+
+
+@pytest.mark.parametrize("text", NEGATED_INTERESTED)
+def test_negated_interest_is_escalated(text):
+    assert has_negated_rule(text)
+    assert apply_rules(text) == (None, 0.0)
+    assert LocalReplyClassifier(threshold=0.0).classify([text]) == [None]
+
+
+@pytest.mark.parametrize("text", [
+    "Thank you for the note, but we are not interested at this time.",
+    "We're no longer interested.",
+])
+def test_explicit_decline_still_resolves_locally(text):
+    result, = LocalReplyClassifier().classify([text])
+    assert result['class'] == "NOT_INTERESTED"
+
+
+def test_negation_does_not_cross_clauses():
+    text = "No problem, we're interested - let's set up a call."
+    assert not has_negated_rule(text)
+    assert apply_rules(text)[0] == "INTERESTED"
+
+
+def test_interested_prior_is_below_threshold():
+    classifier = LocalReplyClassifier(threshold=0.85)
+    assert classifier.classify(["We'd love to schedule a call next week."]) == [None]
+
+
+def test_rule_confidence_comes_from_measured_precision():
+    texts = ["We'd love to schedule a call next week."] * 20
+    labels = ["INTERESTED"] * 20
+    texts += ["Could you send me more information on pricing?"] * 10
+    labels += ["NOT_INTERESTED"] * 10
+
+    precision = measure_rule_precision(texts, labels, min_support=10)
+    assert precision["INTERESTED"] == 1.0
+    assert precision["NEEDS_FOLLOW_UP"] == 0.0
+
+    classifier = LocalReplyClassifier(threshold=0.85)
+    classifier.rule_confidence = precision
+    interested, follow_up = classifier.classify(["Let's set up a demo.", "Please send over some additional details."])
+    assert interested['class'] == "INTERESTED" and interested['confidence'] == 1.0
+    assert follow_up is None
+
+
+def test_conflicting_rules_are_not_resolved():
+    assert apply_rules("Interested, but could you send me more information first?") == (None, 0.0)
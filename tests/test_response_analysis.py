@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+import llm_scheduler
+import response_analysis
+from llm_scheduler import HUGGINGFACE
+
+
+class AsyncOnlyChain:
+    """Chain without a sync invoke(): any call that bypasses the scheduler fails"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        return self.reply(inputs)
+
+
+@pytest.fixture
+def chains(monkeypatch):
+    single = AsyncOnlyChain(lambda inputs: {'class': 'interested', 'reason': 'Asked for a demo'})
+    # The batch reply only labels the first item, so the second is re-asked on its own
+    batch = AsyncOnlyChain(lambda inputs: [{'id': 4, 'class': 'NOT_INTERESTED', 'reason': 'No budget'}])
+    monkeypatch.setattr(response_analysis, '_chains', (single, batch))
+    return single, batch
+
+
+def submitted():
+    return llm_scheduler.get_scheduler(HUGGINGFACE).submitted
+
+
+def test_sync_classify_reply_goes_through_the_scheduler(chains):
+    before = submitted()
+    assert response_analysis.classify_reply('Yes please, send a demo') == \
+        {'class': 'INTERESTED', 'reason': 'Asked for a demo'}
+    assert response_analysis.classify_reply('  ') == {'class': 'NO_REPLY', 'reason': 'Empty content'}
+    assert submitted() - before == 1
+
+
+def test_sync_batch_and_its_fallbacks_go_through_the_scheduler(chains):
+    single, batch = chains
+    before = submitted()
+    results = response_analysis.classify_reply_batch([(4, 'No budget this year'), (7, 'Send a demo')])
+    assert results[4]['class'] == 'NOT_INTERESTED'
+    assert results[7]['class'] == 'INTERESTED'
+    assert (batch.calls, single.calls, submitted() - before) == (1, 1, 2)
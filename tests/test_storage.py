@@ -0,0 +1,21 @@
+import os
+
+import pandas as pd
+import pytest
+
+from storage import intermediate_path, read_table, require_table, write_table
+
+
+def test_require_table_finds_the_newest_format(tmp_path):
+    df = pd.DataFrame({'name': ['Rahim', 'Ayesha'], 'priority_score': [80, 40]})
+    df.to_csv(tmp_path / 'final.csv', index=False)
+    arrow = write_table(df, intermediate_path(str(tmp_path), 'final', 'arrow'))
+    os.utime(tmp_path / 'final.csv', (1, 1))
+
+    assert require_table(str(tmp_path), 'final') == arrow
+    pd.testing.assert_frame_equal(read_table(arrow), df)
+
+
+def test_require_table_reports_a_missing_table(tmp_path):
+    with pytest.raises(FileNotFoundError, match='final'):
+        require_table(str(tmp_path), 'final')
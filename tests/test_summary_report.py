@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import llm_cache
+from summary_report import UNAVAILABLE, SECTION_PLACEHOLDERS, map_reduce_report, prompt_inputs, report_inputs
+
+METRICS = {
+    'total_contacts': 3, 'emails_sent': 3, 'emails_successful': 3, 'success_rate': 100.0,
+    'replies_received': 2, 'response_rate': 66.67, 'positive_replies': 1, 'negative_replies': 1,
+    'neutral_replies': 0, 'positive_rate': 50.0, 'avg_priority_score': 61.0, 'high_priority_leads': 1,
+    'priority_histogram': {'60-69': 3},
+    'industry_distribution': {'Software': 2, 'Retail': 1},
+    'company_size_distribution': {'50-100': 3},
+    'location_distribution': {'Dhaka': 3},
+    'reply_class_distribution': {},
+    'industry_by_reply_class': {}, 'company_size_by_reply_class': {}, 'location_by_reply_class': {},
+}
+
+
+@pytest.fixture
+def prompts(monkeypatch, tmp_path):
+    """Fake report model that records every prompt it receives"""
+    monkeypatch.setattr(llm_cache, '_cache', llm_cache.LLMCache(path=str(tmp_path / 'cache.sqlite')))
+    received = []
+
+    def answer(prompt):
+        received.append(prompt.to_string())
+        return "## Section"
+
+    return received, RunnableLambda(answer)
+
+
+def test_empty_breakdowns_are_spelled_out():
+    inputs = prompt_inputs(METRICS, ['reply_class_distribution', 'industry_distribution'])
+    assert inputs == {'reply_class_distribution': UNAVAILABLE, 'industry_distribution': METRICS['industry_distribution']}
+
+
+def test_section_without_reply_classes_is_not_prompted(prompts):
+    received, model = prompts
+    stats = {'reused': 0, 'generated': 0, 'skipped': 0}
+    report = asyncio.run(map_reduce_report(model, report_inputs(METRICS), 'final.arrow', stats))
+
+    assert SECTION_PLACEHOLDERS['responses'] in report
+    assert stats == {'reused': 0, 'generated': 4, 'skipped': 1}
+    assert not any("Response Analysis\" section" in prompt for prompt in received)
+    assert not any(": {}" in prompt for prompt in received)
+    assert any(f"Reply Classes by Location: {UNAVAILABLE}" in prompt for prompt in received)
+
+
+def test_sections_are_regenerated_once_reply_classes_arrive(prompts):
+    received, model = prompts
+    stats = {'reused': 0, 'generated': 0, 'skipped': 0}
+    asyncio.run(map_reduce_report(model, report_inputs(METRICS), 'final.arrow', stats))
+
+    classified = dict(METRICS, reply_class_distribution={'INTERESTED': 1, 'NOT_INTERESTED': 1},
+                      company_size_by_reply_class={'50-100': {'INTERESTED': 1, 'NOT_INTERESTED': 1}})
+    stats = {'reused': 0, 'generated': 0, 'skipped': 0}
+    report = asyncio.run(map_reduce_report(model, report_inputs(classified), 'final.arrow', stats))
+
+    assert SECTION_PLACEHOLDERS['responses'] not in report
+    # overview is unchanged; responses, segmentation and both summaries are rewritten
+    assert stats == {'reused': 1, 'generated': 4, 'skipped': 0}
+
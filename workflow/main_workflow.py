@@ -9,6 +9,8 @@ import sys
 import os
 import time
 import asyncio
+import argparse
+import importlib
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,28 +19,29 @@ load_dotenv()
 # Add src directory to path to import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-# Ensure HF client compatibility shim runs before importing modules that
-# instantiate HuggingFaceEndpoint (it expects InferenceClient.post).
-try:
-    import hf_compat  # noqa: F401 - module run for side-effects
-except Exception:
-    # If the shim import fails, we'll continue and let runtime errors surface
-    pass
-
-# Import functions from src modules
-from lead_analysis import process_leads_async
-from personalized_email import generate_all_emails_async
-from sendMailHog import send_emails_async
-from mail_reply_agent import process_emails_with_types_async
-from summary_report import generate_campaign_report
-
-# Import response analysis components (avoid importing the module directly due to module-level execution)
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.llms import HuggingFaceEndpoint
-
-import pandas as pd
+from llm_scheduler import submit, estimate_tokens, print_scheduler_stats, HUGGINGFACE
+from tracing import traced_stage, Progress, is_quiet, configure as configure_tracing, flush_traces
+
+
+def _deferred(module_name, function_name):
+    """Async stage function whose module (pandas, LangChain, ...) is imported on first call"""
+    async def call(*args, **kwargs):
+        function = getattr(importlib.import_module(module_name), function_name)
+        return await function(*args, **kwargs)
+    call.__name__ = function_name
+    call.__qualname__ = function_name
+    return call
+
+
+# Stage functions from src modules (imported lazily)
+process_leads_async = _deferred('lead_analysis', 'process_leads_async')
+generate_all_emails_async = _deferred('personalized_email', 'generate_all_emails_async')
+send_emails_async = _deferred('sendMailHog', 'send_emails_async')
+send_from_queue_async = _deferred('sendMailHog', 'send_from_queue_async')
+process_emails_with_types_async = _deferred('mail_reply_agent', 'process_emails_with_types_async')
+generate_campaign_report_async = _deferred('summary_report', 'generate_campaign_report_async')
+run_streaming_pipeline_async = _deferred('streaming_pipeline', 'run_streaming_pipeline_async')
+run_sharded_pipeline_async = _deferred('sharded_pipeline', 'run_sharded_pipeline_async')
 
 # Base paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -49,22 +52,69 @@ REPORT_DIR = os.path.join(BASE_DIR, 'report')
 # Email configuration (from sendMailHog.py)
 SENDER_EMAIL = 'sales@yourcompany.com'
 
-# Ensure directories exist
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(REPORT_DIR, exist_ok=True)
+# Send each email as soon as it is generated instead of after the whole table
+EMAIL_SEND_OVERLAP = os.getenv('EMAIL_SEND_OVERLAP', '0').lower() in ('1', 'true', 'yes', 'on')
+
+# Worker processes for step 1 (see sharded_pipeline)
+PIPELINE_SHARDS = int(os.getenv('PIPELINE_SHARDS', '1'))
 
 
-async def step1_lead_to_email():
-    """Step 1: Lead Analysis -> Personalized Email -> Send MailHog - async version"""
+@traced_stage('step1_lead_to_email')
+async def step1_lead_to_email(streaming=False, chunk_size=None, run_state=None, overlap_send=None, shards=None):
+    """
+    Step 1: Lead Analysis -> Personalized Email -> Send MailHog - async version
+    
+    With streaming=True leads are read in chunks and each record flows through
+    score → email → send on its own, so sending starts before scoring finishes.
+    With overlap_send=True (default EMAIL_SEND_OVERLAP) batch mode sends each
+    email as soon as it is generated, so generation and delivery run together.
+    With shards > 1 (default PIPELINE_SHARDS) the leads are split across that
+    many worker processes, each running the batch pipeline on its shard.
+    run_state (run_state.RunState) checkpoints finished rows in batch mode.
+    """
     print("\n" + "="*80)
     print("STEP 1: LEAD ANALYSIS → PERSONALIZED EMAIL → SEND MAILHOG")
     print("="*80 + "\n")
     
+    # Ensure directories exist
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    
     # Change to base directory for relative paths to work
     original_cwd = os.getcwd()
     os.chdir(BASE_DIR)
     
     try:
+        if streaming:
+            leads_csv = os.path.join(DATASET_DIR, 'leads.csv')
+            if not os.path.exists(leads_csv):
+                raise FileNotFoundError(f"Leads CSV not found at: {leads_csv}")
+            
+            emails_sent_csv = await run_streaming_pipeline_async(leads_csv, OUTPUT_DIR, chunk_size)
+            print(f"✅ Streaming Pipeline Complete: {emails_sent_csv}\n")
+            
+            print("\n" + "="*80)
+            print("✅ STEP 1 COMPLETED SUCCESSFULLY")
+            print("="*80 + "\n")
+            
+            return emails_sent_csv
+        
+        shards = PIPELINE_SHARDS if shards is None else shards
+        if shards > 1:
+            leads_csv = os.path.join(DATASET_DIR, 'leads.csv')
+            if not os.path.exists(leads_csv):
+                raise FileNotFoundError(f"Leads CSV not found at: {leads_csv}")
+            
+            overlap = EMAIL_SEND_OVERLAP if overlap_send is None else overlap_send
+            emails_sent_path = await run_sharded_pipeline_async(leads_csv, OUTPUT_DIR, shards, overlap)
+            print(f"✅ Sharded Pipeline Complete: {emails_sent_path}\n")
+            
+            print("\n" + "="*80)
+            print("✅ STEP 1 COMPLETED SUCCESSFULLY")
+            print("="*80 + "\n")
+            
+            return emails_sent_path
+        
         # 1. Lead Analysis
         print("\n[1/3] Starting Lead Analysis...")
         print("-" * 80)
@@ -72,84 +122,124 @@ async def step1_lead_to_email():
         if not os.path.exists(leads_csv):
             raise FileNotFoundError(f"Leads CSV not found at: {leads_csv}")
         
-        await process_leads_async(leads_csv)
-        analyzed_leads_csv = os.path.join(OUTPUT_DIR, 'analyzed_leads.csv')
-        print(f"✅ Lead Analysis Complete: {analyzed_leads_csv}\n")
+        # Intermediate tables use the columnar format from storage (Arrow by default)
+        from storage import intermediate_path
+        analyzed_leads_path = intermediate_path(OUTPUT_DIR, 'analyzed_leads')
+        await process_leads_async(leads_csv, output_file=analyzed_leads_path, run_state=run_state)
+        print(f"✅ Lead Analysis Complete: {analyzed_leads_path}\n")
+        
+        emails_generated_path = intermediate_path(OUTPUT_DIR, 'emails_generated')
+        emails_sent_path = intermediate_path(OUTPUT_DIR, 'emails_sent_status')
+        if EMAIL_SEND_OVERLAP if overlap_send is None else overlap_send:
+            # 2+3. Generation feeds a send queue; wall time ≈ max(generation, sending)
+            print("\n[2-3/3] Generating and Sending Emails (overlapped)...")
+            print("-" * 80)
+            send_queue = asyncio.Queue()
+            
+            async def generate_then_close():
+                try:
+                    await generate_all_emails_async(analyzed_leads_path, emails_generated_path,
+                                                    run_state=run_state, send_queue=send_queue)
+                finally:
+                    send_queue.put_nowait(None)
+            
+            await asyncio.gather(generate_then_close(),
+                                 send_from_queue_async(send_queue, emails_sent_path, run_state=run_state))
+            print(f"✅ Email Generation Complete: {emails_generated_path}")
+            print(f"✅ Email Sending Complete: {emails_sent_path}\n")
+            
+            print("\n" + "="*80)
+            print("✅ STEP 1 COMPLETED SUCCESSFULLY")
+            print("="*80 + "\n")
+            
+            return emails_sent_path
         
         # 2. Personalized Email Generation
         print("\n[2/3] Generating Personalized Emails...")
         print("-" * 80)
-        emails_generated_csv = os.path.join(OUTPUT_DIR, 'emails_generated.csv')
-        await generate_all_emails_async(analyzed_leads_csv, emails_generated_csv)
-        print(f"✅ Email Generation Complete: {emails_generated_csv}\n")
+        await generate_all_emails_async(analyzed_leads_path, emails_generated_path, run_state=run_state)
+        print(f"✅ Email Generation Complete: {emails_generated_path}\n")
         
         # Display emails in the requested format (before sending)
-        display_emails(emails_generated_csv)
+        display_emails(emails_generated_path)
         
         # 3. Send Emails via MailHog
         print("\n[3/3] Sending Emails via MailHog...")
         print("-" * 80)
-        emails_sent_csv = os.path.join(OUTPUT_DIR, 'emails_sent_status.csv')
-        await send_emails_async(emails_generated_csv, emails_sent_csv)
-        print(f"✅ Email Sending Complete: {emails_sent_csv}\n")
+        await send_emails_async(emails_generated_path, emails_sent_path, run_state=run_state)
+        print(f"✅ Email Sending Complete: {emails_sent_path}\n")
         
         print("\n" + "="*80)
         print("✅ STEP 1 COMPLETED SUCCESSFULLY")
         print("="*80 + "\n")
         
-        return emails_sent_csv
+        return emails_sent_path
     finally:
         os.chdir(original_cwd)
 
 
-async def step2_reply_to_report():
-    """Step 2: Mail Reply Agent -> Response Analysis -> Summary Report - async version"""
+@traced_stage('step2_reply_to_report')
+async def step2_reply_to_report(run_state=None):
+    """
+    Step 2: Mail Reply Agent -> Response Analysis -> Summary Report - async version
+    run_state (run_state.RunState) checkpoints finished rows and the report.
+    """
     print("\n" + "="*80)
     print("STEP 2: MAIL REPLY AGENT → RESPONSE ANALYSIS → SUMMARY REPORT")
     print("="*80 + "\n")
     
+    # Ensure directories exist
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    
     # Change to base directory for relative paths to work
     original_cwd = os.getcwd()
     os.chdir(BASE_DIR)
     
     try:
-        emails_sent_csv = os.path.join(OUTPUT_DIR, 'emails_sent_status.csv')
-        if not os.path.exists(emails_sent_csv):
-            raise FileNotFoundError(f"Emails sent CSV not found at: {emails_sent_csv}")
+        # Step 1 writes Arrow/Parquet (batch) or CSV (streaming); use whichever is newest
+        from storage import find_table, intermediate_path, export_csv
+        emails_sent_path = find_table(OUTPUT_DIR, 'emails_sent_status')
+        if emails_sent_path is None:
+            raise FileNotFoundError(f"Emails sent table not found in: {OUTPUT_DIR}")
         
         # 1. Mail Reply Agent
         print("\n[1/3] Processing Mail Replies...")
         print("-" * 80)
-        emails_with_replies_csv = os.path.join(OUTPUT_DIR, 'emails_with_replies.csv')
-        await process_emails_with_types_async(emails_sent_csv, emails_with_replies_csv)
-        print(f"✅ Mail Reply Processing Complete: {emails_with_replies_csv}\n")
+        emails_with_replies_path = intermediate_path(OUTPUT_DIR, 'emails_with_replies')
+        await process_emails_with_types_async(emails_sent_path, emails_with_replies_path, run_state=run_state)
+        print(f"✅ Mail Reply Processing Complete: {emails_with_replies_path}\n")
         
         # 2. Response Analysis
         print("\n[2/3] Analyzing Responses...")
         print("-" * 80)
         # Process to temp file first
-        temp_final_csv = os.path.join(OUTPUT_DIR, 'final.csv')
-        await analyze_responses_async(emails_with_replies_csv, temp_final_csv)
-        print(f"✅ Response Analysis Complete: {temp_final_csv}\n")
+        temp_final_path = intermediate_path(OUTPUT_DIR, 'final')
+        await analyze_responses_async(emails_with_replies_path, temp_final_path, run_state=run_state)
+        print(f"✅ Response Analysis Complete: {temp_final_path}\n")
         
-        # Save final.csv to report folder
-        final_csv = os.path.join(REPORT_DIR, 'final.csv')
-        df_final = pd.read_csv(temp_final_csv)
-        df_final.to_csv(final_csv, index=False)
+        # Save final.csv to report folder (the report stays CSV)
+        final_csv = export_csv(temp_final_path, os.path.join(REPORT_DIR, 'final.csv'))
         print(f"✅ Final CSV saved to report folder: {final_csv}\n")
         
         # 3. Summary Report
         print("\n[3/3] Generating Summary Report...")
         print("-" * 80)
-        # Use absolute path for the CSV file
-        if not os.path.isabs(emails_with_replies_csv):
-            emails_with_replies_csv = os.path.join(BASE_DIR, emails_with_replies_csv)
-        report = generate_campaign_report(emails_with_replies_csv)
-        
-        # Save campaign_report.md to report folder
+        # The report needs the analyzed table (reply_class); export_csv copied it, so it is still in place
+        if not os.path.isabs(temp_final_path):
+            temp_final_path = os.path.join(BASE_DIR, temp_final_path)
         report_path = os.path.join(REPORT_DIR, 'campaign_report.md')
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(report)
+        if run_state is not None and run_state.completed('summary_report') and os.path.exists(report_path):
+            print(f"🧾 Run {run_state.run_id}: summary report already generated, skipping\n")
+        else:
+            report = await generate_campaign_report_async(temp_final_path)
+            
+            # Save campaign_report.md to report folder
+            with open(report_path, "w", encoding="utf-8") as f:
+                f.write(report)
+            if run_state is not None:
+                run_state.mark_done('summary_report', 'report', {'path': report_path})
+                run_state.flush()
         
         print(f"✅ Summary Report Generated: {report_path}\n")
         
@@ -168,7 +258,8 @@ async def classify_reply_async(text, chain):
     if not text:
         return {"class": "NO_REPLY", "reason": "Empty content"}
     try:
-        res = await chain.ainvoke({"reply": text})
+        res = await submit(HUGGINGFACE, lambda: chain.ainvoke({"reply": text}),
+                           tokens=estimate_tokens(text))
         allowed_labels = {"SKIP", "INTERESTED", "NOT_INTERESTED", "NEEDS_FOLLOW_UP", "UNCLEAR"}
         label = res.get("class", "").upper()
         if label not in allowed_labels:
@@ -178,10 +269,42 @@ async def classify_reply_async(text, chain):
         return {"class": "UNCLEAR", "reason": f"Error: {e}"}
 
 
-async def analyze_responses_async(input_csv, output_csv):
+async def classify_reply_batch_async(batch, batch_chain, chain):
+    """
+    Classify several replies in one LLM call - async version
+    batch is [(idx, text), ...]; items missing or invalid in the returned JSON
+    array are re-classified one at a time.
+    """
+    from reply_batching import format_reply_batch, parse_batch_response
+    
+    try:
+        res = await submit(
+            HUGGINGFACE,
+            lambda: batch_chain.ainvoke({"replies": format_reply_batch(batch)}),
+            tokens=estimate_tokens([text for _, text in batch]),
+        )
+        results, failed_ids = parse_batch_response(res, batch)
+    except Exception:
+        results, failed_ids = {}, [idx for idx, _ in batch]
+    
+    if failed_ids:
+        texts = dict(batch)
+        singles = await asyncio.gather(*(classify_reply_async(texts[idx], chain) for idx in failed_ids))
+        results.update(zip(failed_ids, singles))
+    return results
+
+
+@traced_stage('response_analysis')
+async def analyze_responses_async(input_csv, output_csv, batch_size=None, use_local=None, run_state=None):
     """
     Response analysis function - async version
     Recreates the classify_reply logic from response_analysis module
+    
+    Replies the local classifier is confident about are labelled without a network
+    call (use_local, default REPLY_LOCAL_CLASSIFIER). The rest are classified
+    batch_size at a time (default REPLY_BATCH_SIZE); batch_size=1 keeps one LLM
+    call per reply. With a run_state, LLM classifications are checkpointed and
+    reused on resume.
     """
     # Use absolute path for input
     if not os.path.isabs(input_csv):
@@ -189,12 +312,16 @@ async def analyze_responses_async(input_csv, output_csv):
     if not os.path.isabs(output_csv):
         output_csv = os.path.join(BASE_DIR, output_csv)
     
-    # Initialize LLM via HuggingFace endpoint
-    llm = HuggingFaceEndpoint(
-        repo_id="openai/gpt-oss-20b",  # open-source GPT-like model
-        temperature=0.9,
-        huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-    )
+    import pandas as pd
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
+    from llm_clients import get_client
+    from reply_batching import batch_prompt, batched, REPLY_BATCH_SIZE
+    from reply_classifier import get_local_classifier, local_classifier_enabled
+    from run_state import row_keys
+    
+    # Shared HuggingFace endpoint client (open-source GPT-like model)
+    llm = get_client('reply_classifier')
     
     # JSON classification prompt (same as response_analysis.py)
     prompt = ChatPromptTemplate.from_template(
@@ -208,55 +335,111 @@ Text:
     parser = JsonOutputParser()
     chain = prompt | llm | parser
     
-    # Load CSV
-    df = pd.read_csv(input_csv)
+    # Load replies
+    from storage import read_table, write_table
+    df = read_table(input_csv)
     
     if "reply_mail_body" not in df.columns:
         raise ValueError("Column 'reply_mail_body' not found")
     
+    batch_chain = batch_prompt | llm | parser
+    if batch_size is None:
+        batch_size = REPLY_BATCH_SIZE
+    
+    # Empty replies never reach the LLM
+    results_dict = {}
+    pending = []
+    for idx, reply in enumerate(df["reply_mail_body"]):
+        text = str(reply).strip() if pd.notna(reply) else ""
+        if text:
+            pending.append((idx, text))
+        else:
+            results_dict[idx] = {"class": "NO_REPLY", "reason": "Empty content"}
+    
+    # Local fast path: confident rule / model matches never reach the LLM
+    local_count = 0
+    if use_local is None:
+        use_local = local_classifier_enabled()
+    if use_local and pending:
+        local_results = get_local_classifier().classify([text for _, text in pending])
+        escalated = []
+        for (idx, text), result in zip(pending, local_results):
+            if result is None:
+                escalated.append((idx, text))
+            else:
+                results_dict[idx] = {"class": result["class"], "reason": result["reason"]}
+                local_count += 1
+        pending = escalated
+        print(f"⚡ Local classifier resolved {local_count} replies, escalating {len(pending)} to the LLM\n")
+    
+    # Resumed run: replies classified before the interruption are not sent again
+    stage_keys = None
+    resumed_count = 0
+    if run_state is not None:
+        stage_keys = row_keys(df)
+        done = run_state.completed('response_analysis')
+        remaining = []
+        for idx, text in pending:
+            if stage_keys[idx] in done:
+                results_dict[idx] = done[stage_keys[idx]]
+                resumed_count += 1
+            else:
+                remaining.append((idx, text))
+        pending = remaining
+        print(f"🧾 Run {run_state.run_id}: {resumed_count} replies already classified\n")
+    
     # Process all replies in parallel with real-time output
-    print(f"Processing {len(df)} replies in parallel...\n")
+    batches = batched(pending, batch_size)
+    print(f"Processing {len(pending)} replies in {len(batches)} batches of up to {batch_size} "
+          f"({len(df) - len(pending) - local_count - resumed_count} empty)...\n")
     
-    # Create tasks with indices
-    async def classify_with_index(idx, reply):
-        result = await classify_reply_async(reply, chain)
-        return idx, result
+    # Create one task per batch
+    async def classify_batch(batch):
+        if len(batch) == 1:
+            idx, text = batch[0]
+            return [(idx, await classify_reply_async(text, chain))]
+        return list((await classify_reply_batch_async(batch, batch_chain, chain)).items())
     
-    tasks = []
-    for idx, reply in enumerate(df["reply_mail_body"]):
-        tasks.append(asyncio.create_task(classify_with_index(idx, reply)))
+    tasks = [asyncio.create_task(classify_batch(batch)) for batch in batches]
     
-    # Process results as they complete
+    # Process results as they complete (one progress line at a time in quiet mode)
     completed_count = 0
-    results_dict = {}
+    progress = Progress('response_analysis', len(pending))
     
     for coro in asyncio.as_completed(tasks):
         try:
-            idx, result = await coro
+            batch_results = await coro
+        except Exception as e:
+            print(f"❌ Error classifying reply batch: {e}\n")
+            # We can't recover the batch from the exception, skip these entries
+            continue
+        
+        for idx, result in batch_results:
             completed_count += 1
             
             # Print output immediately
-            reply_text = str(df.iloc[idx]["reply_mail_body"])[:80] if pd.notna(df.iloc[idx]["reply_mail_body"]) else "No reply"
-            print(f"🔍 [{completed_count}/{len(df)}] Classified reply {idx+1}")
-            print(f"    Class: {result['class']}")
-            print(f"    Reason: {result['reason']}")
-            print(f"    Preview: {reply_text}...")
-            print()
+            progress.advance(lambda: f"🔍 [{completed_count}/{len(pending)}] Classified reply {idx+1}\n"
+                                     f"    Class: {result['class']}\n"
+                                     f"    Reason: {result['reason']}\n"
+                                     f"    Preview: {str(df.iloc[idx]['reply_mail_body'])[:80]}...\n")
             
             # Store result with original index
             results_dict[idx] = result
-            
-        except Exception as e:
-            completed_count += 1
-            print(f"❌ [{completed_count}/{len(df)}] Error classifying reply: {e}\n")
-            # We can't recover idx from exception, skip this entry
+            if run_state is not None and not str(result.get('reason', '')).startswith('Error'):
+                run_state.mark_done('response_analysis', stage_keys[idx], result)
+    
+    progress.finish()
+    if run_state is not None:
+        run_state.flush()
     
     # Update dataframe with results in order
     df["reply_class"] = [results_dict.get(idx, {"class": "UNCLEAR"})["class"] for idx in range(len(df))]
     df["reply_reason"] = [results_dict.get(idx, {"reason": "Error"})["reason"] for idx in range(len(df))]
     
-    df.to_csv(output_csv, index=False)
-    print(f"✅ Finished! Classified CSV saved to {output_csv}\n")
+    write_table(df, output_csv)
+    print(f"✅ Finished! Classified replies saved to {output_csv}")
+    print_scheduler_stats(HUGGINGFACE)
+    print()
 
 
 def display_emails(emails_csv):
@@ -267,17 +450,19 @@ def display_emails(emails_csv):
     Subject:
     Email Body:
     """
-    if not os.path.exists(emails_csv):
+    if not os.path.exists(emails_csv) or is_quiet():
         return
     
-    df = pd.read_csv(emails_csv)
+    from storage import read_table
+    from records import iter_records
+    df = read_table(emails_csv, columns=['email', 'email_sender', 'email_subject', 'email_body'])
     
     print("\n" + "="*80)
     print("📧 GENERATED EMAILS")
     print("="*80)
     
     # Display all emails
-    for idx, row in df.iterrows():
+    for idx, row in iter_records(df):
         recipient_email = row.get('email', 'N/A')
         # Use sender email from CSV if available, otherwise use default
         sender_email = row.get('email_sender', SENDER_EMAIL)
@@ -307,22 +492,40 @@ def ask_user_continue():
     return True
 
 
-async def main_async():
-    """Main workflow orchestrator - async version"""
+async def main_async(streaming=False, chunk_size=None, resume=None, overlap_send=None, shards=None):
+    """
+    Main workflow orchestrator - async version
+    
+    Every run is checkpointed under a run id (output/run_state.sqlite); pass
+    resume=<run_id> to continue an interrupted run without redoing finished rows.
+    """
+    from run_state import RunState, print_run_state_stats
+    
     print("\n" + "="*80)
     print("🚀 AI-POWERED SALES CAMPAIGN CRM - WORKFLOW ORCHESTRATOR")
     print("="*80)
     
+    run_state = RunState(resume)
+    print(f"\n🧾 Run ID: {run_state.run_id}{' (resumed)' if run_state.resumed else ''} "
+          f"- continue after a failure with --resume {run_state.run_id}")
+    shards = PIPELINE_SHARDS if shards is None else shards
+    if streaming:
+        print("🧾 Streaming mode: step 1 is not checkpointed, step 2 is")
+    elif shards > 1:
+        print(f"🧾 Sharded mode ({shards} processes): step 1 is not checkpointed, step 2 is")
+    
     try:
         # Step 1: Lead Analysis → Personalized Email → Send MailHog
-        await step1_lead_to_email()
+        await step1_lead_to_email(streaming=streaming, chunk_size=chunk_size,
+                                  run_state=None if streaming or shards > 1 else run_state,
+                                  overlap_send=overlap_send, shards=shards)
         
         # Ask user if they want to continue
         should_continue = ask_user_continue()
         
         if should_continue:
             # Step 2: Mail Reply Agent → Response Analysis → Summary Report
-            await step2_reply_to_report()
+            await step2_reply_to_report(run_state=run_state)
             print("\n" + "="*80)
             print("🎉 WORKFLOW COMPLETED SUCCESSFULLY!")
             print("="*80)
@@ -330,6 +533,9 @@ async def main_async():
             print("  - final.csv")
             print("  - campaign_report.md")
             print("="*80 + "\n")
+            from llm_clients import print_client_stats
+            print_client_stats()
+            run_state.set_status('completed')
         else:
             print("\n" + "="*80)
             print("⏸️  WORKFLOW PAUSED")
@@ -338,8 +544,10 @@ async def main_async():
             print("Step 2 (Mail Reply Agent → Response Analysis → Summary Report)")
             print("will be executed after the client replies.")
             print("="*80 + "\n")
+            run_state.set_status('paused')
     
     except Exception as e:
+        run_state.set_status('failed')
         print("\n" + "="*80)
         print("❌ ERROR IN WORKFLOW")
         print("="*80)
@@ -349,13 +557,41 @@ async def main_async():
         print("  2. MailHog is running (for email sending)")
         print("  3. Environment variables are set (.env file)")
         print("  4. All dependencies are installed")
+        print(f"\nResume this run with: python3 workflow/main_workflow.py --resume {run_state.run_id}")
         print("="*80 + "\n")
         raise
+    finally:
+        print_run_state_stats(run_state)
+        run_state.close()
+        flush_traces()
+
+
+def parse_args(argv=None):
+    """Command line options for the orchestrator"""
+    parser = argparse.ArgumentParser(description="AI-powered sales campaign workflow")
+    parser.add_argument('--streaming', action='store_true',
+                        help="stream leads through score → email → send in chunks")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="rows per chunk in streaming mode (default: STREAM_CHUNK_SIZE or 500)")
+    parser.add_argument('--overlap-send', action='store_true', default=None,
+                        help="send each email as soon as it is generated (EMAIL_SEND_OVERLAP=1)")
+    parser.add_argument('--shards', type=int, default=None,
+                        help="run step 1 in this many worker processes (default: PIPELINE_SHARDS or 1)")
+    parser.add_argument('--resume', metavar='RUN_ID', default=None,
+                        help="continue an interrupted run, skipping rows it already finished")
+    parser.add_argument('--quiet', action='store_true',
+                        help="print a periodic progress line instead of every row (PIPELINE_QUIET=1)")
+    parser.add_argument('--trace', metavar='SINKS', default=None,
+                        help="trace sinks, comma-separated: jsonl, prometheus, otel (default: TRACE_SINKS)")
+    return parser.parse_args(argv)
 
 
-def main():
+def main(argv=None):
     """Main workflow orchestrator - sync wrapper"""
-    asyncio.run(main_async())
+    args = parse_args(argv)
+    configure_tracing(sinks=args.trace, quiet=True if args.quiet else None)
+    asyncio.run(main_async(streaming=args.streaming, chunk_size=args.chunk_size, resume=args.resume,
+                           overlap_send=args.overlap_send, shards=args.shards))
 
 
 if __name__ == "__main__":